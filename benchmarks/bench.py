@@ -0,0 +1,229 @@
+"""Benchmark de charge de l'API contre un Bexio simulé
+
+Par défaut tout tourne en mémoire : l'API (main.py) et le Bexio simulé
+(fake_bexio.py) sont reliés par des transports ASGI, avec une base SQLite
+temporaire (jamais celle de DATABASE_URL ; --database-url pour en imposer
+une). Avec --target, les requêtes sont envoyées à une instance déjà
+démarrée (configurée avec BEXIO_BASE_URL/BEXIO_AUTH_URL vers fake_bexio).
+
+Exemples :
+    python benchmarks/bench.py --clients 20 --concurrency 50 --requests 5000
+    python benchmarks/bench.py --latency-ms 120 --rate-429 0.05 --max-p95-ms 400
+    python benchmarks/bench.py --target http://localhost:8000 --duration 60 --json bench.json
+
+Le code de sortie vaut 1 si un seuil (--max-p95-ms, --max-error-rate) est dépassé.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bexio import FakeBexioConfig, create_fake_bexio  # noqa: E402
+
+FAKE_BEXIO_URL = "http://fake-bexio"
+
+# (nom, méthode, chemin, poids) ; {client} est remplacé par un client tiré au sort
+SCENARIOS = [
+    ("dashboard", "GET", "/clients/{client}/dashboard", 4),
+    ("contacts", "GET", "/clients/{client}/contacts", 3),
+    ("invoices", "GET", "/clients/{client}/invoices?limit=50&offset=0", 3),
+    ("invoices_stream", "GET", "/clients/{client}/invoices?stream=ndjson", 1),
+    ("tasks", "GET", "/tasks/{client}", 3),
+    ("tasks_create", "POST", "/tasks", 1),
+    ("health", "GET", "/health", 1),
+]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+def summarize(results: Dict[str, List[tuple]], elapsed: float) -> Dict:
+    report = {}
+    everything = []
+    for name, samples in sorted(results.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, status in samples if status >= 400 or status == 0)
+        everything.extend(samples)
+        report[name] = {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        }
+    all_latencies = sorted(latency for latency, _ in everything)
+    all_errors = sum(1 for _, status in everything if status >= 400 or status == 0)
+    report["TOTAL"] = {
+        "requests": len(everything),
+        "errors": all_errors,
+        "error_rate": all_errors / len(everything) if everything else 0.0,
+        "rps": len(everything) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(all_latencies, 50) * 1000,
+        "p95_ms": percentile(all_latencies, 95) * 1000,
+        "p99_ms": percentile(all_latencies, 99) * 1000,
+        "max_ms": (all_latencies[-1] if all_latencies else 0.0) * 1000,
+    }
+    return report
+
+def print_report(report: Dict, elapsed: float):
+    header = f"{'endpoint':<18}{'req':>8}{'err':>7}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(f"\nDurée: {elapsed:.1f}s")
+    print(header)
+    print("-" * len(header))
+    for name, row in report.items():
+        print(f"{name:<18}{row['requests']:>8}{row['errors']:>7}{row['rps']:>10.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+
+async def authorize_clients(client: httpx.AsyncClient, client_ids: List[str], tasks_per_client: int):
+    """Enregistre les clients via le flux OAuth (le Bexio simulé accepte tout code)"""
+    for client_id in client_ids:
+        response = await client.post("/auth/bexio/authorize", json={
+            "client_id": client_id,
+            "authorization_code": client_id,
+        })
+        response.raise_for_status()
+        if tasks_per_client:
+            await client.post("/tasks/bulk", json=[
+                {"client_id": client_id, "title": f"Tâche {i}", "description": "benchmark"}
+                for i in range(tasks_per_client)
+            ])
+
+async def run_load(client: httpx.AsyncClient, client_ids: List[str], scenarios: List[tuple],
+                   concurrency: int, requests: Optional[int], duration: Optional[float], seed: int) -> tuple:
+    rng = random.Random(seed)
+    weights = [scenario[3] for scenario in scenarios]
+    results: Dict[str, List[tuple]] = defaultdict(list)
+    remaining = [requests or 0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_job():
+        if deadline is not None:
+            if time.perf_counter() >= deadline:
+                return None
+        else:
+            if remaining[0] <= 0:
+                return None
+            remaining[0] -= 1
+        return rng.choices(scenarios, weights)[0], rng.choice(client_ids)
+
+    async def worker():
+        while True:
+            job = next_job()
+            if job is None:
+                return
+            (name, method, path, _), client_id = job
+            url = path.format(client=client_id)
+            started = time.perf_counter()
+            try:
+                if method == "POST":
+                    response = await client.post(url, json={"client_id": client_id, "title": "Tâche bench"})
+                else:
+                    response = await client.get(url)
+                    # Lecture complète (flux compris) pour mesurer jusqu'au dernier octet
+                    await response.aread()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            results[name].append((time.perf_counter() - started, status))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return results, time.perf_counter() - started
+
+async def main_async(args) -> int:
+    client_ids = [f"bench-{i}" for i in range(args.clients)]
+    scenarios = [s for s in SCENARIOS if not args.endpoints or s[0] in args.endpoints]
+    config = FakeBexioConfig(
+        contacts=args.contacts,
+        invoices=args.invoices,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        error_rate=args.error_rate,
+    )
+    timeout = httpx.Timeout(args.timeout)
+
+    if args.target:
+        async with httpx.AsyncClient(base_url=args.target, timeout=timeout) as client:
+            await authorize_clients(client, client_ids, args.tasks)
+            results, elapsed = await run_load(client, client_ids, scenarios, args.concurrency,
+                                              args.requests, args.duration, args.seed)
+    else:
+        # L'API est importée après configuration de l'environnement
+        # Base temporaire même si DATABASE_URL est défini : le benchmark écrit des tâches et tokens
+        database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='bexio-bench-')}/bench.db"
+        os.environ["DATABASE_URL"] = database_url
+        os.environ["BEXIO_BASE_URL"] = f"{FAKE_BEXIO_URL}/2.0"
+        os.environ["BEXIO_AUTH_URL"] = f"{FAKE_BEXIO_URL}/realms/bexio"
+        os.environ.setdefault("MIRROR_SYNC_ENABLED", "false")
+        import main
+
+        main.logger.setLevel("WARNING")
+        logging.getLogger("httpx").setLevel("WARNING")
+        main.http_transport = httpx.ASGITransport(app=create_fake_bexio(config))
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=timeout) as client:
+                await authorize_clients(client, client_ids, args.tasks)
+                results, elapsed = await run_load(client, client_ids, scenarios, args.concurrency,
+                                                  args.requests, args.duration, args.seed)
+
+    report = summarize(results, elapsed)
+    print_report(report, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "elapsed": elapsed, "endpoints": report}, f, indent=2)
+
+    failed = []
+    for name, row in report.items():
+        if args.max_p95_ms is not None and row["p95_ms"] > args.max_p95_ms:
+            failed.append(f"{name}: p95 {row['p95_ms']:.1f} ms > {args.max_p95_ms} ms")
+        if args.max_error_rate is not None and row["error_rate"] > args.max_error_rate:
+            failed.append(f"{name}: taux d'erreur {row['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    for failure in failed:
+        print(f"ÉCHEC {failure}")
+    return 1 if failed else 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de charge Bexio-Softr Connector")
+    parser.add_argument("--target", help="URL d'une instance démarrée (sinon exécution en mémoire)")
+    parser.add_argument("--clients", type=int, default=10, help="nombre de clients (tenants)")
+    parser.add_argument("--tasks", type=int, default=20, help="tâches créées par client")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--duration", type=float, help="durée en secondes (remplace --requests)")
+    parser.add_argument("--endpoints", nargs="*", choices=[s[0] for s in SCENARIOS])
+    parser.add_argument("--database-url", help="base de l'API en mémoire (défaut : SQLite temporaire)")
+    parser.add_argument("--contacts", type=int, default=200, help="contacts par client (Bexio simulé)")
+    parser.add_argument("--invoices", type=int, default=1000, help="factures par client (Bexio simulé)")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async(parse_args())))
@@ -0,0 +1,194 @@
+"""Bexio simulé pour tests de charge et benchmarks
+
+Sert /2.0/contact, /2.0/kb_invoice, leurs endpoints /search et l'endpoint
+token OAuth, avec N contacts et factures générés par client, une latence
+configurable et l'injection de 429 et d'erreurs 5xx.
+
+Utilisation :
+    # Serveur autonome, puis BEXIO_BASE_URL=http://localhost:9000/2.0
+    python benchmarks/fake_bexio.py --port 9000 --invoices 5000 --latency-ms 80
+
+    # En mémoire, sans réseau
+    main.http_transport = httpx.ASGITransport(app=create_fake_bexio(config))
+"""
+import argparse
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Les enregistrements sont calculés à la demande (aucun stockage) :
+# l'enregistrement i d'un client est une fonction de (client, i)
+BASE_UPDATED_AT = datetime(2024, 1, 1)
+CITIES = [("1003", "Lausanne"), ("1201", "Genève"), ("1700", "Fribourg"), ("2000", "Neuchâtel"), ("1950", "Sion")]
+SERVICES = ["Services fiduciaires", "Consultation TVA", "Bouclement annuel", "Salaires", "Conseil fiscal"]
+
+@dataclass
+class FakeBexioConfig:
+    contacts: int = int(os.getenv("FAKE_BEXIO_CONTACTS", "200"))
+    invoices: int = int(os.getenv("FAKE_BEXIO_INVOICES", "1000"))
+    latency_ms: float = float(os.getenv("FAKE_BEXIO_LATENCY_MS", "50"))
+    jitter_ms: float = float(os.getenv("FAKE_BEXIO_JITTER_MS", "20"))
+    rate_429: float = float(os.getenv("FAKE_BEXIO_RATE_429", "0"))
+    error_rate: float = float(os.getenv("FAKE_BEXIO_ERROR_RATE", "0"))
+    retry_after: int = int(os.getenv("FAKE_BEXIO_RETRY_AFTER", "1"))
+    max_limit: int = 2000
+
+def tenant_from_request(request: Request) -> str:
+    """Le client est identifié par son token (bench-token-<client>)"""
+    token = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    return token.removeprefix("bench-token-") or "anonymous"
+
+def updated_at(index: int) -> str:
+    return (BASE_UPDATED_AT + timedelta(minutes=index)).strftime("%Y-%m-%d %H:%M:%S")
+
+def first_index_since(value: str) -> int:
+    """Premier index dont updated_at >= value (updated_at croît avec l'index)"""
+    since = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    minutes = (since - BASE_UPDATED_AT).total_seconds() / 60
+    return max(0, int(minutes) + (1 if minutes > int(minutes) else 0))
+
+def make_contact(tenant: str, index: int) -> dict:
+    rng = random.Random(f"{tenant}:contact:{index}")
+    postcode, city = rng.choice(CITIES)
+    return {
+        "id": index + 1,
+        "contact_type_id": 1,
+        "name_1": f"Entreprise {tenant}-{index + 1} SA",
+        "name_2": f"Contact {index + 1}",
+        "mail": f"contact{index + 1}@client-{tenant}.ch",
+        "phone_fixed": f"+41 21 {rng.randint(100, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        "phone_mobile": f"+41 79 {rng.randint(100, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        "address": f"Rue du Test {rng.randint(1, 200)}",
+        "postcode": postcode,
+        "city": city,
+        "country_id": 1,
+        "updated_at": updated_at(index),
+    }
+
+def make_invoice(tenant: str, index: int, contacts: int) -> dict:
+    rng = random.Random(f"{tenant}:invoice:{index}")
+    total_net = round(rng.uniform(100, 10000), 2)
+    valid_from = BASE_UPDATED_AT + timedelta(days=index % 700)
+    return {
+        "id": index + 1,
+        "document_nr": f"RE-{valid_from.year}-{index + 1:05d}",
+        "title": f"{rng.choice(SERVICES)} {valid_from.strftime('%m/%Y')}",
+        "contact_id": rng.randint(1, max(contacts, 1)),
+        "total_gross": f"{round(total_net * 1.081, 2):.2f}",
+        "total_net": f"{total_net:.2f}",
+        "currency": rng.choice(["CHF", "CHF", "CHF", "EUR"]),
+        "is_valid_from": valid_from.strftime("%Y-%m-%d"),
+        "is_valid_to": (valid_from + timedelta(days=30)).strftime("%Y-%m-%d"),
+        "kb_item_status_id": rng.choice([7, 8, 9]),
+        "updated_at": updated_at(index),
+    }
+
+def create_fake_bexio(config: Optional[FakeBexioConfig] = None) -> FastAPI:
+    config = config or FakeBexioConfig()
+    app = FastAPI(title="Fake Bexio")
+    app.state.config = config
+    app.state.stats = {"requests": 0, "rate_limited": 0, "errors": 0}
+
+    async def simulate(request: Request) -> Optional[JSONResponse]:
+        """Latence puis, éventuellement, une réponse 429 ou 5xx injectée"""
+        app.state.stats["requests"] += 1
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        roll = random.random()
+        if roll < config.rate_429:
+            app.state.stats["rate_limited"] += 1
+            return JSONResponse({"error_code": 429, "message": "Too Many Requests"}, status_code=429,
+                                headers={"Retry-After": str(config.retry_after)})
+        if roll < config.rate_429 + config.error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse({"error_code": 503, "message": "Service Unavailable"},
+                                status_code=random.choice([500, 502, 503]))
+        return None
+
+    def page_bounds(request: Request, total: int, start: int = 0) -> range:
+        limit = min(int(request.query_params.get("limit", 500)), config.max_limit)
+        offset = int(request.query_params.get("offset", 0))
+        return range(min(start + offset, total), min(start + offset + limit, total))
+
+    def search_start(criteria: List[dict]) -> int:
+        start = 0
+        for criterion in criteria or []:
+            if criterion.get("field") == "updated_at" and criterion.get("criteria") in (">=", ">"):
+                start = max(start, first_index_since(criterion["value"]))
+        return start
+
+    @app.get("/2.0/contact")
+    async def list_contacts(request: Request):
+        return await simulate(request) or [
+            make_contact(tenant_from_request(request), i) for i in page_bounds(request, config.contacts)
+        ]
+
+    @app.post("/2.0/contact/search")
+    async def search_contacts(request: Request):
+        start = search_start(await request.json())
+        return await simulate(request) or [
+            make_contact(tenant_from_request(request), i) for i in page_bounds(request, config.contacts, start)
+        ]
+
+    @app.get("/2.0/kb_invoice")
+    async def list_invoices(request: Request):
+        tenant = tenant_from_request(request)
+        return await simulate(request) or [
+            make_invoice(tenant, i, config.contacts) for i in page_bounds(request, config.invoices)
+        ]
+
+    @app.post("/2.0/kb_invoice/search")
+    async def search_invoices(request: Request):
+        tenant = tenant_from_request(request)
+        start = search_start(await request.json())
+        return await simulate(request) or [
+            make_invoice(tenant, i, config.contacts) for i in page_bounds(request, config.invoices, start)
+        ]
+
+    @app.post("/realms/bexio/protocol/openid-connect/token")
+    async def token(request: Request):
+        form = await request.form()
+        tenant = (form.get("refresh_token") or form.get("code") or "anonymous").removeprefix("bench-refresh-")
+        return {
+            "access_token": f"bench-token-{tenant}",
+            "refresh_token": f"bench-refresh-{tenant}",
+            "expires_in": 3600,
+            "token_type": "Bearer",
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Bexio simulé")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--contacts", type=int, default=FakeBexioConfig.contacts)
+    parser.add_argument("--invoices", type=int, default=FakeBexioConfig.invoices)
+    parser.add_argument("--latency-ms", type=float, default=FakeBexioConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FakeBexioConfig.jitter_ms)
+    parser.add_argument("--rate-429", type=float, default=FakeBexioConfig.rate_429)
+    parser.add_argument("--error-rate", type=float, default=FakeBexioConfig.error_rate)
+    args = parser.parse_args()
+
+    config = FakeBexioConfig(
+        contacts=args.contacts,
+        invoices=args.invoices,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        error_rate=args.error_rate,
+    )
+    uvicorn.run(create_fake_bexio(config), host="0.0.0.0", port=args.port)
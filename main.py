@@ -1,11 +1,47 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Optional, List, Dict, Literal
+from contextlib import asynccontextmanager, contextmanager
+from collections import OrderedDict, deque
+import asyncio
+import base64
+import csv
+import functools
+import hashlib
+import hmac
+import io
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from email.utils import parsedate_to_datetime
+from xml.sax.saxutils import escape as xml_escape
+import anyio
 import httpx
+try:
+    import orjson
+except ImportError:  # sérialisation stdlib si orjson n'est pas installé
+    orjson = None
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou de migration pour SQLite
+    fcntl = None
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # backend partagé Redis optionnel
+    redis_asyncio = None
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
 from datetime import datetime, timedelta
 import os
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Boolean, Integer
+from sqlalchemy import create_engine, insert, update, select, literal, func, and_, or_, case, text, literal_column, Column, String, DateTime, Text, Boolean, Integer, Float, Index
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 import logging
@@ -17,11 +53,140 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bexio_connector.db")
 BEXIO_CLIENT_ID = os.getenv("BEXIO_CLIENT_ID", "")
 BEXIO_CLIENT_SECRET = os.getenv("BEXIO_CLIENT_SECRET", "")
 BEXIO_REDIRECT_URI = os.getenv("BEXIO_REDIRECT_URI", "")
-BEXIO_BASE_URL = "https://api.bexio.com/2.0"
-BEXIO_AUTH_URL = "https://auth.bexio.com/realms/bexio"  # Nouvelle URL 2025
+# Surchargeables pour pointer vers un Bexio local (voir benchmarks/fake_bexio.py)
+BEXIO_BASE_URL = os.getenv("BEXIO_BASE_URL", "https://api.bexio.com/2.0")
+BEXIO_AUTH_URL = os.getenv("BEXIO_AUTH_URL", "https://auth.bexio.com/realms/bexio")  # Nouvelle URL 2025
+
+# Client HTTP partagé (pool de connexions keep-alive vers Bexio)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Cache des réponses GET Bexio (TTL en secondes par endpoint)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "60"))
+CACHE_TTLS = {
+    "contact": float(os.getenv("CACHE_TTL_CONTACT", "300")),
+    "kb_invoice": float(os.getenv("CACHE_TTL_INVOICE", "120")),
+}
+CACHE_STALE_TTL = float(os.getenv("CACHE_STALE_TTL", "600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Pool de connexions DB et threads dédiés aux requêtes SQLAlchemy
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_THREADS = int(os.getenv("DB_THREADS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+# Rafraîchissement OAuth (secondes avant expiration / intervalle de vérification)
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+TOKEN_REFRESH_INTERVAL = float(os.getenv("TOKEN_REFRESH_INTERVAL", "60"))
+
+# Ordonnancement des appels Bexio : limite par client, retries et disjoncteur
+UPSTREAM_RATE_PER_SECOND = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "5"))
+UPSTREAM_RATE_BURST = float(os.getenv("UPSTREAM_RATE_BURST", "10"))
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "50"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "10"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Miroir local des contacts et factures Bexio
+MIRROR_SYNC_ENABLED = os.getenv("MIRROR_SYNC_ENABLED", "true").lower() in ("1", "true", "yes")
+MIRROR_SYNC_INTERVAL = float(os.getenv("MIRROR_SYNC_INTERVAL", "300"))
+MIRROR_FULL_SYNC_INTERVAL = float(os.getenv("MIRROR_FULL_SYNC_INTERVAL", "86400"))
+MIRROR_SYNC_CONCURRENCY = int(os.getenv("MIRROR_SYNC_CONCURRENCY", "4"))
+MIRROR_SYNC_LOCK_TTL = float(os.getenv("MIRROR_SYNC_LOCK_TTL", "1800"))
+# Webhooks Bexio : invalidation poussée du cache et du miroir
+WEBHOOK_SECRET = os.getenv("BEXIO_WEBHOOK_SECRET", "")
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "5"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_CLAIM_TIMEOUT = float(os.getenv("WEBHOOK_CLAIM_TIMEOUT", "300"))
+WEBHOOK_RETENTION_DAYS = int(os.getenv("WEBHOOK_RETENTION_DAYS", "7"))
+# Avec les webhooks, la synchronisation périodique ne sert plus que de filet de sécurité
+MIRROR_SYNC_INTERVAL_WEBHOOKS = float(os.getenv("MIRROR_SYNC_INTERVAL_WEBHOOKS", "3600"))
+# Travaux en arrière-plan (table jobs) : pool de workers, limite par client, reprises
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PER_CLIENT = int(os.getenv("JOB_MAX_PER_CLIENT", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "30"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_STALE_TIMEOUT = float(os.getenv("JOB_STALE_TIMEOUT", "120"))
+# Taille des pages lors du parcours complet d'un endpoint Bexio
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "500"))
+
+# Cache HTTP côté CDN (s-maxage) pour les endpoints de données client
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+HTTP_CACHE_DASHBOARD_TTL = int(os.getenv("HTTP_CACHE_DASHBOARD_TTL", "30"))
+
+# Mode multi-workers : état partagé (memory = propre à chaque worker, redis = partagé)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHARED_BACKEND = os.getenv("SHARED_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SHARED_KEY_PREFIX = os.getenv("SHARED_KEY_PREFIX", "bexio:")
+SHARED_LOCK_TTL = float(os.getenv("SHARED_LOCK_TTL", "30"))
+# Migration au démarrage si le schéma n'est pas à jour (un seul processus, sous verrou en base) ;
+# désactiver quand `python main.py migrate` est lancé au déploiement
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+# Profilage à la demande (/debug/profiler), désactivé si aucun token n'est défini
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_MAX_DURATION = float(os.getenv("PROFILER_MAX_DURATION", "300"))
+
+# Délai maximum par source de données du dashboard (secondes)
+DASHBOARD_SOURCE_TIMEOUT = float(os.getenv("DASHBOARD_SOURCE_TIMEOUT", "5"))
+DASHBOARD_TASKS_LIMIT = int(os.getenv("DASHBOARD_TASKS_LIMIT", "20"))
+# Pages Bexio lues au plus par totalisation en direct (au-delà : totaux partiels et synchronisation du miroir)
+DASHBOARD_MAX_PAGES = int(os.getenv("DASHBOARD_MAX_PAGES", "10"))
+# Fraîcheur en cache (secondes) de totaux partiels : la synchronisation du miroir donnera les vrais totaux
+DASHBOARD_TRUNCATED_TTL = float(os.getenv("DASHBOARD_TRUNCATED_TTL", "15"))
+
+# Exports CSV/XLSX (séparateur « ; » pour Excel en locale suisse)
+EXPORT_CSV_DELIMITER = os.getenv("EXPORT_CSV_DELIMITER", ";")
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+# Vue portefeuille : dashboards calculés en parallèle (limite globale, tous appels confondus)
+PORTFOLIO_CONCURRENCY = int(os.getenv("PORTFOLIO_CONCURRENCY", "8"))
+PORTFOLIO_CLIENT_TIMEOUT = float(os.getenv("PORTFOLIO_CLIENT_TIMEOUT", "30"))
+# Endpoints d'administration (vue portefeuille, travaux) : désactivés si vide
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Pagination des tâches
+TASKS_DEFAULT_LIMIT = 100
+TASKS_MAX_LIMIT = 500
+TASKS_BULK_MAX = int(os.getenv("TASKS_BULK_MAX", "1000"))
+
+# Recherche dans le miroir local
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
 
 # Database Setup
-engine = create_engine(DATABASE_URL)
+def create_db_engine():
+    """Crée le moteur SQLAlchemy avec un pool configurable"""
+    if DATABASE_URL.startswith("sqlite"):
+        # Les sessions sont utilisées depuis le pool de threads DB
+        return create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    
+    return create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -41,6 +206,9 @@ class ClientAuth(Base):
 
 class TaskManagement(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_client_status_due", "client_id", "status", "due_date"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     client_id = Column(String, nullable=False)
@@ -52,9 +220,1082 @@ class TaskManagement(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
-Base.metadata.create_all(bind=engine)
+# Miroir local des données Bexio
+class BexioContact(Base):
+    __tablename__ = "bexio_contacts"
+    __table_args__ = (
+        Index("ix_bexio_contacts_client_name_id", "client_id", "name_1", "id"),
+        Index("ix_bexio_contacts_client_mail", "client_id", "mail"),
+    )
+    
+    client_id = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name_1 = Column(String)
+    name_2 = Column(String)
+    mail = Column(String)
+    phone_fixed = Column(String)
+    phone_mobile = Column(String)
+    address = Column(String)
+    postcode = Column(String)
+    city = Column(String)
+    country_id = Column(Integer)
+    updated_at = Column(String)
+    raw = Column(Text)
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+class BexioInvoice(Base):
+    __tablename__ = "bexio_invoices"
+    __table_args__ = (
+        Index("ix_bexio_invoices_client_valid_from_id", "client_id", "is_valid_from", "id"),
+        Index("ix_bexio_invoices_client_total_id", "client_id", "total_gross", "id"),
+        Index("ix_bexio_invoices_client_document_nr", "client_id", "document_nr"),
+    )
+    
+    client_id = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    document_nr = Column(String)
+    title = Column(String)
+    contact_id = Column(Integer)
+    total_gross = Column(Float)
+    total_net = Column(Float)
+    currency = Column(String)
+    is_valid_from = Column(String)
+    is_valid_to = Column(String)
+    kb_item_status_id = Column(Integer)
+    updated_at = Column(String)
+    raw = Column(Text)
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    
+    client_id = Column(String, primary_key=True)
+    resource = Column(String, primary_key=True)
+    cursor = Column(String)
+    status = Column(String)
+    error = Column(Text)
+    records = Column(Integer, default=0)
+    version = Column(Integer, default=0)
+    last_sync = Column(DateTime)
+    last_full_sync = Column(DateTime)
+
+class InvoiceAggregate(Base):
+    """Agrégats de factures par client : par devise, par mois (is_valid_from) et par ancienneté (is_valid_to)"""
+    __tablename__ = "invoice_aggregates"
+    
+    client_id = Column(String, primary_key=True)
+    kind = Column(String, primary_key=True)
+    bucket = Column(String, primary_key=True)
+    currency = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+    total_gross = Column(Float, default=0)
+    total_net = Column(Float, default=0)
+    open_count = Column(Integer, default=0)
+    open_amount = Column(Float, default=0)
+
+class SchemaVersion(Base):
+    """Version du schéma appliquée par init_database (les workers ne migrent que si elle est ancienne)"""
+    __tablename__ = "schema_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+class WebhookEvent(Base):
+    """Événement webhook Bexio en attente de traitement (file durable)"""
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        Index("ix_webhook_events_status_id", "status", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    client_id = Column(String, nullable=False)
+    resource = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    record_id = Column(Integer)
+    payload = Column(Text)
+    status = Column(String, default="pending")
+    attempts = Column(Integer, default=0)
+    error = Column(Text)
+    claim_token = Column(String)
+    claimed_at = Column(DateTime)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime)
+
+class Job(Base):
+    """Travail en arrière-plan (synchronisation, export, création en masse)"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_client_status", "client_id", "status"),
+    )
+    
+    id = Column(String, primary_key=True)
+    client_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)
+    params = Column(Text)
+    status = Column(String, default="queued")
+    progress = Column(Float, default=0)
+    message = Column(String)
+    checkpoint = Column(Text)
+    result = Column(Text)
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=JOB_MAX_ATTEMPTS)
+    cancel_requested = Column(Boolean, default=False)
+    claim_token = Column(String)
+    run_after = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+# Recherche texte : FTS5 (SQLite), trigrammes (PostgreSQL), sinon LIKE sans index
+SEARCH_COLUMNS = {
+    BexioContact: ["name_1", "name_2", "mail", "city"],
+    BexioInvoice: ["document_nr", "title"],
+}
+
+def create_sqlite_fts(conn, table: str, columns: List[str]):
+    """Table FTS5 à contenu externe, tenue à jour par triggers sur la table du miroir"""
+    fts = f"{table}_fts"
+    if conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": fts}).first():
+        return
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='rowid', "
+        f"tokenize='unicode61 remove_diacritics 2')"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new_values}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new_values}); END"
+    ))
+    # Lignes déjà présentes dans le miroir
+    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+def setup_search_indexes() -> str:
+    """Crée les index de recherche texte ; retourne le mode de recherche disponible"""
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                for model, columns in SEARCH_COLUMNS.items():
+                    create_sqlite_fts(conn, model.__tablename__, columns)
+                return "fts5"
+            if dialect == "postgresql":
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for model, columns in SEARCH_COLUMNS.items():
+                    table = model.__tablename__
+                    for column in columns:
+                        conn.execute(text(
+                            f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm "
+                            f"ON {table} USING gin (lower({column}) gin_trgm_ops)"
+                        ))
+                return "trigram"
+    except Exception as e:
+        logger.error(f"Index de recherche indisponibles ({dialect}): {str(e)}")
+    return "like"
+
+def detect_search_backend() -> str:
+    """Mode de recherche disponible, sans DDL (workers démarrés après la migration)"""
+    dialect = engine.dialect.name
+    try:
+        with engine.connect() as conn:
+            if dialect == "sqlite":
+                query = text("SELECT count(*) FROM sqlite_master WHERE name IN ('bexio_contacts_fts', 'bexio_invoices_fts')")
+                return "fts5" if conn.execute(query).scalar() == 2 else "like"
+            if dialect == "postgresql":
+                query = text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                return "trigram" if conn.execute(query).first() else "like"
+    except Exception as e:
+        logger.error(f"Détection de la recherche impossible ({dialect}): {str(e)}")
+    return "like"
+
+# À incrémenter à chaque changement de init_database (tables, index, recherche, reprise de données)
+SCHEMA_VERSION = 2
+MIGRATION_LOCK_KEY = 4_242_001
+
+def db_schema_version() -> int:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+    except Exception:
+        # Table absente : base jamais migrée
+        return 0
+
+@contextmanager
+def migration_lock():
+    """Verrou de migration entre processus : advisory lock PostgreSQL, fichier verrouillé pour SQLite"""
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                conn.commit()
+    elif dialect == "sqlite" and fcntl is not None and engine.url.database not in (None, "", ":memory:"):
+        with open(f"{engine.url.database}.migrate.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+def migrate_database() -> str:
+    """Migre si le schéma est ancien (un seul processus à la fois) ; retourne le mode de recherche"""
+    if db_schema_version() < SCHEMA_VERSION:
+        with migration_lock():
+            # Un autre worker a pu migrer pendant l'attente du verrou
+            if db_schema_version() < SCHEMA_VERSION:
+                init_database()
+    return detect_search_backend()
+
+def init_database() -> str:
+    """Schéma, index et recherche texte (processus principal, `python main.py migrate` ou migrate_database)"""
+    Base.metadata.create_all(bind=engine)
+    # create_all ne crée pas les index ajoutés à une table existante
+    for model in (TaskManagement, BexioContact, BexioInvoice):
+        for index in model.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        # Index de tri remplacés par (client_id, colonne, id)
+        for name in SUPERSEDED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        # Colonnes de tri non NULL (lignes écrites avant SEARCH_SORT_DEFAULTS)
+        for model, columns in SEARCH_SORT_DEFAULTS.items():
+            for column, default in columns.items():
+                conn.execute(update(model).where(getattr(model, column).is_(None)).values({column: default}))
+    backend = setup_search_indexes()
+    with engine.begin() as conn:
+        conn.execute(SchemaVersion.__table__.delete())
+        conn.execute(insert(SchemaVersion), [{"id": 1, "version": SCHEMA_VERSION}])
+    logger.info(f"Base de données initialisée (schéma v{SCHEMA_VERSION}, recherche: {backend})")
+    return backend
+
+# Déterminé au démarrage (lifespan)
+SEARCH_BACKEND = "like"
+
+# Tris de recherche sur la colonne nue (index (client_id, colonne, id)) :
+# les colonnes de tri ne sont jamais NULL, la valeur par défaut est écrite à la synchronisation
+SEARCH_SORT_DEFAULTS = {
+    BexioContact: {"name_1": ""},
+    BexioInvoice: {"is_valid_from": "", "total_gross": 0.0},
+}
+
+SEARCH_SORT_COLUMNS = {
+    BexioContact: {
+        "id": BexioContact.id,
+        "name_1": BexioContact.name_1,
+    },
+    BexioInvoice: {
+        "id": BexioInvoice.id,
+        "is_valid_from": BexioInvoice.is_valid_from,
+        "total_gross": BexioInvoice.total_gross,
+    },
+}
+
+SUPERSEDED_INDEXES = ["ix_bexio_contacts_client_name", "ix_bexio_invoices_client_valid_from", "ix_bexio_invoices_client_total"]
+
+# Métriques Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requêtes HTTP en cours", ["method"],
+)
+UPSTREAM_DURATION = Histogram(
+    "bexio_upstream_duration_seconds", "Durée des appels à l'API Bexio",
+    ["endpoint", "method"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_RESPONSES = Counter(
+    "bexio_upstream_responses_total", "Réponses de l'API Bexio par code", ["endpoint", "status"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Durée des opérations SQLAlchemy", ["operation"], buckets=LATENCY_BUCKETS,
+)
+TOKEN_REFRESHES = Counter(
+    "bexio_token_refresh_total", "Rafraîchissements de tokens OAuth", ["result"],
+)
+HTTP_POOL_CONNECTIONS = Gauge(
+    "bexio_http_pool_connections", "Connexions du pool HTTP vers Bexio", ["state"],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connexions du pool SQLAlchemy", ["state"],
+)
+DB_THREADS_BUSY = Gauge(
+    "db_threads_busy", "Threads occupés par des requêtes SQLAlchemy",
+)
+
+def upstream_endpoint_label(endpoint: str) -> str:
+    """Label à faible cardinalité (identifiants numériques remplacés)"""
+    return re.sub(r"/\d+", "/{id}", endpoint)
+
+class MetricsMiddleware:
+    """Middleware ASGI : durée et requêtes en cours par route (modèle de chemin)"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        status = {"code": 500}
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+        
+        # La route n'est connue qu'après le routage : les requêtes en cours sont comptées par méthode
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            REQUEST_DURATION.labels(method, route_path, str(status["code"])).observe(time.perf_counter() - started)
+
+# Profilage par échantillonnage (un worker, activable à chaud)
+class SamplingProfiler:
+    """Échantillonne la pile du thread de la boucle d'événements (format « collapsed »)"""
+    
+    def __init__(self):
+        self.samples: Dict[str, int] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.started_at: Optional[float] = None
+        self.interval = 0.01
+    
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+    
+    def start(self, interval: float, duration: float):
+        if self.running:
+            return
+        self.samples = {}
+        self.interval = interval
+        self.started_at = time.monotonic()
+        self.stop_event.clear()
+        target = threading.get_ident()
+        self.thread = threading.Thread(target=self._run, args=(target, duration), daemon=True, name="sampling-profiler")
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+    
+    def report(self, limit: int = 200) -> str:
+        top = sorted(self.samples.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return "\n".join(f"{stack} {count}" for stack, count in top)
+    
+    def _run(self, target: int, duration: float):
+        deadline = time.monotonic() + duration
+        while not self.stop_event.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+sampling_profiler = SamplingProfiler()
+
+# Sérialisation JSON (orjson si disponible)
+def dump_json(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+
+class FastJSONResponse(JSONResponse):
+    """Réponse JSON par défaut, sérialisée avec orjson si disponible"""
+    
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+# Client HTTP partagé
+http_client: Optional[httpx.AsyncClient] = None
+# HTTP/2 réellement utilisé par le client (HTTP2_ENABLED sans 'h2' retombe en HTTP/1.1)
+http2_active = False
+# Transport httpx de remplacement (ex. Bexio simulé en mémoire pour les benchmarks)
+http_transport: Optional[httpx.AsyncBaseTransport] = None
+http_stats = {"requests": 0, "errors": 0, "retries": 0}
 
-app = FastAPI(title="Bexio-Softr Connector", version="2.0.0")
+def create_http_client() -> httpx.AsyncClient:
+    """Crée le client HTTP partagé avec pool de connexions"""
+    global http2_active
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP2_ENABLED mais le paquet 'h2' est absent, utilisation de HTTP/1.1")
+            http2 = False
+    http2_active = http2
+    
+    return httpx.AsyncClient(
+        http2=http2,
+        transport=http_transport,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    """Retourne le client HTTP partagé (créé à la demande hors lifespan)"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = create_http_client()
+    return http_client
+
+def get_http_pool_stats() -> Dict:
+    """Statistiques du pool de connexions HTTP"""
+    stats = {
+        "http2": http2_active,
+        "http2_requested": HTTP2_ENABLED,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive": HTTP_MAX_KEEPALIVE,
+        "requests": http_stats["requests"],
+        "errors": http_stats["errors"],
+        "retries": http_stats["retries"],
+        "connections": 0,
+        "idle": 0,
+        "active": 0,
+    }
+    if http_client is None or http_client.is_closed:
+        return stats
+    
+    # httpx n'expose pas le pool publiquement : lecture défensive de httpcore
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for conn in connections if conn.is_idle())
+    stats.update({
+        "connections": len(connections),
+        "idle": idle,
+        "active": len(connections) - idle,
+    })
+    return stats
+
+# État partagé entre workers (cache, verrous, seaux de débit)
+class MemoryBackend:
+    """Backend local au processus : rien n'est partagé, les verrous ne valent que pour ce worker"""
+    
+    name = "memory"
+    shared = False
+    
+    def __init__(self):
+        self.locks: Dict[str, tuple] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+    
+    async def get(self, key: str) -> Optional[bytes]:
+        return None
+    
+    async def set(self, key: str, value: bytes, ttl: float):
+        pass
+    
+    async def delete_prefix(self, prefix: str) -> int:
+        return 0
+    
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        now = time.monotonic()
+        current = self.locks.get(name)
+        if current and current[1] > now:
+            return None
+        token = os.urandom(8).hex()
+        self.locks[name] = (token, now + ttl)
+        return token
+    
+    async def release_lock(self, name: str, token: str):
+        if self.locks.get(name, (None,))[0] == token:
+            del self.locks[name]
+    
+    async def reserve_token(self, name: str, rate: float, capacity: float) -> float:
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            bucket = self.buckets[name] = TokenBucket(rate, capacity)
+        return bucket.reserve()
+    
+    async def publish(self, channel: str, message: Dict):
+        pass
+    
+    async def listen(self, channel: str, handler):
+        pass
+    
+    async def close(self):
+        self.locks.clear()
+        self.buckets.clear()
+
+# Seau à jetons atomique côté Redis (même algorithme que TokenBucket, horloge du serveur)
+REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+REDIS_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisBackend:
+    """Backend Redis (ou compatible) : cache L2, verrous, seaux de débit et invalidations entre workers"""
+    
+    name = "redis"
+    shared = True
+    
+    def __init__(self, url: str, prefix: str):
+        if redis_asyncio is None:
+            raise RuntimeError("SHARED_BACKEND=redis nécessite le paquet redis")
+        self.prefix = prefix
+        self.redis = redis_asyncio.from_url(url)
+        self.token_bucket = self.redis.register_script(REDIS_TOKEN_BUCKET)
+        self.release_script = self.redis.register_script(REDIS_RELEASE_LOCK)
+    
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis.get(self.prefix + key)
+    
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.redis.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+    
+    async def delete_prefix(self, prefix: str) -> int:
+        deleted = 0
+        batch = []
+        async for key in self.redis.scan_iter(match=self.prefix + prefix + "*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await self.redis.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await self.redis.unlink(*batch)
+        return deleted
+    
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        token = os.urandom(8).hex()
+        acquired = await self.redis.set(self.prefix + "lock:" + name, token, nx=True, px=max(1, int(ttl * 1000)))
+        return token if acquired else None
+    
+    async def release_lock(self, name: str, token: str):
+        await self.release_script(keys=[self.prefix + "lock:" + name], args=[token])
+    
+    async def reserve_token(self, name: str, rate: float, capacity: float) -> float:
+        wait = await self.token_bucket(keys=[self.prefix + "bucket:" + name], args=[rate, capacity])
+        return float(wait)
+    
+    async def publish(self, channel: str, message: Dict):
+        await self.redis.publish(self.prefix + channel, dump_json({**message, "origin": os.getpid()}))
+    
+    async def listen(self, channel: str, handler):
+        """Reçoit les messages des autres workers (reconnexion automatique)"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.prefix + channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") != os.getpid():
+                        handler(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur abonnement {channel}: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+    
+    async def close(self):
+        await self.redis.aclose()
+
+def create_shared_backend():
+    if SHARED_BACKEND == "redis":
+        return RedisBackend(REDIS_URL, SHARED_KEY_PREFIX)
+    return MemoryBackend()
+
+shared_state = MemoryBackend()
+shared_stats = {"cache_hits": 0, "cache_misses": 0, "lock_waits": 0, "invalidations_received": 0}
+
+async def wait_for_lock(name: str, ttl: float, timeout: float) -> Optional[str]:
+    """Attend un verrou partagé ; None si le délai est dépassé"""
+    deadline = time.monotonic() + timeout
+    token = await shared_state.acquire_lock(name, ttl)
+    if token is None:
+        shared_stats["lock_waits"] += 1
+    while token is None and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+        token = await shared_state.acquire_lock(name, ttl)
+    return token
+
+# Cache des réponses Bexio
+class ResponseCache:
+    """Cache TTL + LRU avec stale-while-revalidate, borné en mémoire"""
+    
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self.total_bytes = 0
+        self.refreshing: Dict[tuple, asyncio.Task] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "refreshes": 0}
+    
+    @staticmethod
+    def make_key(client_id: str, endpoint: str, params: Optional[Dict] = None) -> tuple:
+        return (client_id, endpoint, tuple(sorted((params or {}).items())))
+    
+    @staticmethod
+    def ttl_for(endpoint: str) -> float:
+        return CACHE_TTLS.get(endpoint, CACHE_DEFAULT_TTL)
+    
+    def get(self, key: tuple):
+        """Retourne (valeur, est_fraiche) ou None si absente ou expirée"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        
+        age = time.monotonic() - entry["stored_at"]
+        ttl = self.ttl_for(key[1])
+        if age > ttl + CACHE_STALE_TTL:
+            # Conservée (jusqu'à éviction LRU) comme dernière valeur connue
+            self.stats["misses"] += 1
+            return None
+        
+        self.entries.move_to_end(key)
+        if age > ttl:
+            self.stats["stale_hits"] += 1
+            return entry["value"], False
+        
+        self.stats["hits"] += 1
+        return entry["value"], True
+    
+    def set(self, key: tuple, value, age: float = 0.0):
+        """Stocke une valeur ; age > 0 pour une valeur déjà ancienne (lue dans le cache partagé)"""
+        serialized = dump_json(value)
+        size = len(serialized)
+        # L'ancienne valeur est retirée même si la nouvelle est trop grosse pour être gardée
+        if key in self.entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        
+        self.entries[key] = {
+            "value": value,
+            "stored_at": time.monotonic() - age,
+            "size": size,
+            # Version du contenu, utilisée pour les ETag sans resérialiser
+            "etag": hashlib.blake2b(serialized, digest_size=16).hexdigest(),
+        }
+        self.total_bytes += size
+        
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+    
+    def etag(self, key: tuple, fresh_only: bool = False) -> Optional[str]:
+        """Version de l'entrée en cache (None si absente, ou périmée avec fresh_only)"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if fresh_only and time.monotonic() - entry["stored_at"] > self.ttl_for(key[1]):
+            return None
+        return entry["etag"]
+    
+    def last_known(self, key: tuple):
+        """Dernière valeur connue, même expirée (secours si Bexio est indisponible)"""
+        entry = self.entries.get(key)
+        return entry["value"] if entry else None
+    
+    def invalidate(self, client_id: str, endpoint: Optional[str] = None) -> int:
+        """Supprime les entrées d'un client (optionnellement d'un seul endpoint)"""
+        keys = [
+            key for key in self.entries
+            if key[0] == client_id and (endpoint is None or key[1] == endpoint)
+        ]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+    
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+    
+    def revalidate(self, key: tuple, fetch):
+        """Lance un rafraîchissement en arrière-plan (un seul par clé, fetch met à jour le cache)"""
+        if key in self.refreshing:
+            return
+        
+        async def _refresh():
+            try:
+                await fetch()
+                self.stats["refreshes"] += 1
+            except Exception as e:
+                logger.warning(f"Rafraîchissement cache échoué pour {key[0]}/{key[1]}: {str(e)}")
+            finally:
+                self.refreshing.pop(key, None)
+        
+        self.refreshing[key] = asyncio.create_task(_refresh())
+    
+    async def close(self):
+        for task in list(self.refreshing.values()):
+            task.cancel()
+        self.refreshing.clear()
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "refreshing": len(self.refreshing),
+        }
+    
+    def _remove(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry["size"]
+
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+# Déduplication des appels Bexio identiques en cours
+class RequestCoalescer:
+    """Partage un même appel upstream entre requêtes identiques concurrentes"""
+    
+    def __init__(self):
+        self.inflight: Dict[tuple, asyncio.Task] = {}
+        self.stats = {"upstream_calls": 0, "coalesced": 0}
+    
+    async def run(self, key: tuple, fetch):
+        task = self.inflight.get(key)
+        if task is None:
+            self.stats["upstream_calls"] += 1
+            task = asyncio.create_task(fetch())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        
+        # shield : l'annulation d'un appelant n'interrompt pas l'appel partagé
+        return await asyncio.shield(task)
+    
+    def get_stats(self) -> Dict:
+        return {**self.stats, "inflight": len(self.inflight)}
+
+request_coalescer = RequestCoalescer()
+
+# Ordonnancement des appels Bexio
+class TokenBucket:
+    """Seau à jetons : débit moyen `rate`/s avec rafale `capacity`"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def reserve(self) -> float:
+        """Réserve un jeton ; retourne l'attente nécessaire en secondes"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class UpstreamScheduler:
+    """Limite de débit par client et créneaux globaux attribués en round-robin entre clients"""
+    
+    def __init__(self, max_concurrency: int, rate: float, burst: float):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.active = 0
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.queues: "OrderedDict[str, deque]" = OrderedDict()
+        self.stats = {"throttled": 0, "queued": 0}
+    
+    @asynccontextmanager
+    async def slot(self, client_id: str):
+        await self._throttle(client_id)
+        await self._acquire(client_id)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    async def _throttle(self, client_id: str):
+        wait = None
+        try:
+            # Seau du backend d'état : commun à tous les workers avec Redis
+            wait = await shared_state.reserve_token(f"ratelimit:{client_id}", self.rate, self.burst)
+        except Exception as e:
+            logger.error(f"Seau de débit partagé indisponible: {str(e)}")
+        if wait is None:
+            # Repli local si Redis est indisponible
+            bucket = self.buckets.get(client_id)
+            if bucket is None:
+                bucket = self.buckets[client_id] = TokenBucket(self.rate, self.burst)
+            wait = bucket.reserve()
+        if wait > 0:
+            self.stats["throttled"] += 1
+            await asyncio.sleep(wait)
+    
+    async def _acquire(self, client_id: str):
+        if self.active < self.max_concurrency and not self.queues:
+            self.active += 1
+            return
+        
+        self.stats["queued"] += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(client_id, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Créneau déjà attribué : le rendre au suivant
+                self._release()
+            else:
+                queue = self.queues.get(client_id)
+                if queue and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self.queues[client_id]
+            raise
+    
+    def _release(self):
+        # Le créneau passe directement au prochain client (round-robin)
+        while self.queues:
+            client_id, queue = next(iter(self.queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self.queues.move_to_end(client_id)
+            else:
+                del self.queues[client_id]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+    
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "waiting": sum(len(queue) for queue in self.queues.values()),
+            "waiting_clients": len(self.queues),
+        }
+
+class CircuitBreaker:
+    """Disjoncteur : coupe les appels Bexio après des échecs consécutifs"""
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float, stats: Optional[Dict] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = None
+        self.stats = stats if stats is not None else {"opened": 0, "rejected": 0}
+    
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if now - self.opened_at < self.reset_timeout:
+                self.stats["rejected"] += 1
+                return False
+            self.state = "half_open"
+            self.probe_started = None
+        
+        # Semi-ouvert : un seul appel de test à la fois
+        if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+            self.stats["rejected"] += 1
+            return False
+        self.probe_started = now
+        return True
+    
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probe_started = None
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+                logger.warning("Disjoncteur Bexio ouvert")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+    
+    def get_stats(self) -> Dict:
+        return {**self.stats, "state": self.state, "failures": self.failures}
+
+class TenantCircuitBreakers:
+    """Un disjoncteur par client : les échecs d'un tenant ne coupent pas les autres"""
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {"opened": 0, "rejected": 0}
+    
+    def allow(self, client_id: str) -> bool:
+        breaker = self.breakers.get(client_id)
+        return breaker is None or breaker.allow()
+    
+    def record_success(self, client_id: str):
+        # Disjoncteur refermé sans échec en cours : inutile de le conserver
+        self.breakers.pop(client_id, None)
+    
+    def record_failure(self, client_id: str):
+        breaker = self.breakers.get(client_id)
+        if breaker is None:
+            breaker = self.breakers[client_id] = CircuitBreaker(
+                self.failure_threshold, self.reset_timeout, self.stats
+            )
+        breaker.record_failure()
+    
+    def get_stats(self) -> Dict:
+        states = [breaker.state for breaker in self.breakers.values()]
+        return {
+            **self.stats,
+            "open": states.count("open"),
+            "half_open": states.count("half_open"),
+            "failing": states.count("closed"),
+        }
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """En-tête Retry-After (secondes ou date HTTP) converti en secondes"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return (retry_at - datetime.now(retry_at.tzinfo)).total_seconds()
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Backoff exponentiel avec jitter, ou Retry-After (secondes) si fourni par Bexio"""
+    if retry_after is not None:
+        return min(max(retry_after, 0.0), UPSTREAM_BACKOFF_MAX)
+    
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * (2 ** attempt)))
+
+def upstream_error_status(status_code: int) -> int:
+    """Code HTTP renvoyé au client pour une erreur Bexio"""
+    if status_code in (401, 403, 404, 429):
+        return status_code
+    return 502 if status_code >= 500 else 400
+
+upstream_scheduler = UpstreamScheduler(UPSTREAM_MAX_CONCURRENCY, UPSTREAM_RATE_PER_SECOND, UPSTREAM_RATE_BURST)
+circuit_breakers = TenantCircuitBreakers(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+
+def register_pool_metrics():
+    """Jauges d'utilisation des pools, évaluées à chaque lecture de /metrics"""
+    for state in ("connections", "active", "idle"):
+        HTTP_POOL_CONNECTIONS.labels(state).set_function(lambda state=state: get_http_pool_stats()[state])
+    
+    pool = engine.pool
+    for state, method in (("checked_out", "checkedout"), ("size", "size"), ("overflow", "overflow")):
+        if hasattr(pool, method):
+            DB_POOL_CONNECTIONS.labels(state).set_function(getattr(pool, method))
+    DB_THREADS_BUSY.set_function(lambda: db_limiter.borrowed_tokens if db_limiter else 0)
+
+register_pool_metrics()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialise et ferme les ressources partagées de l'application"""
+    global http_client, shared_state, SEARCH_BACKEND
+    shared_state = create_shared_backend()
+    # Schéma à jour (migré avant le démarrage des workers) : détection seule, sans DDL
+    SEARCH_BACKEND = await run_db(migrate_database if DB_AUTO_MIGRATE else detect_search_backend)
+    
+    http_client = create_http_client()
+    logger.info(f"Client HTTP partagé initialisé (worker {os.getpid()}, état partagé: {shared_state.name})")
+    invalidation_listener = asyncio.create_task(shared_state.listen("invalidate", handle_remote_invalidation))
+    token_refresher = asyncio.create_task(token_cache.run_refresh_loop(TOKEN_REFRESH_INTERVAL))
+    sync_interval = MIRROR_SYNC_INTERVAL_WEBHOOKS if WEBHOOK_SECRET else MIRROR_SYNC_INTERVAL
+    mirror_syncer = asyncio.create_task(mirror_sync.run_loop(sync_interval)) if MIRROR_SYNC_ENABLED else None
+    webhook_worker = asyncio.create_task(webhook_processor.run_loop(WEBHOOK_POLL_INTERVAL)) if WEBHOOK_SECRET else None
+    if JOBS_ENABLED:
+        job_queue.start()
+    try:
+        yield
+    finally:
+        await job_queue.close()
+        token_refresher.cancel()
+        if mirror_syncer:
+            mirror_syncer.cancel()
+        if webhook_worker:
+            webhook_worker.cancel()
+        await mirror_sync.close()
+        await token_cache.close()
+        await response_cache.close()
+        invalidation_listener.cancel()
+        await shared_state.close()
+        await http_client.aclose()
+        http_client = None
+        logger.info("Client HTTP partagé fermé")
+
+app = FastAPI(
+    title="Bexio-Softr Connector",
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -75,11 +1316,20 @@ class TaskCreate(BaseModel):
     description: Optional[str] = None
     due_date: Optional[datetime] = None
 
+class JobCreate(BaseModel):
+    kind: str
+    client_id: str
+    params: Dict = {}
+    max_attempts: Optional[int] = None
+
 class TaskUpdate(BaseModel):
     status: Optional[str] = None
     title: Optional[str] = None
     description: Optional[str] = None
 
+class TaskBulkUpdate(TaskUpdate):
+    id: int
+
 def get_db():
     db = SessionLocal()
     try:
@@ -87,6 +1337,882 @@ def get_db():
     finally:
         db.close()
 
+db_limiter: Optional[anyio.CapacityLimiter] = None
+
+async def run_db(func, *args, **kwargs):
+    """Exécute un appel SQLAlchemy synchrone hors de la boucle d'événements"""
+    global db_limiter
+    if db_limiter is None:
+        db_limiter = anyio.CapacityLimiter(DB_THREADS)
+    
+    operation = args[0].__name__ if func is with_session else func.__name__
+    call = functools.partial(func, *args, **kwargs)
+    
+    def timed_call():
+        started = time.perf_counter()
+        try:
+            return call()
+        finally:
+            DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started)
+    
+    return await anyio.to_thread.run_sync(timed_call, limiter=db_limiter)
+
+def with_session(func, *args, **kwargs):
+    """Exécute func avec une session dédiée (appels DB concurrents)"""
+    db = SessionLocal()
+    try:
+        return func(db, *args, **kwargs)
+    finally:
+        db.close()
+
+# Formatage des données Bexio pour Softr
+# Champ exposé -> (valeur par défaut, conversion)
+CONTACT_FIELDS = {
+    "id": (None, None),
+    "name_1": ("", None),
+    "name_2": ("", None),
+    "mail": ("", None),
+    "phone_fixed": ("", None),
+    "phone_mobile": ("", None),
+    "address": ("", None),
+    "city": ("", None),
+    "postcode": ("", None),
+}
+
+INVOICE_FIELDS = {
+    "id": (None, None),
+    "document_nr": ("", None),
+    "title": ("", None),
+    "total_gross": (0, float),
+    "total_net": (0, float),
+    "currency": ("CHF", None),
+    "is_valid_from": ("", None),
+    "is_valid_to": ("", None),
+    "contact_id": (0, None),
+}
+
+def parse_fields(fields: Optional[str], spec: Dict) -> Optional[List[str]]:
+    """Projection ?fields=a,b ; HTTPException 400 si un champ est inconnu"""
+    if not fields:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in spec]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Champs inconnus: {', '.join(unknown)}")
+    return selected
+
+@functools.lru_cache(maxsize=128)
+def make_formatter(spec_name: str, fields: Optional[tuple] = None):
+    """Construit une fonction de formatage pour les champs demandés (une passe par enregistrement)"""
+    spec = FORMAT_SPECS[spec_name]
+    plain = [(name, default) for name, (default, convert) in spec.items()
+             if convert is None and (fields is None or name in fields)]
+    converted = [(name, default, convert) for name, (default, convert) in spec.items()
+                 if convert is not None and (fields is None or name in fields)]
+    order = list(fields) if fields else list(spec)
+    
+    def format_record(record: Dict) -> Dict:
+        get = record.get
+        values = {name: get(name) or default for name, default in plain}
+        for name, default, convert in converted:
+            values[name] = convert(get(name) or default)
+        return {name: values[name] for name in order}
+    
+    return format_record
+
+def format_records(records, spec_name: str, fields: Optional[List[str]] = None) -> List[Dict]:
+    if not isinstance(records, list):
+        return []
+    formatter = make_formatter(spec_name, tuple(fields) if fields else None)
+    return list(map(formatter, records))
+
+FORMAT_SPECS = {"contact": CONTACT_FIELDS, "invoice": INVOICE_FIELDS}
+
+# Accès base de données (synchrone, appelé via run_db)
+def serialize_task(task: TaskManagement) -> Dict:
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "status": task.status,
+        "due_date": task.due_date.isoformat() if task.due_date else None,
+        "created_at": task.created_at.isoformat() if task.created_at else None
+    }
+
+def serialize_client_auth(client_auth: ClientAuth) -> Dict:
+    return {
+        "access_token": client_auth.access_token,
+        "refresh_token": client_auth.refresh_token,
+        "expires_at": client_auth.expires_at,
+    }
+
+def db_get_client_auth(db: Session, client_id: str) -> Optional[Dict]:
+    client_auth = db.query(ClientAuth).filter(
+        ClientAuth.client_id == client_id,
+        ClientAuth.is_active == True
+    ).first()
+    return serialize_client_auth(client_auth) if client_auth else None
+
+def db_save_client_tokens(db: Session, client_id: str, token_data: Dict) -> Dict:
+    client_auth = db.query(ClientAuth).filter(ClientAuth.client_id == client_id).first()
+    if not client_auth:
+        client_auth = ClientAuth(client_id=client_id)
+        db.add(client_auth)
+    
+    client_auth.access_token = token_data["access_token"]
+    # Bexio peut ne pas renvoyer de nouveau refresh_token lors d'un rafraîchissement
+    client_auth.refresh_token = token_data.get("refresh_token") or client_auth.refresh_token or ""
+    client_auth.expires_at = datetime.utcnow() + timedelta(seconds=token_data.get("expires_in", 3600))
+    client_auth.updated_at = datetime.utcnow()
+    db.commit()
+    return serialize_client_auth(client_auth)
+
+def db_list_active_clients(db: Session) -> List[str]:
+    return [row.client_id for row in db.query(ClientAuth.client_id).filter(ClientAuth.is_active == True)]
+
+def serialize_sync_state(state: SyncState) -> Dict:
+    return {
+        "resource": state.resource,
+        "cursor": state.cursor,
+        "status": state.status,
+        "error": state.error,
+        "records": state.records,
+        "version": state.version or 0,
+        "last_sync": state.last_sync.isoformat() if state.last_sync else None,
+        "last_full_sync": state.last_full_sync.isoformat() if state.last_full_sync else None,
+    }
+
+def db_get_sync_states(db: Session, client_id: str) -> List[Dict]:
+    states = db.query(SyncState).filter(SyncState.client_id == client_id).all()
+    return [serialize_sync_state(state) for state in states]
+
+def db_get_sync_state(db: Session, client_id: str, resource: str) -> Optional[Dict]:
+    state = db.get(SyncState, (client_id, resource))
+    if not state:
+        return None
+    return {**serialize_sync_state(state), "last_full_sync": state.last_full_sync}
+
+def db_save_sync_state(db: Session, client_id: str, resource: str, **fields):
+    state = db.get(SyncState, (client_id, resource))
+    if not state:
+        state = SyncState(client_id=client_id, resource=resource)
+        db.add(state)
+    for name, value in fields.items():
+        setattr(state, name, value)
+    db.commit()
+
+def db_get_mirror_version(db: Session, client_id: str, resource: str) -> int:
+    state = db.get(SyncState, (client_id, resource))
+    return state.version or 0 if state else 0
+
+def db_upsert_mirror(db: Session, model, client_id: str, rows: List[Dict], track_aggregates: bool = True,
+                     touch_unchanged: bool = False) -> int:
+    """Remplace les lignes du miroir qui ont changé (une transaction) ; retourne leur nombre
+    
+    Une ligne est inchangée si son enregistrement Bexio brut est identique. Pendant une
+    synchronisation complète (touch_unchanged), seul son synced_at est mis à jour (purge).
+    Pour les factures, les agrégats sont mis à jour par différence dans la même
+    transaction (sauf pendant une synchronisation complète, suivie d'un recalcul).
+    """
+    ids = [row["id"] for row in rows]
+    stored = dict(db.query(model.id, model.raw).filter(model.client_id == client_id, model.id.in_(ids)).all())
+    changed = [row for row in rows if stored.get(row["id"]) != row["raw"]]
+    unchanged = [row["id"] for row in rows if stored.get(row["id"]) == row["raw"]]
+    
+    if changed:
+        changed_ids = [row["id"] for row in changed]
+        if model is BexioInvoice and track_aggregates:
+            db_apply_invoice_deltas(db, client_id, db_get_invoice_rows(db, client_id, changed_ids), changed)
+        db.query(model).filter(model.client_id == client_id, model.id.in_(changed_ids)).delete(synchronize_session=False)
+        db.execute(insert(model), changed)
+    if unchanged and touch_unchanged:
+        db.query(model).filter(model.client_id == client_id, model.id.in_(unchanged)).update(
+            {"synced_at": rows[0]["synced_at"]}, synchronize_session=False
+        )
+    db.commit()
+    return len(changed)
+
+def db_prune_mirror(db: Session, model, client_id: str, before: datetime) -> int:
+    """Supprime les lignes absentes d'une synchronisation complète"""
+    deleted = db.query(model).filter(model.client_id == client_id, model.synced_at < before).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def db_get_mirror_page(db: Session, model, client_id: str, after_id: Optional[int], limit: int) -> List[Dict]:
+    query = db.query(model).filter(model.client_id == client_id)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    columns = [column.name for column in model.__table__.columns if column.name != "raw"]
+    return [
+        {name: getattr(row, name) for name in columns}
+        for row in query.order_by(model.id).limit(limit).all()
+    ]
+
+def db_count_mirror(db: Session, model, client_id: str) -> int:
+    return db.query(func.count(model.id)).filter(model.client_id == client_id).scalar()
+
+def db_delete_mirror_record(db: Session, model, client_id: str, record_id: int) -> int:
+    if model is BexioInvoice:
+        db_apply_invoice_deltas(db, client_id, db_get_invoice_rows(db, client_id, [record_id]), [])
+    deleted = db.query(model).filter(model.client_id == client_id, model.id == record_id).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def db_patch_mirror_record(db: Session, model, client_id: str, row: Dict) -> bool:
+    """Remplace une ligne du miroir, sauf si la version locale est plus récente"""
+    current = db.query(model.updated_at).filter(model.client_id == client_id, model.id == row["id"]).scalar()
+    if current and row["updated_at"] and current > row["updated_at"]:
+        return False
+    return db_upsert_mirror(db, model, client_id, [row]) > 0
+
+def db_bump_mirror_version(db: Session, client_id: str, resource: str):
+    """Nouvelle version des données du miroir (invalide les ETag source=mirror)"""
+    state = db.get(SyncState, (client_id, resource))
+    if not state:
+        state = SyncState(client_id=client_id, resource=resource, version=0)
+        db.add(state)
+    state.version = (state.version or 0) + 1
+    db.commit()
+
+# Agrégats de factures
+AGGREGATES_STATE = "invoice_aggregates"
+AGGREGATE_COLUMNS = ["id", "currency", "total_gross", "total_net", "is_valid_from", "is_valid_to", "kb_item_status_id"]
+AGING_BUCKETS = ((30, "1-30"), (60, "31-60"), (90, "61-90"))
+
+def aging_bucket(due: Optional[str], as_of: str) -> str:
+    """Tranche d'ancienneté d'une facture ouverte (jours de retard sur is_valid_to)"""
+    if not due or due[:10] >= as_of:
+        return "current"
+    days = (datetime.fromisoformat(as_of) - datetime.fromisoformat(due[:10])).days
+    for limit, name in AGING_BUCKETS:
+        if days <= limit:
+            return name
+    return "90+"
+
+def invoice_contributions(row: Dict, as_of: str):
+    """Clés (kind, bucket, devise) auxquelles une facture contribue, avec ses montants"""
+    currency = row.get("currency") or "CHF"
+    is_open = row.get("kb_item_status_id") in OPEN_INVOICE_STATUSES
+    gross = row.get("total_gross") or 0
+    values = (1, gross, row.get("total_net") or 0, 1 if is_open else 0, gross if is_open else 0)
+    yield ("currency", "", currency), values
+    yield ("month", (row.get("is_valid_from") or "")[:7], currency), values
+    if is_open:
+        yield ("aging", aging_bucket(row.get("is_valid_to"), as_of), currency), values
+
+def db_get_invoice_rows(db: Session, client_id: str, ids: List[int]) -> List[Dict]:
+    columns = [getattr(BexioInvoice, name) for name in AGGREGATE_COLUMNS]
+    rows = db.query(*columns).filter(BexioInvoice.client_id == client_id, BexioInvoice.id.in_(ids)).all()
+    return [dict(zip(AGGREGATE_COLUMNS, row)) for row in rows]
+
+def db_apply_invoice_deltas(db: Session, client_id: str, old_rows: List[Dict], new_rows: List[Dict]):
+    """Retire les anciennes versions et ajoute les nouvelles (sans commit, transaction de l'appelant)"""
+    state = db.get(SyncState, (client_id, AGGREGATES_STATE))
+    if not state:
+        # Agrégats jamais calculés : le premier calcul se fera en masse
+        return
+    deltas: Dict[tuple, List[float]] = {}
+    for rows, sign in ((old_rows, -1), (new_rows, 1)):
+        for row in rows:
+            for key, values in invoice_contributions(row, state.cursor):
+                delta = deltas.setdefault(key, [0, 0.0, 0.0, 0, 0.0])
+                for index, value in enumerate(values):
+                    delta[index] += sign * value
+    
+    for (kind, bucket, currency), (count, gross, net, open_count, open_amount) in deltas.items():
+        if not any((count, gross, net, open_count, open_amount)):
+            continue
+        aggregate = db.get(InvoiceAggregate, (client_id, kind, bucket, currency))
+        if aggregate is None:
+            aggregate = InvoiceAggregate(client_id=client_id, kind=kind, bucket=bucket, currency=currency,
+                                         count=0, total_gross=0, total_net=0, open_count=0, open_amount=0)
+            db.add(aggregate)
+        aggregate.count += count
+        aggregate.total_gross += gross
+        aggregate.total_net += net
+        aggregate.open_count += open_count
+        aggregate.open_amount += open_amount
+        if aggregate.count <= 0:
+            db.delete(aggregate)
+
+def db_rebuild_invoice_aggregates(db: Session, client_id: str, kinds: tuple = ("currency", "month", "aging")):
+    """Recalcul en masse par GROUP BY dans la base (premier calcul, après synchronisation complète, ancienneté du jour)"""
+    as_of = datetime.utcnow().strftime("%Y-%m-%d")
+    invoice = BexioInvoice
+    is_open = invoice.kb_item_status_id.in_(OPEN_INVOICE_STATUSES)
+    currency = func.coalesce(invoice.currency, "CHF")
+    buckets = {
+        "currency": literal(""),
+        "month": func.coalesce(func.substr(invoice.is_valid_from, 1, 7), ""),
+        "aging": case(
+            (or_(invoice.is_valid_to.is_(None), invoice.is_valid_to == "",
+                 func.substr(invoice.is_valid_to, 1, 10) >= as_of), "current"),
+            *[
+                (func.substr(invoice.is_valid_to, 1, 10) >= (datetime.utcnow() - timedelta(days=limit)).strftime("%Y-%m-%d"), name)
+                for limit, name in AGING_BUCKETS
+            ],
+            else_="90+",
+        ),
+    }
+    
+    db.query(InvoiceAggregate).filter(
+        InvoiceAggregate.client_id == client_id, InvoiceAggregate.kind.in_(kinds)
+    ).delete(synchronize_session=False)
+    for kind in kinds:
+        # Sous-requête : GROUP BY sur des colonnes nommées (expressions paramétrées refusées par PostgreSQL)
+        rows = (
+            select(
+                buckets[kind].label("bucket"),
+                currency.label("currency"),
+                func.coalesce(invoice.total_gross, 0).label("gross"),
+                func.coalesce(invoice.total_net, 0).label("net"),
+                case((is_open, 1), else_=0).label("is_open"),
+            )
+            .where(invoice.client_id == client_id, *([is_open] if kind == "aging" else []))
+            .subquery()
+        )
+        query = select(
+            literal(client_id), literal(kind), rows.c.bucket, rows.c.currency,
+            func.count(),
+            func.sum(rows.c.gross),
+            func.sum(rows.c.net),
+            func.sum(rows.c.is_open),
+            func.sum(rows.c.gross * rows.c.is_open),
+        ).group_by(rows.c.bucket, rows.c.currency)
+        db.execute(insert(InvoiceAggregate).from_select(
+            ["client_id", "kind", "bucket", "currency", "count", "total_gross", "total_net", "open_count", "open_amount"],
+            query,
+        ))
+    
+    state = db.get(SyncState, (client_id, AGGREGATES_STATE))
+    if not state:
+        state = SyncState(client_id=client_id, resource=AGGREGATES_STATE)
+        db.add(state)
+    state.cursor = as_of
+    state.last_sync = datetime.utcnow()
+    if len(kinds) == 3:
+        state.last_full_sync = state.last_sync
+    db.commit()
+
+def db_stale_aggregate_kinds(db: Session, client_id: str) -> tuple:
+    """Agrégats à recalculer : tous s'ils n'existent pas, l'ancienneté si elle date d'un autre jour"""
+    state = db.get(SyncState, (client_id, AGGREGATES_STATE))
+    if not state:
+        return ("currency", "month", "aging")
+    if state.cursor != datetime.utcnow().strftime("%Y-%m-%d"):
+        return ("aging",)
+    return ()
+
+def db_refresh_invoice_aggregates(db: Session, client_id: str, force: bool = False):
+    kinds = ("currency", "month", "aging") if force else db_stale_aggregate_kinds(db, client_id)
+    if kinds:
+        db_rebuild_invoice_aggregates(db, client_id, kinds)
+
+def db_get_invoice_aggregates(db: Session, client_id: str) -> Dict:
+    """Agrégats précalculés, en lecture seule (recalculs : refresh_invoice_aggregates)"""
+    state = db.get(SyncState, (client_id, AGGREGATES_STATE))
+    result = {"as_of": state.cursor if state else None, "by_currency": [], "by_month": [], "aging": []}
+    rows = (
+        db.query(InvoiceAggregate)
+        .filter(InvoiceAggregate.client_id == client_id)
+        .order_by(InvoiceAggregate.kind, InvoiceAggregate.bucket, InvoiceAggregate.currency)
+        .all()
+    )
+    for row in rows:
+        values = {
+            "currency": row.currency,
+            "count": row.count,
+            "total_gross": round(row.total_gross or 0, 2),
+            "total_net": round(row.total_net or 0, 2),
+            "open_count": row.open_count,
+            "open_amount": round(row.open_amount or 0, 2),
+        }
+        if row.kind == "currency":
+            result["by_currency"].append(values)
+        elif row.kind == "month":
+            result["by_month"].append({"month": row.bucket, **values})
+        else:
+            result["aging"].append({"bucket": row.bucket, **values})
+    return result
+
+def db_list_mirror_contacts(db: Session, client_id: str, fields: Optional[List[str]] = None) -> List[Dict]:
+    contacts = db.query(BexioContact).filter(BexioContact.client_id == client_id).order_by(BexioContact.id).all()
+    return format_records([contact.__dict__ for contact in contacts], "contact", fields)
+
+def db_list_mirror_invoices(db: Session, client_id: str, limit: int, offset: int,
+                            fields: Optional[List[str]] = None) -> List[Dict]:
+    invoices = (
+        db.query(BexioInvoice)
+        .filter(BexioInvoice.client_id == client_id)
+        .order_by(BexioInvoice.id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return format_records([invoice.__dict__ for invoice in invoices], "invoice", fields)
+
+def db_enqueue_webhook_events(db: Session, client_id: str, events: List[Dict]) -> List[int]:
+    rows = [{"client_id": client_id, "status": "pending", "attempts": 0, **event} for event in events]
+    ids = db.execute(insert(WebhookEvent).returning(WebhookEvent.id, sort_by_parameter_order=True), rows).scalars().all()
+    db.commit()
+    return list(ids)
+
+def db_claim_webhook_events(db: Session, limit: int) -> List[Dict]:
+    """Réserve des événements à traiter (les réservations expirées sont reprises)"""
+    token = os.urandom(8).hex()
+    now = datetime.utcnow()
+    claimable = or_(
+        WebhookEvent.status == "pending",
+        and_(WebhookEvent.status == "processing",
+             WebhookEvent.claimed_at < now - timedelta(seconds=WEBHOOK_CLAIM_TIMEOUT)),
+    )
+    ids = [row.id for row in db.query(WebhookEvent.id).filter(claimable).order_by(WebhookEvent.id).limit(limit)]
+    if not ids:
+        return []
+    # Condition répétée dans l'UPDATE : un autre worker ne peut pas réserver les mêmes lignes
+    db.query(WebhookEvent).filter(WebhookEvent.id.in_(ids), claimable).update(
+        {"status": "processing", "claim_token": token, "claimed_at": now}, synchronize_session=False
+    )
+    db.commit()
+    events = db.query(WebhookEvent).filter(WebhookEvent.claim_token == token).order_by(WebhookEvent.id).all()
+    return [
+        {
+            "id": event.id,
+            "client_id": event.client_id,
+            "resource": event.resource,
+            "action": event.action,
+            "record_id": event.record_id,
+            "payload": json.loads(event.payload) if event.payload else None,
+            "attempts": event.attempts or 0,
+        }
+        for event in events
+    ]
+
+def db_finish_webhook_events(db: Session, ids: List[int], error: Optional[str] = None):
+    """Marque des événements traités, ou les remet en file (erreur définitive après N essais)"""
+    now = datetime.utcnow()
+    if error is None:
+        values = {"status": "done", "error": None, "processed_at": now}
+    else:
+        values = {
+            "status": case((WebhookEvent.attempts + 1 >= WEBHOOK_MAX_ATTEMPTS, "error"), else_="pending"),
+            "attempts": WebhookEvent.attempts + 1,
+            "error": error,
+            "processed_at": now,
+        }
+    db.query(WebhookEvent).filter(WebhookEvent.id.in_(ids)).update(
+        {**values, "claim_token": None, "claimed_at": None}, synchronize_session=False
+    )
+    db.commit()
+
+def db_prune_webhook_events(db: Session, before: datetime) -> int:
+    deleted = db.query(WebhookEvent).filter(
+        WebhookEvent.status == "done", WebhookEvent.processed_at < before
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def db_count_webhook_events(db: Session) -> Dict[str, int]:
+    rows = db.query(WebhookEvent.status, func.count(WebhookEvent.id)).group_by(WebhookEvent.status).all()
+    return {status: count for status, count in rows}
+
+JOB_FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+def serialize_job(job: Job) -> Dict:
+    return {
+        "id": job.id,
+        "client_id": job.client_id,
+        "kind": job.kind,
+        "params": json.loads(job.params) if job.params else {},
+        "status": job.status,
+        "progress": job.progress or 0,
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts or 0,
+        "max_attempts": job.max_attempts,
+        "cancel_requested": bool(job.cancel_requested),
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def db_create_job(db: Session, client_id: str, kind: str, params: Dict, max_attempts: int) -> Dict:
+    job = Job(
+        id=os.urandom(12).hex(),
+        client_id=client_id,
+        kind=kind,
+        params=dump_json(params).decode(),
+        status="queued",
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    return serialize_job(job)
+
+def db_get_job(db: Session, job_id: str) -> Optional[Dict]:
+    job = db.get(Job, job_id)
+    return serialize_job(job) if job else None
+
+def db_list_jobs(db: Session, client_id: Optional[str] = None, status: Optional[str] = None,
+                 limit: int = 50) -> List[Dict]:
+    query = db.query(Job)
+    if client_id:
+        query = query.filter(Job.client_id == client_id)
+    if status:
+        query = query.filter(Job.status == status)
+    return [serialize_job(job) for job in query.order_by(Job.created_at.desc()).limit(limit).all()]
+
+def db_count_jobs(db: Session) -> Dict[str, int]:
+    rows = db.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    return {status: count for status, count in rows}
+
+def db_claim_job(db: Session, kinds: List[str]) -> Optional[Dict]:
+    """Réserve le prochain travail exécutable, en respectant la limite par client"""
+    now = datetime.utcnow()
+    # Worker disparu (plus de battement de cœur) : le travail est remis en file, ou abandonné
+    stale = and_(Job.status == "running", Job.heartbeat_at < now - timedelta(seconds=JOB_STALE_TIMEOUT))
+    db.query(Job).filter(stale, Job.attempts >= Job.max_attempts).update(
+        {"status": "failed", "error": "Worker interrompu", "claim_token": None, "finished_at": now},
+        synchronize_session=False,
+    )
+    db.query(Job).filter(stale).update(
+        {"status": "queued", "claim_token": None, "run_after": now}, synchronize_session=False
+    )
+    db.commit()
+    
+    busy = [
+        client_id for client_id, in db.query(Job.client_id)
+        .filter(Job.status == "running")
+        .group_by(Job.client_id)
+        .having(func.count(Job.id) >= JOB_MAX_PER_CLIENT)
+    ]
+    query = db.query(Job.id).filter(Job.status == "queued", Job.run_after <= now, Job.kind.in_(kinds))
+    if busy:
+        query = query.filter(Job.client_id.notin_(busy))
+    
+    token = os.urandom(8).hex()
+    for job_id, in query.order_by(Job.run_after, Job.created_at).limit(10).all():
+        claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update({
+            "status": "running",
+            "claim_token": token,
+            "attempts": Job.attempts + 1,
+            "started_at": now,
+            "heartbeat_at": now,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            job = db.get(Job, job_id)
+            return {**serialize_job(job), "checkpoint": json.loads(job.checkpoint) if job.checkpoint else None}
+    return None
+
+def db_heartbeat_job(db: Session, job_id: str, **fields) -> bool:
+    """Enregistre l'avancement ; retourne True si l'annulation a été demandée"""
+    job = db.get(Job, job_id)
+    if not job:
+        return True
+    job.heartbeat_at = datetime.utcnow()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    db.commit()
+    return bool(job.cancel_requested)
+
+def db_finish_job(db: Session, job_id: str, status: str, result: Optional[Dict] = None,
+                  error: Optional[str] = None, run_after: Optional[datetime] = None, release: bool = False):
+    """Termine un essai ; release=True rend l'essai (arrêt du worker, pas un échec)"""
+    job = db.get(Job, job_id)
+    if not job:
+        return
+    if release:
+        job.attempts = max(0, (job.attempts or 0) - 1)
+    job.status = status
+    job.error = error
+    job.claim_token = None
+    if result is not None:
+        job.result = dump_json(result).decode()
+    if status == "succeeded":
+        job.progress = 1
+    if status in JOB_FINAL_STATUSES:
+        job.finished_at = datetime.utcnow()
+    else:
+        job.run_after = run_after or datetime.utcnow()
+    db.commit()
+
+def db_request_job_cancel(db: Session, job_id: str) -> Optional[Dict]:
+    """Annule un travail en file, ou demande l'arrêt d'un travail en cours"""
+    job = db.get(Job, job_id)
+    if not job:
+        return None
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    elif job.status == "running":
+        job.cancel_requested = True
+    db.commit()
+    return serialize_job(job)
+
+# Curseurs de pagination par clé (tâches, recherche) : [tri, ordre, valeur, dernier id] en base64
+def encode_cursor(sort: str, order: str, value, last_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, last_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, order: str, value_types: tuple) -> tuple:
+    """Décode un curseur ; ValueError s'il est invalide, d'un autre tri ou d'un type inattendu"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, last_id = json.loads(payload)
+    except Exception:
+        raise ValueError("Curseur invalide")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise ValueError("Curseur incompatible avec le tri demandé")
+    # bool est un int pour isinstance : refusé explicitement
+    if (not isinstance(value, value_types) or isinstance(value, bool)
+            or not isinstance(last_id, int) or isinstance(last_id, bool)):
+        raise ValueError("Curseur invalide")
+    return value, last_id
+
+# Type de la valeur du curseur de recherche selon le tri
+SEARCH_CURSOR_TYPES = {"id": (int,), "name_1": (str,), "is_valid_from": (str,), "total_gross": (int, float)}
+
+def search_text_filter(model, q: str):
+    """Condition plein texte : chaque mot (préfixe) doit apparaître dans une des colonnes indexées"""
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    if SEARCH_BACKEND == "fts5":
+        fts = f"{model.__tablename__}_fts"
+        match = " ".join(f'"{word}"*' for word in words)
+        matching = text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :match").bindparams(match=match)
+        return literal_column(f"{model.__tablename__}.rowid").in_(matching)
+    
+    columns = [getattr(model, column) for column in SEARCH_COLUMNS[model]]
+    conditions = []
+    for word in words:
+        pattern = "%" + word.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(or_(*[func.lower(column).like(pattern, escape="\\") for column in columns]))
+    return and_(*conditions)
+
+def db_search_mirror(db: Session, model, spec_name: str, client_id: str, q: Optional[str], filters: List,
+                     sort: str, order: str, cursor: Optional[tuple], limit: int,
+                     fields: Optional[List[str]] = None) -> tuple:
+    """Recherche paginée par clé (tri, id) dans le miroir ; retourne (enregistrements, curseur suivant)"""
+    sort_column = SEARCH_SORT_COLUMNS[model][sort]
+    query = db.query(model).filter(model.client_id == client_id, *filters)
+    if q:
+        condition = search_text_filter(model, q)
+        if condition is not None:
+            query = query.filter(condition)
+    
+    descending = order == "desc"
+    if cursor is not None:
+        value, last_id = cursor
+        if sort == "id":
+            query = query.filter(model.id < last_id if descending else model.id > last_id)
+        elif descending:
+            query = query.filter(or_(sort_column < value, and_(sort_column == value, model.id < last_id)))
+        else:
+            query = query.filter(or_(sort_column > value, and_(sort_column == value, model.id > last_id)))
+    
+    if descending:
+        query = query.order_by(sort_column.desc(), model.id.desc())
+    else:
+        query = query.order_by(sort_column, model.id)
+    rows = query.limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        value = last.id if sort == "id" else getattr(last, sort)
+        if value is None:
+            value = SEARCH_SORT_DEFAULTS[model][sort]
+        next_cursor = encode_cursor(sort, order, value, last.id)
+    return format_records([row.__dict__ for row in rows], spec_name, fields), next_cursor
+
+PENDING_STATUSES = ["pending", "in_progress"]
+
+def db_count_pending_tasks_by_client(db: Session, client_ids: List[str]) -> Dict[str, int]:
+    """Tâches en attente de plusieurs clients en une requête"""
+    rows = (
+        db.query(TaskManagement.client_id, func.count(TaskManagement.id))
+        .filter(TaskManagement.client_id.in_(client_ids), TaskManagement.status.in_(PENDING_STATUSES))
+        .group_by(TaskManagement.client_id)
+        .all()
+    )
+    return {client_id: count for client_id, count in rows}
+
+def db_get_pending_tasks(db: Session, client_id: str, limit: Optional[int] = None) -> List[Dict]:
+    tasks, _ = db_list_tasks(db, client_id, PENDING_STATUSES, limit=limit or DASHBOARD_TASKS_LIMIT, sort="due_date")
+    return tasks
+
+def db_get_tasks_version(db: Session, client_id: str) -> tuple:
+    """Nombre de tâches et dernière modification d'un client (ETag sans charger les lignes)"""
+    count, last_update = db.query(
+        func.count(TaskManagement.id), func.max(TaskManagement.updated_at)
+    ).filter(TaskManagement.client_id == client_id).one()
+    return count, last_update.isoformat() if last_update else None
+
+def db_count_tasks(db: Session, client_id: str, statuses: Optional[List[str]] = None) -> int:
+    query = db.query(func.count(TaskManagement.id)).filter(TaskManagement.client_id == client_id)
+    if statuses:
+        query = query.filter(TaskManagement.status.in_(statuses))
+    return query.scalar()
+
+def db_create_task(db: Session, task: TaskCreate) -> int:
+    db_task = TaskManagement(
+        client_id=task.client_id,
+        title=task.title,
+        description=task.description,
+        due_date=task.due_date
+    )
+    db.add(db_task)
+    db.commit()
+    db.refresh(db_task)
+    return db_task.id
+
+# Tri sur les colonnes nues (utilisables par l'index (client_id, status, due_date))
+TASK_SORT_COLUMNS = {
+    "id": TaskManagement.id,
+    "due_date": TaskManagement.due_date,
+    "created_at": TaskManagement.created_at,
+}
+
+def encode_task_cursor(sort: str, order: str, task: TaskManagement) -> str:
+    # due_date None : le curseur est dans le segment des tâches sans échéance
+    value = task.id if sort == "id" else getattr(task, sort)
+    return encode_cursor(sort, order, value, task.id)
+
+def decode_task_cursor(cursor: str, sort: str, order: str) -> tuple:
+    """Décode un curseur de tâches ; ValueError s'il est invalide ou d'un autre tri"""
+    value_types = {"id": (int,), "due_date": (str, type(None))}.get(sort, (str,))
+    value, last_id = decode_cursor(cursor, sort, order, value_types)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value, last_id
+
+def keyset_page(query, column, order: str, cursor: Optional[tuple], limit: int) -> List:
+    """Page triée par (colonne, id) après le curseur (valeur, dernier id)"""
+    descending = order == "desc"
+    if cursor is not None:
+        value, last_id = cursor
+        if column is TaskManagement.id:
+            query = query.filter(column < last_id if descending else column > last_id)
+        elif descending:
+            query = query.filter(or_(column < value, and_(column == value, TaskManagement.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, TaskManagement.id > last_id)))
+    if descending:
+        query = query.order_by(column.desc(), TaskManagement.id.desc())
+    else:
+        query = query.order_by(column.asc(), TaskManagement.id.asc())
+    return query.limit(limit).all()
+
+def due_date_page(query, order: str, cursor: Optional[tuple], limit: int) -> List:
+    """Tri par échéance, tâches sans échéance en dernier (en premier en ordre décroissant)
+    
+    Deux segments lus l'un après l'autre plutôt qu'un tri sur une expression : chaque
+    segment est trié sur la colonne nue et reste utilisable par l'index.
+    """
+    dated = (query.filter(TaskManagement.due_date.isnot(None)), TaskManagement.due_date)
+    undated = (query.filter(TaskManagement.due_date.is_(None)), TaskManagement.id)
+    segments = [dated, undated] if order == "asc" else [undated, dated]
+    start = 0
+    if cursor is not None:
+        start = segments.index(undated if cursor[0] is None else dated)
+    
+    tasks = []
+    for index in range(start, len(segments)):
+        segment, column = segments[index]
+        tasks += keyset_page(segment, column, order, cursor if index == start else None, limit - len(tasks))
+        if len(tasks) >= limit:
+            break
+    return tasks
+
+def db_list_tasks(db: Session, client_id: str, statuses: Optional[List[str]] = None,
+                  limit: int = TASKS_DEFAULT_LIMIT, cursor: Optional[tuple] = None,
+                  sort: str = "id", order: str = "asc") -> tuple:
+    """Page de tâches par pagination par clé ; retourne (tâches, curseur suivant)"""
+    query = db.query(TaskManagement).filter(TaskManagement.client_id == client_id)
+    
+    if statuses:
+        query = query.filter(TaskManagement.status.in_(statuses))
+    
+    if sort == "due_date":
+        tasks = due_date_page(query, order, cursor, limit + 1)
+    else:
+        tasks = keyset_page(query, TASK_SORT_COLUMNS[sort], order, cursor, limit + 1)
+    next_cursor = encode_task_cursor(sort, order, tasks[limit - 1]) if len(tasks) > limit else None
+    return [serialize_task(task) for task in tasks[:limit]], next_cursor
+
+def db_update_task(db: Session, task_id: int, task_update: TaskUpdate) -> bool:
+    db_task = db.query(TaskManagement).filter(TaskManagement.id == task_id).first()
+    
+    if not db_task:
+        return False
+    
+    if task_update.status:
+        db_task.status = task_update.status
+    if task_update.title:
+        db_task.title = task_update.title
+    if task_update.description:
+        db_task.description = task_update.description
+    
+    db_task.updated_at = datetime.utcnow()
+    db.commit()
+    return True
+
+def db_bulk_create_tasks(db: Session, tasks: List[TaskCreate]) -> List[int]:
+    """Insère un lot de tâches (executemany, une transaction) ; retourne les ids dans l'ordre"""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "client_id": task.client_id,
+            "title": task.title,
+            "description": task.description,
+            "due_date": task.due_date,
+            "status": "pending",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for task in tasks
+    ]
+    try:
+        result = db.execute(
+            insert(TaskManagement).returning(TaskManagement.id, sort_by_parameter_order=True),
+            rows
+        )
+        ids = list(result.scalars())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return ids
+
+def db_existing_task_ids(db: Session, task_ids: List[int]) -> set:
+    return {row.id for row in db.query(TaskManagement.id).filter(TaskManagement.id.in_(task_ids))}
+
+def db_bulk_update_tasks(db: Session, updates: List[TaskBulkUpdate]):
+    """Met à jour un lot de tâches par clé primaire (executemany, une transaction)"""
+    now = datetime.utcnow()
+    rows = []
+    for task_update in updates:
+        row = {"id": task_update.id, "updated_at": now}
+        # Mêmes règles que PUT /tasks/{task_id} : seuls les champs renseignés sont modifiés
+        for field in ("status", "title", "description"):
+            value = getattr(task_update, field)
+            if value:
+                row[field] = value
+        rows.append(row)
+    try:
+        db.execute(update(TaskManagement), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
 # Mock Data pour Tests (données réalistes basées sur votre screenshot Bexio)
 def get_realistic_mock_data(client_id: str, endpoint: str):
     """Données fictives réalistes basées sur l'interface Bexio"""
@@ -242,56 +2368,1192 @@ def get_realistic_dashboard_data(client_id: str):
         }
     return None
 
-# Fonctions utilitaires
-async def get_client_token(client_id: str, db: Session) -> Optional[str]:
-    """Récupère le token d'accès pour un client"""
-    client_auth = db.query(ClientAuth).filter(
-        ClientAuth.client_id == client_id,
-        ClientAuth.is_active == True
-    ).first()
+# Cache des tokens OAuth
+class TokenCache:
+    """Tokens d'accès en mémoire avec rafraîchissement anticipé single-flight"""
+    
+    def __init__(self, refresh_margin: float):
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.tokens: Dict[str, Dict] = {}
+        self.load_locks: Dict[str, asyncio.Lock] = {}
+        self.refreshing: Dict[str, asyncio.Task] = {}
+        self.stats = {"loads": 0, "refreshes": 0, "refresh_errors": 0}
+    
+    async def get(self, client_id: str, db: Session) -> Optional[str]:
+        """Retourne un token valide, chargé depuis la DB une seule fois"""
+        entry = self.tokens.get(client_id)
+        if entry is None:
+            entry = await self._load(client_id, db)
+            if entry is None:
+                return None
+        
+        expires_at = entry.get("expires_at")
+        if expires_at is None or not entry.get("refresh_token"):
+            return entry["access_token"]
+        
+        now = datetime.utcnow()
+        if expires_at <= now:
+            # Token expiré : attendre le rafraîchissement (partagé entre requêtes)
+            entry = await self.refresh(client_id)
+            return entry["access_token"] if entry else None
+        
+        if expires_at - now <= self.refresh_margin:
+            self.schedule_refresh(client_id)
+        return entry["access_token"]
+    
+    def set(self, client_id: str, entry: Dict):
+        self.tokens[client_id] = entry
+    
+    def invalidate(self, client_id: str):
+        self.tokens.pop(client_id, None)
+    
+    def schedule_refresh(self, client_id: str) -> asyncio.Task:
+        """Démarre un rafraîchissement, ou réutilise celui déjà en cours"""
+        task = self.refreshing.get(client_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(client_id))
+            self.refreshing[client_id] = task
+            task.add_done_callback(lambda _: self.refreshing.pop(client_id, None))
+        return task
+    
+    async def refresh(self, client_id: str) -> Optional[Dict]:
+        return await asyncio.shield(self.schedule_refresh(client_id))
+    
+    async def refresh_expiring(self):
+        """Rafraîchit tous les tokens en cache proches de l'expiration"""
+        deadline = datetime.utcnow() + self.refresh_margin
+        for client_id, entry in list(self.tokens.items()):
+            expires_at = entry.get("expires_at")
+            if expires_at and entry.get("refresh_token") and expires_at <= deadline:
+                self.schedule_refresh(client_id)
+    
+    async def run_refresh_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_expiring()
+            except Exception as e:
+                logger.error(f"Erreur boucle de rafraîchissement des tokens: {str(e)}")
+    
+    async def close(self):
+        for task in list(self.refreshing.values()):
+            task.cancel()
+        self.refreshing.clear()
+    
+    def get_stats(self) -> Dict:
+        return {**self.stats, "cached": len(self.tokens), "refreshing": len(self.refreshing)}
+    
+    async def _load(self, client_id: str, db: Session) -> Optional[Dict]:
+        lock = self.load_locks.setdefault(client_id, asyncio.Lock())
+        async with lock:
+            entry = self.tokens.get(client_id)
+            if entry is None:
+                entry = await run_db(db_get_client_auth, db, client_id)
+                if entry is not None:
+                    self.tokens[client_id] = entry
+                    self.stats["loads"] += 1
+        self.load_locks.pop(client_id, None)
+        return entry
+    
+    async def _refresh(self, client_id: str) -> Optional[Dict]:
+        entry = self.tokens.get(client_id)
+        if not entry or not entry.get("refresh_token"):
+            return None
+        
+        # Un seul worker rafraîchit (le refresh token Bexio est à usage unique)
+        lock_name = f"token-refresh:{client_id}"
+        lock = await wait_for_lock(lock_name, SHARED_LOCK_TTL, SHARED_LOCK_TTL)
+        try:
+            if shared_state.shared:
+                stored = await run_db(with_session, db_get_client_auth, client_id)
+                if stored and stored.get("expires_at") and stored["expires_at"] - datetime.utcnow() > self.refresh_margin:
+                    # Déjà rafraîchi par un autre worker
+                    self.tokens[client_id] = stored
+                    return stored
+                entry = stored or entry
+            return await self._request_refresh(client_id, entry)
+        finally:
+            if lock:
+                await shared_state.release_lock(lock_name, lock)
+    
+    async def _request_refresh(self, client_id: str, entry: Dict) -> Optional[Dict]:
+        try:
+            response = await get_http_client().post(
+                f"{BEXIO_AUTH_URL}/protocol/openid-connect/token",
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": entry["refresh_token"],
+                    "client_id": BEXIO_CLIENT_ID,
+                    "client_secret": BEXIO_CLIENT_SECRET,
+                }
+            )
+            response.raise_for_status()
+            token_data = response.json()
+            
+            db = SessionLocal()
+            try:
+                entry = await run_db(db_save_client_tokens, db, client_id, token_data)
+            finally:
+                db.close()
+            
+            self.tokens[client_id] = entry
+            self.stats["refreshes"] += 1
+            TOKEN_REFRESHES.labels("success").inc()
+            logger.info(f"Token rafraîchi pour {client_id}")
+            return entry
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            TOKEN_REFRESHES.labels("error").inc()
+            logger.error(f"Erreur rafraîchissement token pour {client_id}: {str(e)}")
+            if entry.get("expires_at") and entry["expires_at"] <= datetime.utcnow():
+                return None
+            return entry
+
+token_cache = TokenCache(TOKEN_REFRESH_MARGIN)
+
+# Fonctions utilitaires
+async def get_client_token(client_id: str, db: Session) -> Optional[str]:
+    """Récupère le token d'accès pour un client"""
+    return await token_cache.get(client_id, db)
+
+async def fetch_bexio(client_id: str, endpoint: str, method: str = "GET", 
+                      params: Dict = None, data: Dict = None, db: Session = None) -> Dict:
+    """Appel direct à l'API Bexio, sans cache"""
+    token = await get_client_token(client_id, db)
+    if not token:
+        raise HTTPException(
+            status_code=401, 
+            detail=f"Client {client_id} non autorisé. Veuillez d'abord vous connecter à Bexio."
+        )
+    
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+    
+    client = get_http_client()
+    endpoint_label = upstream_endpoint_label(endpoint)
+    # Disjoncteur consulté une fois par appel ; l'échec n'est compté qu'une fois les essais épuisés
+    if not circuit_breakers.allow(client_id):
+        raise HTTPException(status_code=503, detail="Bexio temporairement indisponible, réessayez plus tard")
+    
+    attempt = 0
+    while True:
+        try:
+            async with upstream_scheduler.slot(client_id):
+                http_stats["requests"] += 1
+                started = time.perf_counter()
+                try:
+                    if method == "GET":
+                        response = await client.get(f"{BEXIO_BASE_URL}/{endpoint}", headers=headers, params=params)
+                    elif method == "POST":
+                        response = await client.post(f"{BEXIO_BASE_URL}/{endpoint}", headers=headers, params=params, json=data)
+                finally:
+                    UPSTREAM_DURATION.labels(endpoint_label, method).observe(time.perf_counter() - started)
+        except httpx.TransportError as e:
+            UPSTREAM_RESPONSES.labels(endpoint_label, "error").inc()
+            http_stats["errors"] += 1
+            if method == "GET" and attempt < UPSTREAM_MAX_RETRIES:
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            circuit_breakers.record_failure(client_id)
+            logger.error(f"Erreur API Bexio pour {client_id}: {str(e)}")
+            status_code = 504 if isinstance(e, httpx.TimeoutException) else 502
+            raise HTTPException(status_code=status_code, detail=f"Erreur API Bexio: {str(e)}")
+        
+        UPSTREAM_RESPONSES.labels(endpoint_label, str(response.status_code)).inc()
+        
+        retry_after = None
+        error_headers = None
+        if response.status_code in RETRYABLE_STATUSES and response.headers.get("Retry-After"):
+            retry_after = parse_retry_after(response.headers["Retry-After"])
+            if retry_after is not None:
+                error_headers = {"Retry-After": str(max(0, math.ceil(retry_after)))}
+        
+        # POST rejoué uniquement sur 429 (requête non traitée par Bexio) ; pas de nouvel essai
+        # si Bexio demande d'attendre plus que UPSTREAM_BACKOFF_MAX (429 assuré, quota consommé)
+        if (response.status_code in RETRYABLE_STATUSES and attempt < UPSTREAM_MAX_RETRIES
+                and (method == "GET" or response.status_code == 429)
+                and (retry_after is None or retry_after <= UPSTREAM_BACKOFF_MAX)):
+            http_stats["retries"] += 1
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+            continue
+        
+        if response.status_code >= 500:
+            circuit_breakers.record_failure(client_id)
+        else:
+            circuit_breakers.record_success(client_id)
+        if response.status_code == 401:
+            # Token révoqué côté Bexio : recharger depuis la DB au prochain appel
+            token_cache.invalidate(client_id)
+        if response.is_error:
+            http_stats["errors"] += 1
+            logger.error(f"Erreur API Bexio pour {client_id}: {response.status_code} {response.reason_phrase}")
+            raise HTTPException(
+                status_code=upstream_error_status(response.status_code),
+                detail=f"Erreur API Bexio: {response.status_code} {response.reason_phrase}",
+                headers=error_headers
+            )
+        return response.json()
+
+async def refetch_bexio(client_id: str, endpoint: str, params: Dict = None) -> Dict:
+    """Appel Bexio avec sa propre session DB (rafraîchissements en arrière-plan)"""
+    db = SessionLocal()
+    try:
+        return await fetch_bexio(client_id, endpoint, params=params, db=db)
+    finally:
+        db.close()
+
+def shared_cache_key(key: tuple) -> str:
+    client_id, endpoint, params = key
+    digest = hashlib.blake2b(dump_json(params), digest_size=8).hexdigest()
+    return f"cache:{client_id}:{endpoint}:{digest}"
+
+async def load_shared_cache(key: tuple, fresh_only: bool = False):
+    """Lit le cache partagé et alimente le cache local ; retourne (valeur, fraîche) ou None"""
+    try:
+        raw = await shared_state.get(shared_cache_key(key))
+    except Exception as e:
+        logger.error(f"Cache partagé indisponible: {str(e)}")
+        return None
+    if raw is None:
+        shared_stats["cache_misses"] += 1
+        return None
+    
+    payload = json.loads(raw)
+    age = max(0.0, time.time() - payload["stored_at"])
+    if fresh_only and age > ResponseCache.ttl_for(key[1]):
+        return None
+    shared_stats["cache_hits"] += 1
+    response_cache.set(key, payload["value"], age=age)
+    return response_cache.get(key)
+
+async def store_shared_cache(key: tuple, value):
+    try:
+        payload = dump_json({"stored_at": time.time(), "value": value})
+        await shared_state.set(shared_cache_key(key), payload, ResponseCache.ttl_for(key[1]) + CACHE_STALE_TTL)
+    except Exception as e:
+        logger.error(f"Cache partagé indisponible: {str(e)}")
+
+async def invalidate_cache(client_id: str, endpoint: Optional[str] = None) -> int:
+    """Invalide le cache local, le cache partagé et celui des autres workers"""
+    removed = response_cache.invalidate(client_id, endpoint)
+    if shared_state.shared:
+        try:
+            prefix = f"cache:{client_id}:" + (f"{endpoint}:" if endpoint else "")
+            removed += await shared_state.delete_prefix(prefix)
+            await shared_state.publish("invalidate", {"client_id": client_id, "endpoint": endpoint})
+        except Exception as e:
+            logger.error(f"Invalidation partagée impossible: {str(e)}")
+    return removed
+
+def handle_remote_invalidation(message: Dict):
+    shared_stats["invalidations_received"] += 1
+    response_cache.invalidate(message["client_id"], message.get("endpoint"))
+
+async def load_bexio(key: tuple, client_id: str, endpoint: str, params: Dict = None) -> Dict:
+    """Appel GET Bexio partagé entre requêtes identiques (et entre workers), résultat mis en cache"""
+    
+    async def _fetch():
+        lock = None
+        lock_name = "fetch:" + shared_cache_key(key)
+        if shared_state.shared and CACHE_ENABLED:
+            lock = await shared_state.acquire_lock(lock_name, SHARED_LOCK_TTL)
+            if lock is None:
+                # Un autre worker interroge déjà Bexio : attendre son résultat
+                shared_stats["lock_waits"] += 1
+                deadline = time.monotonic() + SHARED_LOCK_TTL
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    cached = await load_shared_cache(key, fresh_only=True)
+                    if cached is not None:
+                        return cached[0]
+                    lock = await shared_state.acquire_lock(lock_name, SHARED_LOCK_TTL)
+                    if lock is not None:
+                        break
+        try:
+            result = await refetch_bexio(client_id, endpoint, params)
+            if CACHE_ENABLED:
+                response_cache.set(key, result)
+                if shared_state.shared:
+                    await store_shared_cache(key, result)
+            return result
+        finally:
+            if lock:
+                await shared_state.release_lock(lock_name, lock)
+    
+    return await request_coalescer.run(key, _fetch)
+
+async def make_bexio_request(client_id: str, endpoint: str, method: str = "GET", 
+                           params: Dict = None, data: Dict = None, db: Session = None) -> Dict:
+    """Effectue une requête vers l'API Bexio avec fallback sur données fictives"""
+    
+    # PRIORITÉ 1: Données fictives pour tests
+    mock_data = get_realistic_mock_data(client_id, endpoint)
+    if mock_data is not None:
+        logger.info(f"Retour données fictives pour {client_id}/{endpoint}")
+        return mock_data
+    
+    # PRIORITÉ 2: Vraie API Bexio pour clients autorisés (GET mis en cache et dédupliqués)
+    if method != "GET":
+        return await fetch_bexio(client_id, endpoint, method, params, data, db)
+    
+    key = ResponseCache.make_key(client_id, endpoint, params)
+    if CACHE_ENABLED:
+        cached = response_cache.get(key)
+        if cached is None and shared_state.shared:
+            cached = await load_shared_cache(key)
+        if cached is not None:
+            value, fresh = cached
+            if not fresh:
+                response_cache.revalidate(key, lambda: load_bexio(key, client_id, endpoint, params))
+            return value
+    
+    try:
+        return await load_bexio(key, client_id, endpoint, params)
+    except HTTPException as e:
+        # Bexio indisponible : servir la dernière valeur connue si possible
+        if CACHE_ENABLED and e.status_code in (502, 503, 504):
+            last_known = response_cache.last_known(key)
+            if last_known is not None:
+                logger.warning(f"Bexio indisponible, dernière valeur connue pour {client_id}/{endpoint}")
+                return last_known
+        raise
+
+# Pagination Bexio
+async def iter_bexio_pages(client_id: str, endpoint: str, criteria: Optional[List[Dict]] = None,
+                           page_size: Optional[int] = None, cached: bool = False):
+    """Parcourt toutes les pages d'un endpoint Bexio (liste, ou recherche si criteria)
+    
+    La page suivante est préchargée pendant le traitement de la page courante
+    (une seule page d'avance, mémoire bornée). cached=True passe par le cache
+    et la déduplication de make_bexio_request.
+    """
+    page_size = page_size or PAGE_SIZE
+    mock_data = get_realistic_mock_data(client_id, endpoint)
+    if mock_data is not None:
+        yield mock_data
+        return
+    
+    db = SessionLocal()
+    
+    async def fetch_page(offset: int):
+        params = {"limit": page_size, "offset": offset}
+        if criteria:
+            return await fetch_bexio(client_id, f"{endpoint}/search", "POST", params, criteria, db)
+        if cached:
+            return await make_bexio_request(client_id, endpoint, params=params)
+        return await fetch_bexio(client_id, endpoint, params=params, db=db)
+    
+    offset = 0
+    next_page = asyncio.create_task(fetch_page(offset))
+    try:
+        while True:
+            page = await next_page
+            next_page = None
+            if not isinstance(page, list) or not page:
+                return
+            
+            has_more = len(page) >= page_size
+            if has_more:
+                offset += page_size
+                next_page = asyncio.create_task(fetch_page(offset))
+            yield page
+            if not has_more:
+                return
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+        db.close()
+
+async def iter_mirror_pages(client_id: str, model, page_size: Optional[int] = None):
+    """Parcourt le miroir local par pages (pagination par clé sur id)"""
+    page_size = page_size or PAGE_SIZE
+    after_id = None
+    while True:
+        page = await run_db(with_session, db_get_mirror_page, model, client_id, after_id, page_size)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
+async def stream_records(pages, formatter, media_type: str):
+    """Sérialise des pages d'enregistrements au fil de l'eau (NDJSON ou JSON)"""
+    ndjson = media_type == "application/x-ndjson"
+    if not ndjson:
+        yield b'{"data":['
+    
+    first = True
+    try:
+        async for page in pages:
+            records = list(map(formatter, page))
+            if not records:
+                continue
+            if ndjson:
+                yield b"".join(dump_json(record) + b"\n" for record in records)
+                continue
+            
+            # Une sérialisation par page : on retire les crochets du tableau
+            chunk = dump_json(records)[1:-1]
+            yield chunk if first else b"," + chunk
+            first = False
+    except Exception as e:
+        # Statut HTTP déjà envoyé : l'erreur est signalée dans le flux
+        logger.error(f"Erreur streaming: {str(e)}")
+        yield dump_json({"error": str(e)}) + b"\n" if ndjson else b'],"error":' + dump_json(str(e)) + b"}"
+        return
+    
+    if not ndjson:
+        yield b"]}"
+
+async def prime_pages(pages):
+    """Charge la première page avant l'envoi de la réponse (les erreurs HTTP restent des statuts)"""
+    try:
+        first_page = await pages.__anext__()
+    except StopAsyncIteration:
+        first_page = []
     
-    if not client_auth:
-        return None
+    async def all_pages():
+        yield first_page
+        async for page in pages:
+            yield page
     
-    return client_auth.access_token
+    return all_pages()
 
-async def make_bexio_request(client_id: str, endpoint: str, method: str = "GET", 
-                           params: Dict = None, data: Dict = None, db: Session = None) -> Dict:
-    """Effectue une requête vers l'API Bexio avec fallback sur données fictives"""
+async def streaming_records_response(pages, formatter, stream: str) -> StreamingResponse:
+    """Réponse en flux ; la première page est chargée avant l'envoi pour propager les erreurs HTTP"""
+    media_type = "application/x-ndjson" if stream == "ndjson" else "application/json"
+    return StreamingResponse(stream_records(await prime_pages(pages), formatter, media_type), media_type=media_type)
+
+# Exports en flux (CSV, XLSX), une page à la fois
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# Numéros (téléphone, montants) commençant par + ou - : sans risque, laissés tels quels
+CSV_PLAIN_NUMBER = re.compile(r"[+-][\d\s().,/]*")
+
+def csv_safe(value):
+    """Neutralise les formules dans les cellules texte (injection CSV dans Excel)"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES) and not CSV_PLAIN_NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+async def csv_chunks(pages, formatter, columns: List[str]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=EXPORT_CSV_DELIMITER)
+    # BOM UTF-8 : accents lus correctement par Excel
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
     
-    # PRIORITÉ 1: Données fictives pour tests
-    mock_data = get_realistic_mock_data(client_id, endpoint)
-    if mock_data is not None:
-        logger.info(f"Retour données fictives pour {client_id}/{endpoint}")
-        return mock_data
+    async for page in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_safe(value) for value in formatter(record).values()] for record in page)
+        yield buffer.getvalue().encode()
+
+class ChunkSink:
+    """Flux en écriture seule pour zipfile (non « seekable ») : les octets écrits sont récupérés au fur et à mesure"""
     
-    # PRIORITÉ 2: Vraie API Bexio pour clients autorisés
-    token = await get_client_token(client_id, db)
-    if not token:
-        raise HTTPException(
-            status_code=401, 
-            detail=f"Client {client_id} non autorisé. Veuillez d'abord vous connecter à Bexio."
-        )
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.offset = 0
     
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/json",
-        "Content-Type": "application/json"
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.offset
+    
+    def flush(self):
+        pass
+    
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+XML_INVALID_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def xlsx_row(values) -> str:
+    cells = []
+    for value in values:
+        if isinstance(value, bool) or value is None:
+            value = "" if value is None else str(value)
+        if isinstance(value, (int, float)):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            text = xml_escape(XML_INVALID_CHARS.sub("", str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return "<row>" + "".join(cells) + "</row>"
+
+async def xlsx_chunks(pages, formatter, columns: List[str], sheet_name: str):
+    """Classeur XLSX minimal (une feuille, chaînes en ligne) écrit dans une archive zip en flux"""
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", XLSX_WORKBOOK.format(name=xml_escape(sheet_name)))
+        archive.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                         + xlsx_row(columns)).encode())
+            yield sink.take()
+            async for page in pages:
+                sheet.write("".join(xlsx_row(formatter(record).values()) for record in page).encode())
+                chunk = sink.take()
+                if chunk:
+                    yield chunk
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.take()
+
+async def gzip_chunks(chunks, level: int):
+    """Compression gzip à la volée ; chaque page est émise sans attendre la fin de l'export"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Statuts Bexio des factures ouvertes (en attente, partiellement payée, impayée)
+OPEN_INVOICE_STATUSES = (8, 16, 31)
+
+def is_overdue_invoice(invoice: Dict, today: str) -> bool:
+    return invoice.get("kb_item_status_id") in OPEN_INVOICE_STATUSES and (invoice.get("is_valid_to") or today) < today
+
+async def summarize_bexio_records(client_id: str, endpoint: str, amount_field: Optional[str] = None,
+                                  keep: int = 0, overdue: bool = False) -> Dict:
+    """Compte (et totalise) les enregistrements d'un endpoint, page par page
+    
+    Au plus DASHBOARD_MAX_PAGES pages : au-delà, le résultat est marqué truncated et une
+    synchronisation du miroir est lancée en arrière-plan (vues suivantes sur le miroir).
+    Seul le résumé est mis en cache (pas chaque page), parcours partagé entre vues concurrentes ;
+    un résumé tronqué n'est frais que DASHBOARD_TRUNCATED_TTL secondes.
+    """
+    key = ResponseCache.make_key(client_id, endpoint, {"summary": f"{amount_field}:{keep}:{overdue}"})
+    
+    def load():
+        return request_coalescer.run(key, lambda: walk_bexio_records(key, client_id, endpoint, amount_field,
+                                                                     keep, overdue))
+    
+    if CACHE_ENABLED:
+        cached = response_cache.get(key)
+        if cached is not None:
+            value, fresh = cached
+            if not fresh:
+                response_cache.revalidate(key, load)
+            return value
+    return await load()
+
+async def walk_bexio_records(key: tuple, client_id: str, endpoint: str, amount_field: Optional[str],
+                             keep: int, overdue: bool) -> Dict:
+    count = 0
+    total = 0.0
+    overdue_count = 0
+    overdue_total = 0.0
+    first_records = []
+    pages = 0
+    truncated = False
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    async for page in iter_bexio_pages(client_id, endpoint):
+        pages += 1
+        if len(first_records) < keep:
+            first_records.extend(page[:keep - len(first_records)])
+        count += len(page)
+        if amount_field:
+            total += sum(float(record.get(amount_field) or 0) for record in page)
+        if overdue:
+            late = [record for record in page if is_overdue_invoice(record, today)]
+            overdue_count += len(late)
+            overdue_total += sum(float(record.get(amount_field) or 0) for record in late) if amount_field else 0
+        if pages >= DASHBOARD_MAX_PAGES and len(page) >= PAGE_SIZE:
+            truncated = True
+            break
+    result = {"count": count, "total": total, "first": first_records}
+    if overdue:
+        result.update({"overdue": overdue_count, "overdue_total": overdue_total})
+    if truncated:
+        result["truncated"] = True
+        if MIRROR_SYNC_ENABLED and endpoint in MIRROR_RESOURCES:
+            mirror_sync.sync_client(client_id)
+    if CACHE_ENABLED:
+        # Résumé tronqué inscrit comme déjà âgé : il expire après DASHBOARD_TRUNCATED_TTL
+        age = max(0.0, ResponseCache.ttl_for(endpoint) - DASHBOARD_TRUNCATED_TTL) if truncated else 0.0
+        response_cache.set(key, result, age=age)
+    return result
+
+async def summarize_contacts(client_id: str) -> Dict:
+    """Nombre de contacts : miroir local s'il a été synchronisé, sinon parcours borné de Bexio"""
+    state = await run_db(with_session, db_get_sync_state, client_id, "contact")
+    if not state or not state["last_full_sync"]:
+        return await summarize_bexio_records(client_id, "contact")
+    count = await run_db(with_session, db_count_mirror, BexioContact, client_id)
+    return {"count": count, "total": 0.0, "first": [], "source": "mirror"}
+
+async def refresh_invoice_aggregates(client_id: str, force: bool = False):
+    """Recalcul en masse sous verrou : un seul par client (tous workers confondus avec Redis)"""
+    if not force and not await run_db(with_session, db_stale_aggregate_kinds, client_id):
+        return
+    lock_name = f"aggregates:{client_id}"
+    lock = await wait_for_lock(lock_name, SHARED_LOCK_TTL, SHARED_LOCK_TTL)
+    try:
+        # Revérifié sous verrou : le recalcul a pu être fait pendant l'attente
+        await run_db(with_session, db_refresh_invoice_aggregates, client_id, force)
+    except IntegrityError:
+        # Recalcul concurrent d'un autre processus (verrou non partagé) : son résultat est conservé
+        logger.warning(f"Recalcul des agrégats concurrent pour {client_id}")
+    finally:
+        if lock:
+            await shared_state.release_lock(lock_name, lock)
+
+async def get_invoice_aggregates(client_id: str) -> Dict:
+    await refresh_invoice_aggregates(client_id)
+    return await run_db(with_session, db_get_invoice_aggregates, client_id)
+
+async def summarize_invoices(client_id: str, keep: int = 0) -> Dict:
+    """Résumé des factures : agrégats précalculés si le miroir est synchronisé, sinon parcours de Bexio
+    
+    Même forme dans les deux cas : factures formatées (INVOICE_FIELDS), montants arrondis.
+    """
+    state = await run_db(with_session, db_get_sync_state, client_id, "kb_invoice")
+    if not state or not state["last_full_sync"]:
+        result = await summarize_bexio_records(client_id, "kb_invoice", "total_gross", keep=keep, overdue=True)
+        return {
+            **result,
+            "total": round(result["total"], 2),
+            "overdue_total": round(result["overdue_total"], 2),
+            "first": format_records(result["first"], "invoice"),
+            "source": "bexio",
+        }
+    
+    aggregates = await get_invoice_aggregates(client_id)
+    overdue = [row for row in aggregates["aging"] if row["bucket"] != "current"]
+    first = await run_db(with_session, db_get_mirror_page, BexioInvoice, client_id, None, keep) if keep else []
+    first = format_records(first, "invoice")
+    return {
+        "count": sum(row["count"] for row in aggregates["by_currency"]),
+        "total": round(sum(row["total_gross"] for row in aggregates["by_currency"]), 2),
+        "overdue": sum(row["count"] for row in overdue),
+        "overdue_total": round(sum(row["open_amount"] for row in overdue), 2),
+        "first": first,
+        "source": "aggregates",
+    }
+
+# Miroir local Bexio
+def contact_to_row(client_id: str, contact: Dict, synced_at: datetime) -> Dict:
+    return {
+        "client_id": client_id,
+        "id": contact["id"],
+        "name_1": contact.get("name_1") or "",
+        "name_2": contact.get("name_2"),
+        "mail": contact.get("mail"),
+        "phone_fixed": contact.get("phone_fixed"),
+        "phone_mobile": contact.get("phone_mobile"),
+        "address": contact.get("address"),
+        "postcode": contact.get("postcode"),
+        "city": contact.get("city"),
+        "country_id": contact.get("country_id"),
+        "updated_at": contact.get("updated_at"),
+        "raw": dump_json(contact).decode(),
+        "synced_at": synced_at,
     }
+
+def invoice_to_row(client_id: str, invoice: Dict, synced_at: datetime) -> Dict:
+    return {
+        "client_id": client_id,
+        "id": invoice["id"],
+        "document_nr": invoice.get("document_nr"),
+        "title": invoice.get("title"),
+        "contact_id": invoice.get("contact_id"),
+        "total_gross": float(invoice.get("total_gross") or 0),
+        "total_net": float(invoice.get("total_net") or 0),
+        "currency": invoice.get("currency"),
+        "is_valid_from": invoice.get("is_valid_from") or "",
+        "is_valid_to": invoice.get("is_valid_to"),
+        "kb_item_status_id": invoice.get("kb_item_status_id"),
+        "updated_at": invoice.get("updated_at"),
+        "raw": dump_json(invoice).decode(),
+        "synced_at": synced_at,
+    }
+
+MIRROR_RESOURCES = {
+    "contact": (BexioContact, contact_to_row),
+    "kb_invoice": (BexioInvoice, invoice_to_row),
+}
+
+class MirrorSyncEngine:
+    """Synchronisation complète puis incrémentale (curseur updated_at) du miroir local"""
+    
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.syncing: Dict[str, asyncio.Task] = {}
+        self.stats = {"full_syncs": 0, "delta_syncs": 0, "records": 0, "errors": 0}
     
-    async with httpx.AsyncClient() as client:
+    def sync_client(self, client_id: str, full: bool = False) -> asyncio.Task:
+        """Synchronise un client ; une seule synchronisation à la fois par client"""
+        task = self.syncing.get(client_id)
+        if task is None:
+            task = asyncio.create_task(self._sync_client(client_id, full))
+            self.syncing[client_id] = task
+            task.add_done_callback(lambda _: self.syncing.pop(client_id, None))
+        return task
+    
+    async def sync_resource(self, client_id: str, resource: str, full: bool = False) -> Dict:
+        model, to_row = MIRROR_RESOURCES[resource]
+        state = await run_db(with_session, db_get_sync_state, client_id, resource)
+        
+        full = (
+            full or state is None or not state["cursor"] or not state["last_full_sync"]
+            or datetime.utcnow() - state["last_full_sync"] > timedelta(seconds=MIRROR_FULL_SYNC_INTERVAL)
+        )
+        criteria = None if full else [{"field": "updated_at", "value": state["cursor"], "criteria": ">="}]
+        started = datetime.utcnow()
+        cursor = None if full else state["cursor"]
+        records = changed = 0
+        
         try:
-            if method == "GET":
-                response = await client.get(f"{BEXIO_BASE_URL}/{endpoint}", headers=headers, params=params)
-            elif method == "POST":
-                response = await client.post(f"{BEXIO_BASE_URL}/{endpoint}", headers=headers, json=data)
+            async for page in iter_bexio_pages(client_id, resource, criteria):
+                rows = [to_row(client_id, item, started) for item in page if item.get("id") is not None]
+                if not rows:
+                    continue
+                changed += await run_db(with_session, db_upsert_mirror, model, client_id, rows, not full, full)
+                records += len(rows)
+                cursor = max([cursor or ""] + [row["updated_at"] or "" for row in rows]) or None
             
-            response.raise_for_status()
-            return response.json()
+            if full:
+                changed += await run_db(with_session, db_prune_mirror, model, client_id, started)
+                if model is BexioInvoice:
+                    await refresh_invoice_aggregates(client_id, force=True)
+            elif model is BexioInvoice:
+                # Ancienneté du jour recalculée par la synchronisation plutôt qu'à la lecture
+                await refresh_invoice_aggregates(client_id)
+        except Exception as e:
+            self.stats["errors"] += 1
+            await run_db(with_session, db_save_sync_state, client_id, resource,
+                         status="error", error=str(e), last_sync=started)
+            raise
+        
+        fields = {"cursor": cursor, "status": "ok", "error": None, "records": records, "last_sync": started}
+        if full:
+            fields["last_full_sync"] = started
+        if changed or not state:
+            # Version des données du miroir (ETag des lectures source=mirror) : seulement si une ligne a changé
+            # (le curseur >= relit toujours au moins le dernier enregistrement)
+            fields["version"] = (state["version"] if state else 0) + 1
+        await run_db(with_session, db_save_sync_state, client_id, resource, **fields)
+        
+        self.stats["full_syncs" if full else "delta_syncs"] += 1
+        self.stats["records"] += records
+        return {"resource": resource, "mode": "full" if full else "delta", "records": records, "changed": changed}
+    
+    async def _sync_client(self, client_id: str, full: bool) -> List[Dict]:
+        # Une seule synchronisation par client, tous workers confondus
+        lock_name = f"mirror-sync:{client_id}"
+        lock = await shared_state.acquire_lock(lock_name, MIRROR_SYNC_LOCK_TTL)
+        if lock is None:
+            return [{"resource": resource, "status": "skipped", "error": "Synchronisation en cours sur un autre worker"}
+                    for resource in MIRROR_RESOURCES]
+        results = []
+        try:
+            for resource in MIRROR_RESOURCES:
+                try:
+                    results.append(await self.sync_resource(client_id, resource, full))
+                except Exception as e:
+                    logger.error(f"Erreur synchronisation {client_id}/{resource}: {str(e)}")
+                    results.append({"resource": resource, "status": "error", "error": str(e)})
+        finally:
+            await shared_state.release_lock(lock_name, lock)
+        return results
+    
+    async def sync_all(self):
+        client_ids = await run_db(with_session, db_list_active_clients)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def _sync(client_id: str):
+            async with semaphore:
+                await self.sync_client(client_id)
+        
+        await asyncio.gather(*[_sync(client_id) for client_id in client_ids])
+    
+    async def run_loop(self, interval: float):
+        while True:
+            try:
+                # Un seul worker par intervalle (le verrou expire de lui-même)
+                if await shared_state.acquire_lock("mirror-sync-loop", interval * 0.9):
+                    await self.sync_all()
+            except Exception as e:
+                logger.error(f"Erreur boucle de synchronisation: {str(e)}")
+            await asyncio.sleep(interval)
+    
+    async def close(self):
+        for task in list(self.syncing.values()):
+            task.cancel()
+        self.syncing.clear()
+    
+    def get_stats(self) -> Dict:
+        return {**self.stats, "syncing": len(self.syncing)}
+
+mirror_sync = MirrorSyncEngine(MIRROR_SYNC_CONCURRENCY)
+
+# Webhooks Bexio
+WEBHOOK_RESOURCES = {"contact": "contact", "kb_invoice": "kb_invoice", "invoice": "kb_invoice"}
+WEBHOOK_ACTIONS = {"created": "upsert", "updated": "upsert", "deleted": "delete"}
+# Champs lus par contact_to_row / invoice_to_row : un payload partiel est relu chez Bexio
+WEBHOOK_COMPLETE_FIELDS = {
+    "contact": ("name_1", "name_2", "mail", "phone_fixed", "phone_mobile", "address", "postcode", "city",
+                "country_id", "updated_at"),
+    "kb_invoice": ("document_nr", "title", "contact_id", "total_gross", "total_net", "currency", "is_valid_from",
+                   "is_valid_to", "kb_item_status_id", "updated_at"),
+}
+
+def verify_webhook_signature(body: bytes, signature: Optional[str]) -> bool:
+    """Signature HMAC-SHA256 hexadécimale du corps brut (préfixe « sha256= » accepté)"""
+    if not signature:
+        return False
+    expected = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().removeprefix("sha256="))
+
+def parse_webhook_event(item: Dict) -> Dict:
+    """Normalise un événement {"event": "contact.updated", "data": {"id": ...}} ; ValueError si invalide"""
+    if not isinstance(item, dict):
+        raise ValueError("Événement invalide")
+    name = str(item.get("event") or item.get("type") or "")
+    resource, _, action = name.rpartition(".")
+    if resource not in WEBHOOK_RESOURCES or action not in WEBHOOK_ACTIONS:
+        raise ValueError(f"Événement non supporté: {name or '?'}")
+    
+    data = item.get("data") if isinstance(item.get("data"), dict) else {}
+    record_id = data.get("id", item.get("id", item.get("resource_id")))
+    try:
+        record_id = int(record_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"Identifiant manquant pour {name}")
+    
+    # Enregistrement complet fourni : pas de relecture chez Bexio
+    resource = WEBHOOK_RESOURCES[resource]
+    complete = all(field in data for field in WEBHOOK_COMPLETE_FIELDS[resource])
+    return {
+        "resource": resource,
+        "action": WEBHOOK_ACTIONS[action],
+        "record_id": record_id,
+        "payload": dump_json(data).decode() if complete else None,
+    }
+
+class WebhookProcessor:
+    """Applique les événements de la file : invalidation du cache et mise à jour du miroir"""
+    
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.wakeup: Optional[asyncio.Event] = None
+        self.last_prune = 0.0
+        self.stats = {"received": 0, "processed": 0, "coalesced": 0, "failed": 0, "refetches": 0, "skipped": 0}
+    
+    def notify(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+    
+    async def apply(self, event: Dict):
+        client_id, resource, record_id = event["client_id"], event["resource"], event["record_id"]
+        model, to_row = MIRROR_RESOURCES[resource]
+        await invalidate_cache(client_id, resource)
+        
+        record = event["payload"]
+        if event["action"] == "upsert" and record is None:
+            self.stats["refetches"] += 1
+            try:
+                record = await refetch_bexio(client_id, f"{resource}/{record_id}")
+            except HTTPException as e:
+                if e.status_code != 404:
+                    raise
+                record = None
+        
+        if event["action"] == "delete" or not record:
+            changed = await run_db(with_session, db_delete_mirror_record, model, client_id, record_id)
+        else:
+            changed = await run_db(with_session, db_patch_mirror_record, model, client_id,
+                                   to_row(client_id, record, datetime.utcnow()))
+        if changed:
+            await run_db(with_session, db_bump_mirror_version, client_id, resource)
+    
+    async def process_batch(self) -> int:
+        events = await run_db(with_session, db_claim_webhook_events, self.batch_size)
+        if not events:
+            return 0
+        
+        # Plusieurs événements sur le même enregistrement : seul le dernier est appliqué
+        latest: Dict[tuple, Dict] = {}
+        grouped: Dict[tuple, List[int]] = {}
+        for event in events:
+            key = (event["client_id"], event["resource"], event["record_id"])
+            latest[key] = event
+            grouped.setdefault(key, []).append(event["id"])
+        self.stats["coalesced"] += len(events) - len(latest)
+        
+        for key, event in latest.items():
+            ids = grouped[key]
+            try:
+                await self.apply(event)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Erreur webhook {event['client_id']}/{event['resource']}/{event['record_id']}: {str(e)}")
+                await run_db(with_session, db_finish_webhook_events, ids, str(e))
+                continue
+            await run_db(with_session, db_finish_webhook_events, ids)
+            self.stats["processed"] += len(ids)
+        return len(events)
+    
+    async def run_loop(self, interval: float):
+        self.wakeup = asyncio.Event()
+        while True:
+            try:
+                while await self.process_batch() >= self.batch_size:
+                    pass
+                if time.monotonic() - self.last_prune > 3600:
+                    self.last_prune = time.monotonic()
+                    await run_db(with_session, db_prune_webhook_events,
+                                 datetime.utcnow() - timedelta(days=WEBHOOK_RETENTION_DAYS))
+            except Exception as e:
+                logger.error(f"Erreur traitement des webhooks: {str(e)}")
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
+
+webhook_processor = WebhookProcessor(WEBHOOK_BATCH_SIZE)
+
+# Travaux en arrière-plan
+class JobCancelled(Exception):
+    pass
+
+class JobContext:
+    """Vue d'un travail pour son handler : paramètres, avancement et point de reprise"""
+    
+    def __init__(self, job: Dict):
+        self.id = job["id"]
+        self.client_id = job["client_id"]
+        self.params = job["params"]
+        self.attempt = job["attempts"]
+        self.checkpoint = job.get("checkpoint") or {}
+    
+    async def progress(self, fraction: float, message: Optional[str] = None, checkpoint: Optional[Dict] = None):
+        """Enregistre l'avancement (et le point de reprise) ; lève JobCancelled si l'annulation est demandée"""
+        fields = {"progress": max(0.0, min(1.0, fraction)), "message": message}
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+            fields["checkpoint"] = dump_json(checkpoint).decode()
+        if await run_db(with_session, db_heartbeat_job, self.id, **fields):
+            raise JobCancelled()
+
+class JobQueue:
+    """Pool de workers exécutant les travaux de la table jobs"""
+    
+    def __init__(self, workers: int):
+        self.worker_count = workers
+        self.handlers: Dict[str, callable] = {}
+        self.workers: List[asyncio.Task] = []
+        self.running: Dict[str, asyncio.Task] = {}
+        self.cancelling: set = set()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.claim_lock: Optional[asyncio.Lock] = None
+        self.stats = {"started": 0, "succeeded": 0, "failed": 0, "retried": 0, "cancelled": 0}
+    
+    def handler(self, kind: str):
+        def register(func):
+            self.handlers[kind] = func
+            return func
+        return register
+    
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.claim_lock = asyncio.Lock()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+    
+    def notify(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+    
+    def cancel(self, job_id: str):
+        """Arrête immédiatement un travail exécuté par ce worker"""
+        task = self.running.get(job_id)
+        if task is not None:
+            self.cancelling.add(job_id)
+            task.cancel()
+    
+    async def _worker(self):
+        while True:
+            try:
+                # Réservations sérialisées dans le processus : la limite par client reste exacte
+                async with self.claim_lock:
+                    job = await run_db(with_session, db_claim_job, list(self.handlers))
+            except Exception as e:
+                logger.error(f"Erreur réservation de travail: {str(e)}")
+                job = None
             
-        except httpx.HTTPError as e:
-            logger.error(f"Erreur API Bexio pour {client_id}: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Erreur API Bexio: {str(e)}")
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+    
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                if await run_db(with_session, db_heartbeat_job, job_id):
+                    # Annulation demandée depuis un autre worker
+                    self.cancel(job_id)
+                    return
+            except Exception as e:
+                logger.error(f"Erreur battement de cœur du travail {job_id}: {str(e)}")
+    
+    async def _run(self, job: Dict):
+        job_id = job["id"]
+        self.stats["started"] += 1
+        logger.info(f"Travail {job['kind']} {job_id} démarré pour {job['client_id']} (essai {job['attempts']})")
+        task = asyncio.create_task(self.handlers[job["kind"]](JobContext(job)))
+        self.running[job_id] = task
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await task
+        except (asyncio.CancelledError, JobCancelled):
+            if job_id not in self.cancelling and task.cancelled():
+                # Arrêt du processus : le travail est remis en file sans compter l'essai
+                await run_db(with_session, db_finish_job, job_id, "queued", release=True)
+                raise
+            self.stats["cancelled"] += 1
+            await run_db(with_session, db_finish_job, job_id, "cancelled", error="Annulé")
+        except Exception as e:
+            retryable = not isinstance(e, HTTPException) or e.status_code >= 500 or e.status_code == 429
+            if retryable and job["attempts"] < job["max_attempts"]:
+                self.stats["retried"] += 1
+                delay = JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+                logger.error(f"Travail {job_id} en échec, nouvel essai dans {delay:.0f}s: {str(e)}")
+                await run_db(with_session, db_finish_job, job_id, "queued", error=str(e),
+                             run_after=datetime.utcnow() + timedelta(seconds=delay))
+            else:
+                self.stats["failed"] += 1
+                logger.error(f"Travail {job_id} en échec: {str(e)}")
+                await run_db(with_session, db_finish_job, job_id, "failed", error=str(e))
+        else:
+            self.stats["succeeded"] += 1
+            await run_db(with_session, db_finish_job, job_id, "succeeded", result=result or {})
+        finally:
+            heartbeat.cancel()
+            self.running.pop(job_id, None)
+            self.cancelling.discard(job_id)
+    
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+    
+    def get_stats(self) -> Dict:
+        return {**self.stats, "workers": len(self.workers), "running": len(self.running)}
+
+job_queue = JobQueue(JOB_WORKERS)
+
+@job_queue.handler("mirror_sync")
+async def mirror_sync_job(job: JobContext) -> Dict:
+    """Import complet (ou incrémental avec params.full=false) du miroir d'un client"""
+    await job.progress(0, "Synchronisation du miroir")
+    results = await mirror_sync.sync_client(job.client_id, bool(job.params.get("full", True)))
+    errors = [result["error"] for result in results if result.get("status") == "error"]
+    if errors:
+        raise RuntimeError("; ".join(errors))
+    return {"resources": results}
+
+@job_queue.handler("tasks_push")
+async def tasks_push_job(job: JobContext) -> Dict:
+    """Création de tâches en masse par lots, reprise au dernier lot enregistré"""
+    items = [{**item, "client_id": job.client_id} for item in job.params.get("tasks") or []]
+    valid, errors = validate_batch(items, TaskCreate)
+    offset = job.checkpoint.get("offset", 0)
+    created = job.checkpoint.get("created", 0)
+    
+    while offset < len(valid):
+        chunk = [task for _, task in valid[offset:offset + TASKS_BULK_MAX]]
+        created += len(await run_db(with_session, db_bulk_create_tasks, chunk))
+        offset += len(chunk)
+        await job.progress(offset / len(valid), f"{created} tâches créées",
+                           checkpoint={"offset": offset, "created": created})
+    return {"created": created, "errors": errors}
+
+# Réponses HTTP conditionnelles (ETag / Cache-Control)
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(json.dumps(parts, default=str).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    if not etag or not HTTP_CACHE_ENABLED:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def cache_control_for(ttl: float) -> str:
+    """Cache-Control partagé : le CDN garde la réponse ttl secondes, le navigateur revalide"""
+    ttl = int(ttl)
+    return f"public, max-age=0, s-maxage={ttl}, stale-while-revalidate={int(CACHE_STALE_TTL)}"
+
+def not_modified_response(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def conditional_json_response(request: Request, content: Dict, cache_control: str,
+                              etag: Optional[str] = None) -> Response:
+    """Réponse JSON avec ETag (calculé sur le contenu si non fourni) et 304 si inchangé"""
+    if content.get("error") or content.get("partial"):
+        return FastJSONResponse(content, headers={"Cache-Control": "no-store"})
+    
+    body = dump_json(content)
+    if etag is None:
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if etag_matches(request, etag):
+        return not_modified_response(etag, cache_control)
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": cache_control})
 
 # Endpoints API
 
@@ -325,6 +3587,91 @@ async def health_check():
         "bexio_configured": bool(BEXIO_CLIENT_ID and BEXIO_CLIENT_SECRET)
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Métriques au format Prometheus"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+def check_profiler_token(token: Optional[str]):
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Profilage désactivé")
+    if token != PROFILER_TOKEN:
+        raise HTTPException(status_code=403, detail="Token de profilage invalide")
+
+@app.post("/debug/profiler/start")
+async def start_profiler(token: Optional[str] = None, interval_ms: float = Query(10, ge=1, le=1000),
+                         duration: float = Query(30, gt=0)):
+    """Démarre l'échantillonnage de la boucle d'événements de ce worker"""
+    check_profiler_token(token)
+    sampling_profiler.start(interval_ms / 1000, min(duration, PROFILER_MAX_DURATION))
+    return {"data": {"running": True, "worker_pid": os.getpid(), "interval_ms": interval_ms}}
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler(token: Optional[str] = None):
+    """Arrête l'échantillonnage en cours"""
+    check_profiler_token(token)
+    sampling_profiler.stop()
+    return {"data": {"running": False, "worker_pid": os.getpid()}}
+
+@app.get("/debug/profiler")
+async def profiler_report(token: Optional[str] = None, limit: int = 200):
+    """Piles échantillonnées (format « collapsed », compatible flamegraph)"""
+    check_profiler_token(token)
+    return Response(sampling_profiler.report(limit), media_type="text/plain")
+
+@app.get("/stats/http")
+async def http_pool_stats():
+    """Statistiques du pool de connexions vers Bexio"""
+    return {"data": get_http_pool_stats()}
+
+@app.get("/stats/tokens")
+async def token_stats():
+    """Statistiques du cache des tokens OAuth"""
+    return {"data": token_cache.get_stats()}
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Statistiques du cache des réponses Bexio"""
+    return {"data": response_cache.get_stats()}
+
+@app.get("/stats/upstream")
+async def upstream_stats():
+    """Statistiques de l'ordonnanceur et du disjoncteur Bexio"""
+    return {"data": {"scheduler": upstream_scheduler.get_stats(), "circuit": circuit_breakers.get_stats()}}
+
+@app.get("/stats/mirror")
+async def mirror_stats():
+    """Statistiques de synchronisation du miroir local"""
+    return {"data": mirror_sync.get_stats()}
+
+@app.get("/stats/coalescing")
+async def coalescing_stats():
+    """Statistiques de déduplication des appels Bexio"""
+    return {"data": request_coalescer.get_stats()}
+
+@app.get("/stats/webhooks")
+async def webhook_stats():
+    """Statistiques de la file des webhooks Bexio"""
+    queue = await run_db(with_session, db_count_webhook_events)
+    return {"data": {**webhook_processor.get_stats(), "queue": queue}}
+
+@app.get("/stats/shared")
+async def shared_state_stats():
+    """Backend d'état partagé entre workers"""
+    return {"data": {"backend": shared_state.name, "worker_pid": os.getpid(), **shared_stats}}
+
+@app.get("/stats/jobs")
+async def job_stats():
+    """Statistiques des travaux en arrière-plan"""
+    queue = await run_db(with_session, db_count_jobs)
+    return {"data": {**job_queue.get_stats(), "queue": queue}}
+
+@app.delete("/cache/{client_id}")
+async def invalidate_client_cache(client_id: str, endpoint: Optional[str] = None):
+    """Invalide le cache d'un client (tous endpoints ou un seul)"""
+    removed = await invalidate_cache(client_id, endpoint)
+    return {"data": {"client_id": client_id, "endpoint": endpoint, "removed": removed}}
+
 @app.post("/auth/bexio/authorize")
 async def authorize_bexio_client(auth_request: BexioAuthRequest, db: Session = Depends(get_db)):
     """Autorisation OAuth Bexio mise à jour avec nouvelle URL"""
@@ -342,141 +3689,371 @@ async def authorize_bexio_client(auth_request: BexioAuthRequest, db: Session = D
         return {"authorization_url": auth_url}
     
     # Échanger le code contre un token avec nouvelle URL
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{BEXIO_AUTH_URL}/protocol/openid-connect/token",
-                data={
-                    "grant_type": "authorization_code",
-                    "code": auth_request.authorization_code,
-                    "redirect_uri": BEXIO_REDIRECT_URI,
-                    "client_id": BEXIO_CLIENT_ID,
-                    "client_secret": BEXIO_CLIENT_SECRET,
-                }
-            )
+    client = get_http_client()
+    try:
+        response = await client.post(
+            f"{BEXIO_AUTH_URL}/protocol/openid-connect/token",
+            data={
+                "grant_type": "authorization_code",
+                "code": auth_request.authorization_code,
+                "redirect_uri": BEXIO_REDIRECT_URI,
+                "client_id": BEXIO_CLIENT_ID,
+                "client_secret": BEXIO_CLIENT_SECRET,
+            }
+        )
+        
+        if response.status_code == 200:
+            token_data = response.json()
             
-            if response.status_code == 200:
-                token_data = response.json()
-                
-                # Sauvegarder les tokens
-                client_auth = db.query(ClientAuth).filter(ClientAuth.client_id == auth_request.client_id).first()
-                if not client_auth:
-                    client_auth = ClientAuth(client_id=auth_request.client_id)
-                    db.add(client_auth)
-                
-                client_auth.access_token = token_data["access_token"]
-                client_auth.refresh_token = token_data.get("refresh_token", "")
-                client_auth.expires_at = datetime.utcnow() + timedelta(seconds=token_data.get("expires_in", 3600))
-                client_auth.updated_at = datetime.utcnow()
-                db.commit()
-                
-                return {"status": "success", "message": "Client autorisé avec succès"}
-            else:
-                raise HTTPException(status_code=400, detail="Échec de l'autorisation Bexio")
-                
-        except Exception as e:
-            logger.error(f"Erreur autorisation: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Erreur lors de l'autorisation: {str(e)}")
+            # Sauvegarder les tokens
+            entry = await run_db(db_save_client_tokens, db, auth_request.client_id, token_data)
+            token_cache.set(auth_request.client_id, entry)
+            
+            return {"status": "success", "message": "Client autorisé avec succès"}
+        else:
+            raise HTTPException(status_code=400, detail="Échec de l'autorisation Bexio")
+            
+    except Exception as e:
+        logger.error(f"Erreur autorisation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'autorisation: {str(e)}")
+
+@app.post("/clients/{client_id}/sync")
+async def sync_client_mirror(client_id: str, full: bool = False):
+    """Synchronise le miroir local d'un client (complète ou incrémentale)"""
+    results = await asyncio.shield(mirror_sync.sync_client(client_id, full))
+    return {"data": results}
+
+@app.post("/webhooks/bexio/{client_id}", status_code=202)
+async def receive_bexio_webhook(request: Request, client_id: str):
+    """Reçoit des événements Bexio (contacts, factures) et les met en file"""
+    if not WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Webhooks désactivés")
+    
+    body = await request.body()
+    if not verify_webhook_signature(body, request.headers.get("x-bexio-signature")):
+        raise HTTPException(status_code=401, detail="Signature webhook invalide")
+    
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corps JSON invalide")
+    
+    # Événements non supportés acquittés et ignorés : une nouvelle livraison n'y changerait rien
+    events, skipped = [], []
+    for item in payload if isinstance(payload, list) else [payload]:
+        try:
+            events.append(parse_webhook_event(item))
+        except ValueError as e:
+            skipped.append(str(e))
+    if skipped:
+        webhook_processor.stats["skipped"] += len(skipped)
+        logger.warning(f"Webhook {client_id}: {len(skipped)} événement(s) ignoré(s) ({skipped[0]})")
+    
+    ids = await run_db(with_session, db_enqueue_webhook_events, client_id, events) if events else []
+    webhook_processor.stats["received"] += len(ids)
+    webhook_processor.notify()
+    return {"data": {"client_id": client_id, "queued": len(ids), "skipped": len(skipped)}}
+
+@app.get("/clients/{client_id}/sync")
+async def get_client_sync_state(client_id: str, db: Session = Depends(get_db)):
+    """État de synchronisation du miroir local d'un client"""
+    return {"data": await run_db(db_get_sync_states, db, client_id)}
 
 @app.get("/clients/{client_id}/contacts")
-async def get_client_contacts(client_id: str, db: Session = Depends(get_db)):
-    """Récupère les contacts avec structure Bexio exacte"""
+async def get_client_contacts(request: Request, client_id: str, source: Literal["live", "mirror"] = "live",
+                              stream: Optional[Literal["ndjson", "json"]] = None, fields: Optional[str] = None,
+                              db: Session = Depends(get_db)):
+    """Récupère les contacts avec structure Bexio exacte (?fields= pour une projection)"""
+    selected = parse_fields(fields, CONTACT_FIELDS)
+    if stream:
+        # Tous les contacts, page par page, en flux
+        if source == "mirror":
+            pages = iter_mirror_pages(client_id, BexioContact)
+        else:
+            pages = iter_bexio_pages(client_id, "contact")
+        formatter = make_formatter("contact", tuple(selected) if selected else None)
+        return await streaming_records_response(pages, formatter, stream)
+    
+    cache_control = cache_control_for(ResponseCache.ttl_for("contact"))
     try:
+        if source == "mirror":
+            version = await run_db(db_get_mirror_version, db, client_id, "contact")
+            etag = make_etag("contacts", client_id, "mirror", version, selected) if version else None
+            if etag_matches(request, etag):
+                return not_modified_response(etag, cache_control)
+            contacts = await run_db(db_list_mirror_contacts, db, client_id, selected)
+            return conditional_json_response(request, {"data": contacts, "source": "mirror"}, cache_control, etag)
+        
+        # ETag dérivé de la version en cache : 304 sans appel Bexio ni sérialisation
+        key = ResponseCache.make_key(client_id, "contact")
+        cached_etag = response_cache.etag(key, fresh_only=True)
+        if cached_etag and etag_matches(request, make_etag("contacts", cached_etag, selected)):
+            return not_modified_response(make_etag("contacts", cached_etag, selected), cache_control)
+        
         result = await make_bexio_request(client_id, "contact", db=db)
         
         # Formatter selon structure Softr avec données Bexio réelles
-        contacts = []
-        if isinstance(result, list):
-            for contact in result:
-                contacts.append({
-                    "id": contact.get("id"),
-                    "name_1": contact.get("name_1", ""),
-                    "name_2": contact.get("name_2", ""),
-                    "mail": contact.get("mail", ""),
-                    "phone_fixed": contact.get("phone_fixed", ""),
-                    "phone_mobile": contact.get("phone_mobile", ""),
-                    "address": contact.get("address", ""),
-                    "city": contact.get("city", ""),
-                    "postcode": contact.get("postcode", "")
-                })
-        
-        return {"data": contacts}
+        contacts = format_records(result, "contact", selected)
+        
+        cached_etag = response_cache.etag(key)
+        etag = make_etag("contacts", cached_etag, selected) if cached_etag else None
+        return conditional_json_response(request, {"data": contacts}, cache_control, etag)
     except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code == 429:
+            # Quota Bexio : l'appelant réessaie après Retry-After
+            raise
         logger.error(f"Erreur contacts: {str(e)}")
         return {"data": [], "error": str(e)}
 
 @app.get("/clients/{client_id}/invoices")
-async def get_client_invoices(client_id: str, limit: int = 50, offset: int = 0, db: Session = Depends(get_db)):
-    """Récupère les factures avec structure Bexio exacte"""
+async def get_client_invoices(request: Request, client_id: str, limit: int = 50, offset: int = 0,
+                              source: Literal["live", "mirror"] = "live",
+                              stream: Optional[Literal["ndjson", "json"]] = None, fields: Optional[str] = None,
+                              db: Session = Depends(get_db)):
+    """Récupère les factures avec structure Bexio exacte (?fields= pour une projection)"""
+    selected = parse_fields(fields, INVOICE_FIELDS)
+    if stream:
+        # Toutes les factures (limit/offset ignorés), page par page, en flux
+        if source == "mirror":
+            pages = iter_mirror_pages(client_id, BexioInvoice)
+        else:
+            pages = iter_bexio_pages(client_id, "kb_invoice")
+        formatter = make_formatter("invoice", tuple(selected) if selected else None)
+        return await streaming_records_response(pages, formatter, stream)
+    
+    cache_control = cache_control_for(ResponseCache.ttl_for("kb_invoice"))
+    pagination = {"limit": limit, "offset": offset}
     try:
+        if source == "mirror":
+            version = await run_db(db_get_mirror_version, db, client_id, "kb_invoice")
+            etag = make_etag("invoices", client_id, "mirror", version, limit, offset, selected) if version else None
+            if etag_matches(request, etag):
+                return not_modified_response(etag, cache_control)
+            invoices = await run_db(db_list_mirror_invoices, db, client_id, limit, offset, selected)
+            content = {"data": invoices, "pagination": pagination, "source": "mirror"}
+            return conditional_json_response(request, content, cache_control, etag)
+        
         params = {"limit": limit, "offset": offset}
+        key = ResponseCache.make_key(client_id, "kb_invoice", params)
+        cached_etag = response_cache.etag(key, fresh_only=True)
+        if cached_etag and etag_matches(request, make_etag("invoices", cached_etag, selected)):
+            return not_modified_response(make_etag("invoices", cached_etag, selected), cache_control)
+        
         result = await make_bexio_request(client_id, "kb_invoice", params=params, db=db)
         
         # Formatter selon structure Bexio réelle
-        invoices = []
-        if isinstance(result, list):
-            for invoice in result:
-                invoices.append({
-                    "id": invoice.get("id"),
-                    "document_nr": invoice.get("document_nr", ""),
-                    "title": invoice.get("title", ""),
-                    "total_gross": float(invoice.get("total_gross", 0)),
-                    "total_net": float(invoice.get("total_net", 0)),
-                    "currency": invoice.get("currency", "CHF"),
-                    "is_valid_from": invoice.get("is_valid_from", ""),
-                    "is_valid_to": invoice.get("is_valid_to", ""),
-                    "contact_id": invoice.get("contact_id", 0)
-                })
-        
-        return {"data": invoices, "pagination": {"limit": limit, "offset": offset}}
+        invoices = format_records(result, "invoice", selected)
+        
+        cached_etag = response_cache.etag(key)
+        etag = make_etag("invoices", cached_etag, selected) if cached_etag else None
+        return conditional_json_response(request, {"data": invoices, "pagination": pagination}, cache_control, etag)
     except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code == 429:
+            # Quota Bexio : l'appelant réessaie après Retry-After
+            raise
         logger.error(f"Erreur factures: {str(e)}")
         return {"data": [], "error": str(e)}
 
+async def search_mirror_response(request: Request, client_id: str, resource: str, model, spec_name: str,
+                                 q: Optional[str], filters: List, sort: str, order: str,
+                                 cursor: Optional[str], limit: int, fields: Optional[str]) -> Response:
+    """Recherche dans le miroir local (ETag dérivé de la version du miroir)"""
+    selected = parse_fields(fields, FORMAT_SPECS[spec_name])
+    try:
+        decoded = decode_cursor(cursor, sort, order, SEARCH_CURSOR_TYPES[sort]) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    cache_control = cache_control_for(ResponseCache.ttl_for(resource))
+    version = await run_db(with_session, db_get_mirror_version, client_id, resource)
+    etag = make_etag("search", client_id, resource, version, str(request.url.query)) if version else None
+    if etag_matches(request, etag):
+        return not_modified_response(etag, cache_control)
+    
+    records, next_cursor = await run_db(with_session, db_search_mirror, model, spec_name, client_id, q, filters,
+                                        sort, order, decoded, limit, selected)
+    content = {
+        "data": records,
+        "pagination": {"limit": limit, "next_cursor": next_cursor},
+        "source": "mirror",
+    }
+    return conditional_json_response(request, content, cache_control, etag)
+
+@app.get("/clients/{client_id}/contacts/search")
+async def search_client_contacts(request: Request, client_id: str, q: Optional[str] = None,
+                                 city: Optional[str] = None, postcode: Optional[str] = None,
+                                 sort: Literal["id", "name_1"] = "name_1", order: Literal["asc", "desc"] = "asc",
+                                 cursor: Optional[str] = None,
+                                 limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+                                 fields: Optional[str] = None):
+    """Recherche de contacts (nom, e-mail, ville) dans le miroir local, paginée par curseur"""
+    filters = []
+    if city:
+        filters.append(func.lower(BexioContact.city) == city.lower())
+    if postcode:
+        filters.append(BexioContact.postcode == postcode)
+    return await search_mirror_response(request, client_id, "contact", BexioContact, "contact",
+                                        q, filters, sort, order, cursor, limit, fields)
+
+@app.get("/clients/{client_id}/invoices/search")
+async def search_client_invoices(request: Request, client_id: str, q: Optional[str] = None,
+                                 document_nr: Optional[str] = None, date_from: Optional[str] = None,
+                                 date_to: Optional[str] = None, min_amount: Optional[float] = None,
+                                 max_amount: Optional[float] = None, contact_id: Optional[int] = None,
+                                 currency: Optional[str] = None, open: Optional[bool] = None,
+                                 sort: Literal["id", "is_valid_from", "total_gross"] = "is_valid_from",
+                                 order: Literal["asc", "desc"] = "desc", cursor: Optional[str] = None,
+                                 limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+                                 fields: Optional[str] = None):
+    """Recherche de factures (numéro, titre, dates, montants) dans le miroir local, paginée par curseur"""
+    filters = []
+    if document_nr:
+        # Préfixe : utilise l'index (client_id, document_nr)
+        filters.append(BexioInvoice.document_nr.startswith(document_nr, autoescape=True))
+    if date_from:
+        filters.append(BexioInvoice.is_valid_from >= date_from)
+    if date_to:
+        filters.append(and_(BexioInvoice.is_valid_from != "", BexioInvoice.is_valid_from <= date_to))
+    if min_amount is not None:
+        filters.append(BexioInvoice.total_gross >= min_amount)
+    if max_amount is not None:
+        filters.append(BexioInvoice.total_gross <= max_amount)
+    if contact_id is not None:
+        filters.append(BexioInvoice.contact_id == contact_id)
+    if currency:
+        filters.append(BexioInvoice.currency == currency.upper())
+    if open is not None:
+        is_open = BexioInvoice.kb_item_status_id.in_(OPEN_INVOICE_STATUSES)
+        filters.append(is_open if open else ~is_open)
+    return await search_mirror_response(request, client_id, "kb_invoice", BexioInvoice, "invoice",
+                                        q, filters, sort, order, cursor, limit, fields)
+
+async def fetch_dashboard_source(name: str, coro, timeout: Optional[float] = None):
+    """Attend une source du dashboard avec délai ; retourne (résultat, statut)"""
+    try:
+        result = await asyncio.wait_for(coro, timeout=timeout or DASHBOARD_SOURCE_TIMEOUT)
+        if isinstance(result, dict) and result.get("truncated"):
+            # Totaux partiels (parcours borné), le miroir prendra le relais
+            return result, {"status": "truncated"}
+        return result, {"status": "ok"}
+    except asyncio.TimeoutError:
+        logger.warning(f"Dashboard: délai dépassé pour {name}")
+        return None, {"status": "timeout"}
+    except Exception as e:
+        logger.error(f"Dashboard: erreur {name}: {str(e)}")
+        return None, {"status": "error", "error": str(e)}
+
+EXPORT_RESOURCES = {
+    "contacts": ("contact", BexioContact, "contact"),
+    "invoices": ("kb_invoice", BexioInvoice, "invoice"),
+}
+
+@app.get("/clients/{client_id}/export/{resource}")
+async def export_client_records(request: Request, client_id: str, resource: Literal["contacts", "invoices"],
+                                file_format: Literal["csv", "xlsx"] = Query("csv", alias="format"),
+                                source: Literal["live", "mirror"] = "live", fields: Optional[str] = None,
+                                compression: Literal["auto", "gzip", "none"] = "auto"):
+    """Export complet en flux (CSV ou XLSX), page par page, compressé à la volée
+    
+    compression=auto : Content-Encoding gzip si le client l'accepte ;
+    compression=gzip : fichier .csv.gz. Le XLSX est déjà compressé.
+    """
+    endpoint, model, spec_name = EXPORT_RESOURCES[resource]
+    selected = parse_fields(fields, FORMAT_SPECS[spec_name])
+    columns = selected or list(FORMAT_SPECS[spec_name])
+    formatter = make_formatter(spec_name, tuple(selected) if selected else None)
+    
+    if source == "mirror":
+        pages = iter_mirror_pages(client_id, model)
+    else:
+        pages = iter_bexio_pages(client_id, endpoint)
+    pages = await prime_pages(pages)
+    
+    filename = f"{resource}-{re.sub(r'[^A-Za-z0-9_.-]', '_', client_id)}-{datetime.utcnow():%Y%m%d}"
+    headers = {}
+    if file_format == "xlsx":
+        chunks = xlsx_chunks(pages, formatter, columns, resource)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        filename += ".xlsx"
+    else:
+        chunks = csv_chunks(pages, formatter, columns)
+        media_type = "text/csv; charset=utf-8"
+        filename += ".csv"
+        accepts_gzip = "gzip" in request.headers.get("accept-encoding", "")
+        if compression == "gzip":
+            chunks = gzip_chunks(chunks, EXPORT_GZIP_LEVEL)
+            media_type = "application/gzip"
+            filename += ".gz"
+        elif compression == "auto" and accepts_gzip:
+            chunks = gzip_chunks(chunks, EXPORT_GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+    
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+@app.get("/clients/{client_id}/aggregates")
+async def get_client_aggregates(request: Request, client_id: str):
+    """Totaux de factures précalculés : par devise, par mois et ancienneté des montants ouverts"""
+    aggregates = await get_invoice_aggregates(client_id)
+    return conditional_json_response(request, {"data": aggregates}, cache_control_for(ResponseCache.ttl_for("kb_invoice")))
+
 @app.get("/clients/{client_id}/dashboard")
-async def get_client_dashboard(client_id: str, db: Session = Depends(get_db)):
+async def get_client_dashboard(request: Request, client_id: str, db: Session = Depends(get_db)):
     """Dashboard avec données réalistes de style Bexio"""
+    cache_control = cache_control_for(HTTP_CACHE_DASHBOARD_TTL)
     try:
         # Données fictives réalistes ou vraies données Bexio
         mock_dashboard = get_realistic_dashboard_data(client_id)
         if mock_dashboard:
             logger.info(f"Dashboard réaliste pour {client_id}")
-            return {"data": mock_dashboard}
+            return conditional_json_response(request, {"data": mock_dashboard}, cache_control)
         
-        # Pour vrais clients Bexio
-        contacts_result = await make_bexio_request(client_id, "contact", params={"limit": 5}, db=db)
-        invoices_result = await make_bexio_request(client_id, "kb_invoice", params={"limit": 10}, db=db)
+        # Pour vrais clients Bexio : sources chargées en parallèle, résultats partiels
+        # Totaux calculés sur toutes les pages (et non sur la première uniquement)
+        contacts, invoices, tasks, tasks_count = await asyncio.gather(
+            fetch_dashboard_source("contacts", summarize_contacts(client_id)),
+            fetch_dashboard_source("invoices", summarize_invoices(client_id, keep=5)),
+            # Session dédiée : la session de la requête est utilisée par les appels Bexio
+            fetch_dashboard_source("tasks", run_db(with_session, db_get_pending_tasks, client_id)),
+            fetch_dashboard_source("tasks_count", run_db(with_session, db_count_tasks, client_id, PENDING_STATUSES)),
+        )
+        contacts_result, contacts_status = contacts
+        invoices_result, invoices_status = invoices
+        pending_tasks, tasks_status = tasks
+        pending_count, _ = tasks_count
         
-        pending_tasks = db.query(TaskManagement).filter(
-            TaskManagement.client_id == client_id,
-            TaskManagement.status.in_(["pending", "in_progress"])
-        ).all()
+        contacts_result = contacts_result or {"count": 0}
+        invoices_result = invoices_result or {"count": 0, "total": 0, "first": []}
+        pending_tasks = pending_tasks or []
         
-        total_contacts = len(contacts_result) if isinstance(contacts_result, list) else 0
-        total_invoices = len(invoices_result) if isinstance(invoices_result, list) else 0
-        total_amount = sum(float(inv.get("total_gross", 0)) for inv in invoices_result) if isinstance(invoices_result, list) else 0
+        sections = {"contacts": contacts_status, "invoices": invoices_status, "tasks": tasks_status}
         
-        return {
+        response = {
             "data": {
                 "summary": {
-                    "total_contacts": total_contacts,
-                    "total_invoices": total_invoices,
-                    "total_amount": total_amount,
-                    "pending_tasks": len(pending_tasks)
+                    "total_contacts": contacts_result["count"],
+                    "total_invoices": invoices_result["count"],
+                    "total_amount": invoices_result["total"],
+                    "pending_tasks": pending_count if pending_count is not None else len(pending_tasks)
                 },
-                "recent_invoices": invoices_result[:5] if isinstance(invoices_result, list) else [],
+                "recent_invoices": invoices_result["first"],
                 "pending_tasks": [
                     {
-                        "id": task.id,
-                        "title": task.title,
-                        "description": task.description,
-                        "due_date": task.due_date.isoformat() if task.due_date else None,
-                        "status": task.status
+                        "id": task["id"],
+                        "title": task["title"],
+                        "description": task["description"],
+                        "due_date": task["due_date"],
+                        "status": task["status"]
                     }
                     for task in pending_tasks
                 ]
-            }
+            },
+            "sections": sections
         }
+        if any(section["status"] != "ok" for section in sections.values()):
+            response["partial"] = True
+        return conditional_json_response(request, response, cache_control)
     except Exception as e:
         logger.error(f"Erreur dashboard: {str(e)}")
         return {
@@ -488,50 +4065,240 @@ async def get_client_dashboard(client_id: str, db: Session = Depends(get_db)):
             "error": str(e)
         }
 
+portfolio_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_portfolio_semaphore() -> asyncio.Semaphore:
+    global portfolio_semaphore
+    if portfolio_semaphore is None:
+        portfolio_semaphore = asyncio.Semaphore(PORTFOLIO_CONCURRENCY)
+    return portfolio_semaphore
+
+async def summarize_portfolio_client(client_id: str, pending_tasks: int) -> Dict:
+    """Résumé d'un client pour la vue portefeuille (une place de la limite globale par client)"""
+    mock_dashboard = get_realistic_dashboard_data(client_id)
+    if mock_dashboard:
+        summary = {**mock_dashboard["summary"], "overdue_invoices": 0, "overdue_amount": 0}
+        return {"client_id": client_id, "summary": summary, "sections": {}}
+    
+    async with get_portfolio_semaphore():
+        contacts, invoices = await asyncio.gather(
+            fetch_dashboard_source("contacts", summarize_contacts(client_id), timeout=PORTFOLIO_CLIENT_TIMEOUT),
+            fetch_dashboard_source("invoices", summarize_invoices(client_id), timeout=PORTFOLIO_CLIENT_TIMEOUT),
+        )
+    contacts_result, contacts_status = contacts
+    invoices_result, invoices_status = invoices
+    contacts_result = contacts_result or {"count": 0}
+    invoices_result = invoices_result or {"count": 0, "total": 0, "overdue": 0, "overdue_total": 0}
+    
+    result = {
+        "client_id": client_id,
+        "summary": {
+            "total_contacts": contacts_result["count"],
+            "total_invoices": invoices_result["count"],
+            "total_amount": round(invoices_result["total"], 2),
+            "overdue_invoices": invoices_result["overdue"],
+            "overdue_amount": round(invoices_result["overdue_total"], 2),
+            "pending_tasks": pending_tasks,
+        },
+        "sections": {"contacts": contacts_status, "invoices": invoices_status},
+    }
+    if contacts_status["status"] != "ok" or invoices_status["status"] != "ok":
+        result["partial"] = True
+    return result
+
+async def stream_portfolio(client_ids: List[str], pending: Dict[str, int]):
+    """NDJSON : une ligne par client dès qu'elle est prête, puis une ligne de totaux"""
+    tasks = [asyncio.create_task(summarize_portfolio_client(client_id, pending.get(client_id, 0)))
+             for client_id in client_ids]
+    totals = {"total_contacts": 0, "total_invoices": 0, "total_amount": 0.0,
+              "overdue_invoices": 0, "overdue_amount": 0.0, "pending_tasks": 0}
+    partial = 0
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            for name in totals:
+                totals[name] += result["summary"][name]
+            partial += 1 if result.get("partial") else 0
+            yield dump_json(result) + b"\n"
+    finally:
+        # Client déconnecté : les dashboards restants sont abandonnés
+        for task in tasks:
+            task.cancel()
+    totals["total_amount"] = round(totals["total_amount"], 2)
+    totals["overdue_amount"] = round(totals["overdue_amount"], 2)
+    yield dump_json({"totals": totals, "clients": len(client_ids), "partial_clients": partial}) + b"\n"
+
+def validate_batch(items: List[Dict], model) -> tuple:
+    """Valide chaque élément d'un lot ; retourne (valides avec index, erreurs par élément)"""
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            parsed = model.model_validate(item)
+        except ValidationError as e:
+            errors.append({
+                "index": index,
+                "errors": [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]
+            })
+            continue
+        if isinstance(parsed, TaskCreate) and not (parsed.client_id.strip() and parsed.title.strip()):
+            errors.append({"index": index, "errors": [{"loc": ["title"], "msg": "client_id et title sont requis"}]})
+            continue
+        valid.append((index, parsed))
+    return valid, errors
+
+def check_batch_size(items: List[Dict]):
+    if not items:
+        raise HTTPException(status_code=422, detail="Lot vide")
+    if len(items) > TASKS_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"Lot limité à {TASKS_BULK_MAX} tâches")
+
+def check_admin_token(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Administration désactivée")
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token d'administration invalide")
+
+@app.get("/portfolio")
+async def get_portfolio(token: Optional[str] = None, client_ids: Optional[str] = None):
+    """Vue multi-clients (ids séparés par des virgules, sinon tous les clients actifs), en NDJSON"""
+    check_admin_token(token)
+    if client_ids:
+        ids = list(dict.fromkeys(client_id.strip() for client_id in client_ids.split(",") if client_id.strip()))
+    else:
+        ids = await run_db(with_session, db_list_active_clients)
+    pending = await run_db(with_session, db_count_pending_tasks_by_client, ids) if ids else {}
+    return StreamingResponse(stream_portfolio(ids, pending), media_type="application/x-ndjson")
+
+# Travaux en arrière-plan
+@app.post("/jobs", status_code=202)
+async def create_job(job: JobCreate, token: Optional[str] = None):
+    """Met un travail en file (mirror_sync, tasks_push, ...)"""
+    check_admin_token(token)
+    if job.kind not in job_queue.handlers:
+        raise HTTPException(status_code=422, detail=f"Type de travail inconnu: {job.kind}")
+    max_attempts = max(1, job.max_attempts or JOB_MAX_ATTEMPTS)
+    created = await run_db(with_session, db_create_job, job.client_id, job.kind, job.params, max_attempts)
+    job_queue.notify()
+    return {"data": created}
+
+@app.get("/jobs")
+async def list_jobs(token: Optional[str] = None, client_id: Optional[str] = None, status: Optional[str] = None,
+                    limit: int = Query(50, ge=1, le=500)):
+    """Liste les travaux, les plus récents d'abord"""
+    check_admin_token(token)
+    return {"data": await run_db(with_session, db_list_jobs, client_id, status, limit)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, token: Optional[str] = None):
+    """État et avancement d'un travail"""
+    check_admin_token(token)
+    job = await run_db(with_session, db_get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Travail introuvable")
+    return {"data": job}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, token: Optional[str] = None):
+    """Annule un travail en file ou en cours"""
+    check_admin_token(token)
+    job = await run_db(with_session, db_request_job_cancel, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Travail introuvable")
+    job_queue.cancel(job_id)
+    return {"data": job}
+
 # Endpoints de gestion des tâches (inchangés)
 @app.post("/tasks")
 async def create_task(task: TaskCreate, db: Session = Depends(get_db)):
     """Crée une nouvelle tâche"""
     try:
-        db_task = TaskManagement(
-            client_id=task.client_id,
-            title=task.title,
-            description=task.description,
-            due_date=task.due_date
-        )
-        db.add(db_task)
-        db.commit()
-        db.refresh(db_task)
+        task_id = await run_db(db_create_task, db, task)
         
-        return {"data": {"id": db_task.id, "status": "created"}}
+        return {"data": {"id": task_id, "status": "created"}}
     except Exception as e:
         logger.error(f"Erreur création tâche: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/tasks/bulk")
+async def bulk_create_tasks(items: List[Dict], atomic: bool = False, db: Session = Depends(get_db)):
+    """Crée un lot de tâches en une seule transaction"""
+    check_batch_size(items)
+    valid, errors = validate_batch(items, TaskCreate)
+    if errors and atomic:
+        raise HTTPException(status_code=422, detail={"errors": errors})
+    
+    try:
+        ids = await run_db(db_bulk_create_tasks, db, [task for _, task in valid]) if valid else []
+    except Exception as e:
+        logger.error(f"Erreur création tâches en lot: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "data": [{"index": index, "id": task_id, "status": "created"} for (index, _), task_id in zip(valid, ids)],
+        "errors": errors
+    }
+
+@app.patch("/tasks/bulk")
+async def bulk_update_tasks(items: List[Dict], atomic: bool = False, db: Session = Depends(get_db)):
+    """Met à jour un lot de tâches en une seule transaction"""
+    check_batch_size(items)
+    valid, errors = validate_batch(items, TaskBulkUpdate)
+    
+    existing = await run_db(db_existing_task_ids, db, [task.id for _, task in valid]) if valid else set()
+    found = []
+    for index, task_update in valid:
+        if task_update.id in existing:
+            found.append((index, task_update))
+        else:
+            errors.append({"index": index, "errors": [{"loc": ["id"], "msg": "Tâche non trouvée"}]})
+    errors.sort(key=lambda error: error["index"])
+    
+    if errors and atomic:
+        raise HTTPException(status_code=422, detail={"errors": errors})
+    
+    try:
+        if found:
+            await run_db(db_bulk_update_tasks, db, [task_update for _, task_update in found])
+    except Exception as e:
+        logger.error(f"Erreur mise à jour tâches en lot: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "data": [{"index": index, "id": task_update.id, "status": "updated"} for index, task_update in found],
+        "errors": errors
+    }
+
 @app.get("/tasks/{client_id}")
-async def get_client_tasks(client_id: str, status: Optional[str] = None, db: Session = Depends(get_db)):
-    """Récupère les tâches d'un client"""
+async def get_client_tasks(request: Request, client_id: str, status: Optional[str] = None,
+                           limit: int = Query(TASKS_DEFAULT_LIMIT, ge=1, le=TASKS_MAX_LIMIT),
+                           cursor: Optional[str] = None,
+                           sort: Literal["id", "due_date", "created_at"] = "id",
+                           order: Literal["asc", "desc"] = "asc",
+                           count_only: bool = False, db: Session = Depends(get_db)):
+    """Récupère les tâches d'un client (pagination par curseur)"""
+    statuses = [status] if status else None
     try:
-        query = db.query(TaskManagement).filter(TaskManagement.client_id == client_id)
+        decoded_cursor = decode_task_cursor(cursor, sort, order) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Les tâches sont modifiées via l'API : le CDN doit toujours revalider
+    cache_control = "public, no-cache"
+    try:
+        version = await run_db(db_get_tasks_version, db, client_id)
+        etag = make_etag("tasks", client_id, version, status, limit, cursor, sort, order, count_only)
+        if etag_matches(request, etag):
+            return not_modified_response(etag, cache_control)
         
-        if status:
-            query = query.filter(TaskManagement.status == status)
+        if count_only:
+            content = {"data": {"count": await run_db(db_count_tasks, db, client_id, statuses)}}
+            return conditional_json_response(request, content, cache_control, etag)
         
-        tasks = query.all()
+        tasks, next_cursor = await run_db(db_list_tasks, db, client_id, statuses, limit, decoded_cursor, sort, order)
         
-        return {
-            "data": [
-                {
-                    "id": task.id,
-                    "title": task.title,
-                    "description": task.description,
-                    "status": task.status,
-                    "due_date": task.due_date.isoformat() if task.due_date else None,
-                    "created_at": task.created_at.isoformat()
-                }
-                for task in tasks
-            ]
-        }
+        content = {"data": tasks, "pagination": {"limit": limit, "next_cursor": next_cursor}}
+        return conditional_json_response(request, content, cache_control, etag)
     except Exception as e:
         logger.error(f"Erreur tâches: {str(e)}")
         return {"data": [], "error": str(e)}
@@ -540,27 +4307,27 @@ async def get_client_tasks(client_id: str, status: Optional[str] = None, db: Ses
 async def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get_db)):
     """Met à jour une tâche"""
     try:
-        db_task = db.query(TaskManagement).filter(TaskManagement.id == task_id).first()
-        
-        if not db_task:
+        if not await run_db(db_update_task, db, task_id, task_update):
             raise HTTPException(status_code=404, detail="Tâche non trouvée")
         
-        if task_update.status:
-            db_task.status = task_update.status
-        if task_update.title:
-            db_task.title = task_update.title
-        if task_update.description:
-            db_task.description = task_update.description
-        
-        db_task.updated_at = datetime.utcnow()
-        db.commit()
-        
         return {"data": {"id": task_id, "status": "updated"}}
     except Exception as e:
         logger.error(f"Erreur update tâche: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        with migration_lock():
+            init_database()
+        sys.exit(0)
+    
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Migration une seule fois, avant le démarrage des workers (qui trouvent le schéma à jour)
+    migrate_database()
+    if WEB_CONCURRENCY > 1:
+        if SHARED_BACKEND == "memory":
+            logger.warning("Plusieurs workers sans SHARED_BACKEND=redis : caches et limites de débit non partagés")
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,49 @@
+"""Configuration commune : base SQLite temporaire et Bexio simulé (benchmarks/fake_bexio.py)"""
+import os
+import sys
+import tempfile
+
+# Avant l'import de main : la configuration est lue à l'import
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='bexio-test-')}/test.db"
+os.environ["MIRROR_SYNC_ENABLED"] = "false"
+os.environ["JOBS_ENABLED"] = "false"
+os.environ["BEXIO_BASE_URL"] = "http://fake-bexio/2.0"
+os.environ["BEXIO_AUTH_URL"] = "http://fake-bexio/realms/bexio"
+os.environ["BEXIO_WEBHOOK_SECRET"] = "test-webhook-secret"
+os.environ["ADMIN_TOKEN"] = "test-admin-token"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from fake_bexio import FakeBexioConfig, create_fake_bexio  # noqa: E402
+
+@pytest.fixture
+def fake_bexio():
+    """Bexio simulé sans latence ; la configuration peut être modifiée par le test"""
+    app = create_fake_bexio(FakeBexioConfig(contacts=20, invoices=30, latency_ms=0, jitter_ms=0))
+    previous = main.http_transport
+    main.http_transport = httpx.ASGITransport(app=app)
+    yield app
+    main.http_transport = previous
+
+@pytest.fixture
+def api(fake_bexio):
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture
+def db(api):
+    """Session sur la base migrée par le lifespan"""
+    session = main.SessionLocal()
+    yield session
+    session.close()
+
+def authorize(client, client_id: str):
+    response = client.post("/auth/bexio/authorize", json={"client_id": client_id, "authorization_code": client_id})
+    assert response.status_code == 200, response.text
@@ -0,0 +1,58 @@
+"""Agrégats de factures : mises à jour par différence identiques au recalcul en masse"""
+from datetime import datetime, timedelta
+
+import main
+
+CLIENT_ID = "ag-a"
+
+def days_ago(days: int) -> str:
+    return (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+def invoice(index: int, gross: float, currency: str = "CHF", status: int = 8, due_days_ago: int = -10) -> dict:
+    return {"id": index, "document_nr": f"RE-{index:05d}", "title": f"Facture {index}", "contact_id": 1,
+            "total_gross": f"{gross:.2f}", "total_net": f"{gross / 1.081:.2f}", "currency": currency,
+            "is_valid_from": days_ago(due_days_ago + 30), "is_valid_to": days_ago(due_days_ago),
+            "kb_item_status_id": status, "updated_at": "2024-01-01 00:00:00"}
+
+def upsert(db, invoices, track_aggregates: bool = True):
+    rows = [main.invoice_to_row(CLIENT_ID, item, datetime.utcnow()) for item in invoices]
+    return main.db_upsert_mirror(db, main.BexioInvoice, CLIENT_ID, rows, track_aggregates)
+
+def test_incremental_aggregates_match_rebuild(db):
+    upsert(db, [
+        invoice(1, 100), invoice(2, 200, due_days_ago=45), invoice(3, 300, status=9),
+        invoice(4, 400, currency="EUR", due_days_ago=120),
+    ], track_aggregates=False)
+    main.db_rebuild_invoice_aggregates(db, CLIENT_ID)
+    
+    # Montant modifié, facture payée, changement de devise, nouvelle facture, suppression
+    assert upsert(db, [
+        invoice(1, 150), invoice(2, 200, status=9), invoice(3, 300, currency="EUR", status=9),
+        invoice(5, 50, due_days_ago=5),
+    ]) == 4
+    main.db_delete_mirror_record(db, main.BexioInvoice, CLIENT_ID, 4)
+    incremental = main.db_get_invoice_aggregates(db, CLIENT_ID)
+    
+    main.db_rebuild_invoice_aggregates(db, CLIENT_ID)
+    assert main.db_get_invoice_aggregates(db, CLIENT_ID) == incremental
+    
+    by_currency = {item["currency"]: item for item in incremental["by_currency"]}
+    assert by_currency["CHF"]["count"] == 3
+    assert by_currency["CHF"]["total_gross"] == 400
+    assert by_currency["CHF"]["open_count"] == 2
+    assert by_currency["CHF"]["open_amount"] == 200
+    assert by_currency["EUR"]["count"] == 1
+    assert by_currency["EUR"]["open_count"] == 0
+    assert {item["bucket"] for item in incremental["aging"]} == {"current", "1-30"}
+
+def test_unchanged_rows_do_not_count_twice(db):
+    before = main.db_get_invoice_aggregates(db, CLIENT_ID)
+    assert upsert(db, [invoice(1, 150)]) == 0
+    assert main.db_get_invoice_aggregates(db, CLIENT_ID) == before
+
+def test_aggregates_endpoint_etag(api):
+    response = api.get(f"/clients/{CLIENT_ID}/aggregates")
+    assert response.status_code == 200
+    assert response.json()["data"]["by_currency"]
+    etag = response.headers["ETag"]
+    assert api.get(f"/clients/{CLIENT_ID}/aggregates", headers={"If-None-Match": etag}).status_code == 304
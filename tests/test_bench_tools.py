@@ -0,0 +1,46 @@
+"""Outils de benchmark : Bexio simulé et calcul du rapport"""
+from fastapi.testclient import TestClient
+
+import bench
+from fake_bexio import FakeBexioConfig, create_fake_bexio
+
+def fake_client(**config) -> TestClient:
+    app = create_fake_bexio(FakeBexioConfig(contacts=12, invoices=25, latency_ms=0, jitter_ms=0, **config))
+    return TestClient(app, headers={"Authorization": "Bearer bench-token-fb"})
+
+def test_fake_bexio_paginates_deterministically():
+    client = fake_client()
+    first = client.get("/2.0/kb_invoice", params={"limit": 10, "offset": 20}).json()
+    assert [invoice["id"] for invoice in first] == [21, 22, 23, 24, 25]
+    assert client.get("/2.0/kb_invoice", params={"limit": 10, "offset": 20}).json() == first
+    # Autre tenant (autre token) : autres données
+    other = client.get("/2.0/kb_invoice", params={"limit": 10, "offset": 20},
+                       headers={"Authorization": "Bearer bench-token-other"}).json()
+    assert other != first
+
+def test_fake_bexio_search_since_updated_at():
+    client = fake_client()
+    contacts = client.get("/2.0/contact").json()
+    since = contacts[9]["updated_at"]
+    found = client.post("/2.0/contact/search", json=[{"field": "updated_at", "value": since, "criteria": ">="}]).json()
+    assert [contact["id"] for contact in found] == [10, 11, 12]
+
+def test_fake_bexio_injects_rate_limits():
+    client = fake_client(rate_429=1.0, retry_after=7)
+    response = client.get("/2.0/contact")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+    assert client.get("/stats").json()["rate_limited"] == 1
+
+def test_bench_report_percentiles_and_errors():
+    samples = {"contacts": [(0.01 * i, 200) for i in range(1, 100)] + [(2.0, 502)]}
+    report = bench.summarize(samples, elapsed=10)
+    assert report["contacts"]["requests"] == 100
+    assert report["contacts"]["errors"] == 1
+    assert report["contacts"]["p50_ms"] == 500
+    assert report["contacts"]["max_ms"] == 2000
+    assert report["TOTAL"]["rps"] == 10
+
+def test_bench_database_defaults_to_temporary_file():
+    assert bench.parse_args([]).database_url is None
+    assert bench.parse_args(["--database-url", "sqlite:///x.db"]).database_url == "sqlite:///x.db"
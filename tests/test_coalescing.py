@@ -0,0 +1,46 @@
+"""Déduplication des appels Bexio identiques concurrents"""
+import asyncio
+
+import main
+from conftest import authorize
+
+def concurrent_requests(api, client_id: str, params_list: list) -> list:
+    async def gather():
+        return await asyncio.gather(*[
+            main.make_bexio_request(client_id, "contact", params=params) for params in params_list
+        ])
+    return api.portal.call(gather)
+
+def test_identical_requests_share_one_upstream_call(api, fake_bexio):
+    authorize(api, "co-a")
+    fake_bexio.state.config.latency_ms = 50
+    requests = fake_bexio.state.stats["requests"]
+    coalesced = main.request_coalescer.stats["coalesced"]
+    
+    results = concurrent_requests(api, "co-a", [{"limit": 5}] * 10)
+    assert all(result == results[0] for result in results)
+    assert len(results[0]) == 5
+    assert fake_bexio.state.stats["requests"] == requests + 1
+    assert main.request_coalescer.stats["coalesced"] == coalesced + 9
+    assert not main.request_coalescer.inflight
+
+def test_different_params_are_not_shared(api, fake_bexio):
+    authorize(api, "co-b")
+    fake_bexio.state.config.latency_ms = 20
+    requests = fake_bexio.state.stats["requests"]
+    
+    concurrent_requests(api, "co-b", [{"limit": 5, "offset": 0}, {"limit": 5, "offset": 5}] * 3)
+    assert fake_bexio.state.stats["requests"] == requests + 2
+
+def test_caller_cancellation_keeps_shared_call(api, fake_bexio):
+    authorize(api, "co-c")
+    fake_bexio.state.config.latency_ms = 50
+    
+    async def cancel_one():
+        first = asyncio.create_task(main.make_bexio_request("co-c", "contact", params={"limit": 3}))
+        second = asyncio.create_task(main.make_bexio_request("co-c", "contact", params={"limit": 3}))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+    
+    assert len(api.portal.call(cancel_one)) == 3
@@ -0,0 +1,44 @@
+"""Curseurs de pagination : codec commun et rejet des curseurs forgés (400, pas 500)"""
+import base64
+import json
+
+import pytest
+
+import main
+
+def forge(*items) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(items)).encode()).decode().rstrip("=")
+
+def test_round_trip():
+    cursor = main.encode_cursor("due_date", "asc", main.datetime(2025, 1, 2, 3, 4), 7)
+    assert main.decode_cursor(cursor, "due_date", "asc", (str,)) == ("2025-01-02T03:04:00", 7)
+
+@pytest.mark.parametrize("cursor", [
+    "pas du base64 !",
+    forge("due_date", "asc", 123, 1),
+    forge("due_date", "asc", "2025-01-01", "1"),
+    forge("due_date", "asc", "2025-01-01", True),
+    forge("due_date", "asc", "pas une date", 1),
+    forge("due_date", "asc", "2025-01-01"),
+])
+def test_task_cursor_rejected(cursor):
+    with pytest.raises(ValueError):
+        main.decode_task_cursor(cursor, "due_date", "asc")
+
+def test_cursor_for_other_sort_rejected():
+    with pytest.raises(ValueError):
+        main.decode_cursor(forge("id", "asc", 1, 1), "id", "desc", (int,))
+
+@pytest.mark.parametrize("params", [
+    {"sort": "due_date", "cursor": forge("due_date", "asc", 123, 1)},
+    {"sort": "id", "cursor": forge("id", "asc", "1", 1)},
+    {"sort": "created_at", "cursor": forge("created_at", "asc", None, 1)},
+])
+def test_tasks_endpoint_returns_400(api, params):
+    response = api.get("/tasks/cursor-client", params=params)
+    assert response.status_code == 400, response.text
+
+def test_search_endpoint_rejects_wrong_value_type(api):
+    cursor = forge("total_gross", "desc", "100", 1)
+    response = api.get("/clients/cursor-client/invoices/search", params={"sort": "total_gross", "cursor": cursor})
+    assert response.status_code == 400
@@ -0,0 +1,63 @@
+"""Dashboard en direct : totaux sur toutes les pages, sources lentes ou en échec, totaux partiels"""
+import pytest
+
+import main
+from conftest import authorize
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(main, "PAGE_SIZE", 10)
+
+def invoice_summary(client_id: str):
+    key = main.ResponseCache.make_key(client_id, "kb_invoice", {"summary": "total_gross:5:True"})
+    return main.response_cache.get(key)
+
+def test_dashboard_totals_cover_all_pages(api, small_pages):
+    authorize(api, "db-a")
+    response = api.get("/clients/db-a/dashboard")
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["data"]["summary"]["total_invoices"] == 30
+    assert body["data"]["summary"]["total_contacts"] == 20
+    
+    value, fresh = invoice_summary("db-a")
+    assert fresh and "truncated" not in value
+
+def test_truncated_summary_expires_quickly(api, small_pages, monkeypatch):
+    monkeypatch.setattr(main, "DASHBOARD_MAX_PAGES", 2)
+    monkeypatch.setattr(main, "DASHBOARD_TRUNCATED_TTL", 0)
+    authorize(api, "db-b")
+    body = api.get("/clients/db-b/dashboard").json()
+    assert body["data"]["summary"]["total_invoices"] == 20
+    
+    # Servi en attendant, mais déjà à revalider
+    value, fresh = invoice_summary("db-b")
+    assert value["truncated"] is True
+    assert not fresh
+
+def test_slow_sources_give_partial_dashboard(api, fake_bexio, monkeypatch):
+    monkeypatch.setattr(main, "DASHBOARD_SOURCE_TIMEOUT", 0.5)
+    fake_bexio.state.config.latency_ms = 2000
+    authorize(api, "db-c")
+    api.post("/tasks", json={"client_id": "db-c", "title": "À faire"})
+    
+    response = api.get("/clients/db-c/dashboard")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    body = response.json()
+    assert body["partial"] is True
+    assert body["sections"]["invoices"]["status"] == "timeout"
+    assert body["sections"]["contacts"]["status"] == "timeout"
+    # Les tâches (base locale) restent servies
+    assert body["sections"]["tasks"]["status"] == "ok"
+    assert body["data"]["summary"]["pending_tasks"] == 1
+    assert "ETag" not in response.headers
+
+def test_upstream_error_is_reported_per_section(api, fake_bexio, monkeypatch):
+    monkeypatch.setattr(main, "UPSTREAM_MAX_RETRIES", 0)
+    fake_bexio.state.config.error_rate = 1.0
+    authorize(api, "db-d")
+    body = api.get("/clients/db-d/dashboard").json()
+    assert body["partial"] is True
+    assert body["sections"]["invoices"]["status"] == "error"
+    assert body["sections"]["tasks"]["status"] == "ok"
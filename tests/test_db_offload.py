@@ -0,0 +1,62 @@
+"""Appels SQLAlchemy synchrones exécutés hors de la boucle d'événements"""
+import asyncio
+import threading
+import time
+
+import main
+
+def test_run_db_does_not_block_the_loop():
+    def slow_query(duration: float) -> int:
+        time.sleep(duration)
+        return threading.get_ident()
+    
+    async def scenario():
+        ticks = 0
+        
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        
+        task = asyncio.create_task(ticker())
+        thread_id = await main.run_db(slow_query, 0.2)
+        task.cancel()
+        return thread_id, ticks
+    
+    thread_id, ticks = asyncio.run(scenario())
+    assert thread_id != threading.get_ident()
+    assert ticks >= 5
+
+def test_run_db_concurrency_is_bounded(monkeypatch):
+    monkeypatch.setattr(main, "db_limiter", None)
+    monkeypatch.setattr(main, "DB_THREADS", 2)
+    running = {"now": 0, "max": 0}
+    lock = threading.Lock()
+    
+    def query():
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+    
+    async def scenario():
+        await asyncio.gather(*[main.run_db(query) for _ in range(6)])
+    
+    asyncio.run(scenario())
+    assert running["max"] == 2
+
+def test_with_session_closes_its_session(db):
+    used = []
+    
+    def count(session, client_id: str) -> int:
+        used.append(session)
+        result = main.db_count_tasks(session, client_id)
+        assert session.in_transaction()
+        return result
+    
+    assert main.with_session(count, "offload-client") == 0
+    # Transaction terminée et connexion rendue au pool
+    assert not used[0].in_transaction()
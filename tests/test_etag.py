@@ -0,0 +1,55 @@
+"""ETag et GET conditionnels : 304 sans appel Bexio, version du miroir"""
+from conftest import authorize
+
+def conditional_get(api, url: str, etag: str, **params):
+    return api.get(url, params=params, headers={"If-None-Match": etag})
+
+def states(api, client_id: str) -> dict:
+    return {state["resource"]: state["version"] for state in api.get(f"/clients/{client_id}/sync").json()["data"]}
+
+def test_live_invoices_not_modified_without_upstream_call(api, fake_bexio):
+    authorize(api, "et-a")
+    response = api.get("/clients/et-a/invoices")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "s-maxage" in response.headers["Cache-Control"]
+    requests = fake_bexio.state.stats["requests"]
+    
+    response = conditional_get(api, "/clients/et-a/invoices", etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert fake_bexio.state.stats["requests"] == requests
+    
+    # Projection différente : autre représentation, autre ETag
+    response = conditional_get(api, "/clients/et-a/invoices", etag, fields="id,title")
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_weak_and_listed_etags_match(api):
+    authorize(api, "et-b")
+    etag = api.get("/clients/et-b/contacts").headers["ETag"]
+    assert conditional_get(api, "/clients/et-b/contacts", f'"other", W/{etag}').status_code == 304
+    assert conditional_get(api, "/clients/et-b/contacts", '"other"').status_code == 200
+
+def test_mirror_etag_follows_sync_version(api, fake_bexio):
+    authorize(api, "et-c")
+    assert api.post("/clients/et-c/sync", params={"full": True}).status_code == 200
+    url = "/clients/et-c/contacts"
+    response = api.get(url, params={"source": "mirror"})
+    assert len(response.json()["data"]) == 20
+    etag = response.headers["ETag"]
+    version = states(api, "et-c")["contact"]
+    
+    # Rien n'a changé chez Bexio : même version, 304
+    api.post("/clients/et-c/sync")
+    assert states(api, "et-c")["contact"] == version
+    assert conditional_get(api, url, etag, source="mirror").status_code == 304
+    
+    # Nouveau contact : la synchronisation incrémentale change la version
+    fake_bexio.state.config.contacts = 21
+    api.post("/clients/et-c/sync")
+    assert states(api, "et-c")["contact"] == version + 1
+    response = conditional_get(api, url, etag, source="mirror")
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 21
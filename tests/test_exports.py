@@ -0,0 +1,75 @@
+"""Exports en flux : CSV (gzip), XLSX, projection et neutralisation des formules"""
+import csv
+import gzip
+import io
+import zipfile
+
+import pytest
+
+import main
+from conftest import authorize
+
+def read_csv(content: bytes) -> list:
+    text = content.decode("utf-8")
+    assert text.startswith("\ufeff")
+    return list(csv.reader(io.StringIO(text[1:]), delimiter=";"))
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    # Plusieurs pages par export
+    monkeypatch.setattr(main, "PAGE_SIZE", 7)
+
+def test_csv_export_streams_all_pages(api, small_pages):
+    authorize(api, "ex-a")
+    response = api.get("/clients/ex-a/export/invoices", params={"compression": "none"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="invoices-ex-a-' in response.headers["content-disposition"]
+    rows = read_csv(response.content)
+    assert rows[0] == list(main.FORMAT_SPECS["invoice"])
+    assert len(rows) == 31
+    assert len({row[0] for row in rows[1:]}) == 30
+
+def test_csv_export_projection(api):
+    authorize(api, "ex-b")
+    response = api.get("/clients/ex-b/export/contacts", params={"fields": "id,name_1", "compression": "none"})
+    rows = read_csv(response.content)
+    assert rows[0] == ["id", "name_1"]
+    assert rows[1] == ["1", "Entreprise ex-b-1 SA"]
+
+def test_gzip_export_matches_plain_csv(api, small_pages):
+    authorize(api, "ex-c")
+    url = "/clients/ex-c/export/contacts"
+    plain = api.get(url, params={"compression": "none"}).content
+    
+    response = api.get(url, params={"compression": "gzip"})
+    assert response.headers["content-type"] == "application/gzip"
+    assert response.headers["content-disposition"].endswith('.csv.gz"')
+    assert gzip.decompress(response.content) == plain
+    
+    # compression=auto : Content-Encoding négocié (décodé par le client HTTP)
+    response = api.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == plain
+
+def test_xlsx_export_is_a_valid_workbook(api, small_pages):
+    authorize(api, "ex-d")
+    response = api.get("/clients/ex-d/export/contacts", params={"format": "xlsx", "fields": "id,name_1"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].endswith('.xlsx"')
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert "xl/workbook.xml" in archive.namelist()
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+    assert sheet.count("<row") == 21
+    assert "Entreprise ex-d-20 SA" in sheet
+
+def test_export_error_before_first_page_keeps_status(api):
+    response = api.get("/clients/ex-unknown/export/contacts")
+    assert response.status_code == 401
+
+def test_csv_safe_neutralizes_formulas():
+    assert main.csv_safe("=HYPERLINK(\"x\")") == "'=HYPERLINK(\"x\")"
+    assert main.csv_safe("@SUM(A1)") == "'@SUM(A1)"
+    assert main.csv_safe("+41 21 123 45 67") == "+41 21 123 45 67"
+    assert main.csv_safe("-12.50") == "-12.50"
+    assert main.csv_safe(12) == 12
@@ -0,0 +1,27 @@
+"""Client HTTP partagé : configuration réellement appliquée"""
+import asyncio
+import sys
+
+import main
+
+def build_client(monkeypatch, http2: bool):
+    monkeypatch.setattr(main, "HTTP2_ENABLED", http2)
+    client = main.create_http_client()
+    asyncio.run(client.aclose())
+
+def test_http2_reported_off_without_h2(monkeypatch):
+    # Paquet 'h2' absent : le client retombe en HTTP/1.1
+    monkeypatch.setitem(sys.modules, "h2", None)
+    build_client(monkeypatch, True)
+    stats = main.get_http_pool_stats()
+    assert stats["http2"] is False
+    assert stats["http2_requested"] is True
+
+def test_http2_reported_off_when_disabled(monkeypatch):
+    build_client(monkeypatch, False)
+    assert main.get_http_pool_stats()["http2"] is False
+
+def test_pool_stats_endpoint(api):
+    data = api.get("/stats/http").json()["data"]
+    assert data["max_connections"] == main.HTTP_MAX_CONNECTIONS
+    assert data["http2"] is main.http2_active
@@ -0,0 +1,76 @@
+"""File de travaux : accès administrateur et réservation par client"""
+import main
+
+ADMIN = {"token": "test-admin-token"}
+
+def test_jobs_require_admin_token(api):
+    assert api.get("/jobs").status_code == 403
+    assert api.get("/jobs", params={"token": "wrong"}).status_code == 403
+    assert api.post("/jobs", json={"kind": "mirror_sync", "client_id": "j0"}).status_code == 403
+    assert api.get("/jobs/unknown").status_code == 403
+    assert api.post("/jobs/unknown/cancel").status_code == 403
+    assert api.get("/jobs/unknown", params=ADMIN).status_code == 404
+
+def test_create_list_and_cancel_queued_job(api):
+    response = api.post("/jobs", params=ADMIN, json={"kind": "mirror_sync", "client_id": "j1"})
+    assert response.status_code == 202, response.text
+    job = response.json()["data"]
+    assert job["status"] == "queued"
+    
+    listed = api.get("/jobs", params={**ADMIN, "client_id": "j1"}).json()["data"]
+    assert [item["id"] for item in listed] == [job["id"]]
+    
+    cancelled = api.post(f"/jobs/{job['id']}/cancel", params=ADMIN).json()["data"]
+    assert cancelled["status"] == "cancelled"
+    assert api.get(f"/jobs/{job['id']}", params=ADMIN).json()["data"]["status"] == "cancelled"
+
+def test_unknown_job_kind_is_rejected(api):
+    response = api.post("/jobs", params=ADMIN, json={"kind": "unknown", "client_id": "j2"})
+    assert response.status_code == 422
+
+def test_claim_respects_per_client_limit(db):
+    first = main.db_create_job(db, "claim-a", "claim_test", {}, 3)
+    main.db_create_job(db, "claim-a", "claim_test", {}, 3)
+    other = main.db_create_job(db, "claim-b", "claim_test", {}, 3)
+    
+    assert main.db_claim_job(db, ["claim_test"])["id"] == first["id"]
+    # claim-a a déjà un travail en cours : c'est celui de claim-b qui passe
+    assert main.db_claim_job(db, ["claim_test"])["id"] == other["id"]
+    assert main.db_claim_job(db, ["claim_test"]) is None
+
+def run_job(api, db, kind: str, handler, max_attempts: int = 3) -> dict:
+    """Exécute un travail avec un handler de test sur la boucle de l'application"""
+    queue = main.JobQueue(1)
+    queue.handler(kind)(handler)
+    created = main.db_create_job(db, f"run-{kind}", kind, {}, max_attempts)
+    job = main.db_claim_job(db, [kind])
+    assert job["id"] == created["id"]
+    api.portal.call(queue._run, job)
+    db.expire_all()
+    return main.db_get_job(db, job["id"])
+
+def test_job_success_stores_result(api, db):
+    async def handler(job):
+        return {"done": True}
+    
+    job = run_job(api, db, "run_ok", handler)
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"done": True}
+
+def test_transient_failure_is_requeued(api, db):
+    async def handler(job):
+        raise RuntimeError("Bexio indisponible")
+    
+    job = run_job(api, db, "run_retry", handler)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 1
+    # Nouvel essai différé : pas réservé immédiatement
+    assert main.db_claim_job(db, ["run_retry"]) is None
+
+def test_client_error_fails_without_retry(api, db):
+    async def handler(job):
+        raise main.HTTPException(status_code=404, detail="Introuvable")
+    
+    job = run_job(api, db, "run_fail", handler)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
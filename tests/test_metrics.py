@@ -0,0 +1,36 @@
+"""Métriques Prometheus : routes par modèle de chemin, appels Bexio et profilage protégé"""
+from prometheus_client import REGISTRY
+
+import main
+from conftest import authorize
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_request_duration_uses_route_template(api):
+    before = sample("http_request_duration_seconds_count", method="GET", route="/tasks/{client_id}", status="200")
+    api.get("/tasks/mt-a")
+    api.get("/tasks/mt-b")
+    after = sample("http_request_duration_seconds_count", method="GET", route="/tasks/{client_id}", status="200")
+    assert after == before + 2
+    
+    body = api.get("/metrics").text
+    assert "/tasks/mt-a" not in body
+    assert "http_requests_in_progress" in body
+
+def test_upstream_metrics_by_endpoint(api):
+    authorize(api, "mt-c")
+    before = sample("bexio_upstream_responses_total", endpoint="contact", status="200")
+    api.get("/clients/mt-c/contacts")
+    assert sample("bexio_upstream_responses_total", endpoint="contact", status="200") == before + 1
+
+def test_endpoint_label_drops_ids():
+    assert main.upstream_endpoint_label("kb_invoice/123/pdf") == "kb_invoice/{id}/pdf"
+    assert main.upstream_endpoint_label("contact/search") == "contact/search"
+
+def test_profiler_requires_token(api, monkeypatch):
+    monkeypatch.setattr(main, "PROFILER_TOKEN", "")
+    assert api.post("/debug/profiler/start").status_code == 404
+    monkeypatch.setattr(main, "PROFILER_TOKEN", "secret")
+    assert api.post("/debug/profiler/start", params={"token": "wrong"}).status_code == 403
+    assert api.get("/debug/profiler", params={"token": "secret"}).status_code == 200
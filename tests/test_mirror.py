@@ -0,0 +1,43 @@
+"""Miroir local : synchronisation complète, incrémentale et purge des enregistrements supprimés"""
+import main
+from conftest import authorize
+
+def sync(api, client_id: str, full: bool = False) -> dict:
+    response = api.post(f"/clients/{client_id}/sync", params={"full": full})
+    assert response.status_code == 200, response.text
+    return {result["resource"]: result for result in response.json()["data"]}
+
+def test_first_sync_is_full_then_delta(api, fake_bexio):
+    authorize(api, "mr-a")
+    results = sync(api, "mr-a")
+    assert results["contact"]["mode"] == "full"
+    assert results["contact"]["records"] == 20
+    assert results["kb_invoice"]["records"] == 30
+    
+    # Le curseur updated_at >= relit seulement le dernier enregistrement
+    requests = fake_bexio.state.stats["requests"]
+    results = sync(api, "mr-a")
+    assert results["contact"]["mode"] == "delta"
+    assert results["contact"]["records"] == 1
+    assert results["contact"]["changed"] == 0
+    assert fake_bexio.state.stats["requests"] == requests + 2
+
+def test_full_sync_prunes_deleted_records(api, fake_bexio, db):
+    authorize(api, "mr-b")
+    sync(api, "mr-b")
+    fake_bexio.state.config.invoices = 25
+    results = sync(api, "mr-b", full=True)
+    assert results["kb_invoice"]["changed"] == 5
+    assert main.db_count_mirror(db, main.BexioInvoice, "mr-b") == 25
+    
+    # Agrégats recalculés avec la synchronisation complète
+    aggregates = api.get("/clients/mr-b/aggregates").json()["data"]
+    assert sum(item["count"] for item in aggregates["by_currency"]) == 25
+
+def test_sync_state_reports_progress(api):
+    authorize(api, "mr-c")
+    sync(api, "mr-c")
+    states = {state["resource"]: state for state in api.get("/clients/mr-c/sync").json()["data"]}
+    assert states["contact"]["status"] == "ok"
+    assert states["contact"]["records"] == 20
+    assert states["kb_invoice"]["cursor"]
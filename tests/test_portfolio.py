@@ -0,0 +1,41 @@
+"""Vue portefeuille : accès administrateur, une ligne NDJSON par client puis les totaux"""
+import json
+
+import main
+from conftest import authorize
+
+ADMIN = {"token": "test-admin-token"}
+
+def read_lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+def test_portfolio_requires_admin_token(api):
+    assert api.get("/portfolio").status_code == 403
+    assert api.get("/portfolio", params={"token": "wrong"}).status_code == 403
+
+def test_portfolio_streams_clients_then_totals(api):
+    for client_id in ("pf-a", "pf-b"):
+        authorize(api, client_id)
+    api.post("/tasks", json={"client_id": "pf-a", "title": "À faire"})
+    
+    response = api.get("/portfolio", params={**ADMIN, "client_ids": "pf-a,pf-b,pf-a"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    *clients, totals = read_lines(response)
+    
+    by_id = {line["client_id"]: line for line in clients}
+    assert set(by_id) == {"pf-a", "pf-b"}
+    assert by_id["pf-a"]["summary"]["total_invoices"] == 30
+    assert by_id["pf-a"]["summary"]["pending_tasks"] == 1
+    assert totals["clients"] == 2
+    assert totals["partial_clients"] == 0
+    assert totals["totals"]["total_invoices"] == 60
+    assert totals["totals"]["total_amount"] == round(sum(line["summary"]["total_amount"] for line in clients), 2)
+
+def test_portfolio_counts_partial_clients(api, fake_bexio, monkeypatch):
+    monkeypatch.setattr(main, "UPSTREAM_MAX_RETRIES", 0)
+    authorize(api, "pf-c")
+    fake_bexio.state.config.error_rate = 1.0
+    *clients, totals = read_lines(api.get("/portfolio", params={**ADMIN, "client_ids": "pf-c"}))
+    assert clients[0]["partial"] is True
+    assert totals["partial_clients"] == 1
@@ -0,0 +1,29 @@
+"""Projection ?fields= et sérialisation des listes"""
+import main
+from conftest import authorize
+
+def test_fields_projection_keeps_order_and_types(api):
+    authorize(api, "pj-a")
+    response = api.get("/clients/pj-a/invoices", params={"fields": "total_gross,id", "limit": 3})
+    assert response.status_code == 200
+    invoices = response.json()["data"]
+    assert len(invoices) == 3
+    assert all(list(invoice) == ["total_gross", "id"] for invoice in invoices)
+    assert all(isinstance(invoice["id"], int) for invoice in invoices)
+
+def test_projection_matches_full_format(api):
+    authorize(api, "pj-b")
+    full = api.get("/clients/pj-b/contacts").json()["data"]
+    projected = api.get("/clients/pj-b/contacts", params={"fields": "id,name_1,city"}).json()["data"]
+    assert projected == [{name: contact[name] for name in ("id", "name_1", "city")} for contact in full]
+
+def test_unknown_field_is_rejected(api):
+    authorize(api, "pj-c")
+    response = api.get("/clients/pj-c/contacts", params={"fields": "id,password"})
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+def test_formatter_defaults_and_cache():
+    formatter = main.make_formatter("contact", ("id", "name_1"))
+    assert formatter({"id": 7}) == {"id": 7, "name_1": main.FORMAT_SPECS["contact"]["name_1"][0]}
+    assert main.make_formatter("contact", ("id", "name_1")) is formatter
@@ -0,0 +1,67 @@
+"""Cache des réponses Bexio : bornes mémoire, ETag et valeurs périmées"""
+import asyncio
+
+import main
+from conftest import authorize
+
+def test_oversize_value_drops_previous_entry():
+    cache = main.ResponseCache(max_entries=10, max_bytes=200)
+    key = main.ResponseCache.make_key("rc", "contact")
+    cache.set(key, [{"id": 1}])
+    assert cache.get(key) == ([{"id": 1}], True)
+    
+    cache.set(key, [{"id": i, "name": "x" * 20} for i in range(20)])
+    assert cache.get(key) is None
+    assert cache.etag(key) is None
+    assert cache.total_bytes == 0
+
+def test_lru_eviction_respects_byte_budget():
+    cache = main.ResponseCache(max_entries=10, max_bytes=100)
+    keys = [main.ResponseCache.make_key("rc", "contact", {"offset": i}) for i in range(5)]
+    for key in keys:
+        cache.set(key, {"value": "x" * 20})
+    assert cache.total_bytes <= 100
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) is not None
+    assert cache.stats["evictions"] > 0
+
+def test_etag_follows_content():
+    cache = main.ResponseCache(max_entries=10, max_bytes=1000)
+    key = main.ResponseCache.make_key("rc", "contact")
+    cache.set(key, [{"id": 1}])
+    first = cache.etag(key)
+    cache.set(key, [{"id": 1}])
+    assert cache.etag(key) == first
+    cache.set(key, [{"id": 2}])
+    assert cache.etag(key) != first
+
+def age_entry(key: tuple, seconds: float):
+    main.response_cache.entries[key]["stored_at"] -= seconds
+
+def request(api, client_id: str, params: dict):
+    return api.portal.call(lambda: main.make_bexio_request(client_id, "contact", params=params))
+
+def test_stale_value_served_then_revalidated(api, fake_bexio):
+    authorize(api, "rc-a")
+    params = {"limit": 4}
+    key = main.ResponseCache.make_key("rc-a", "contact", params)
+    first = request(api, "rc-a", params)
+    requests = fake_bexio.state.stats["requests"]
+    
+    age_entry(key, main.ResponseCache.ttl_for("contact") + 1)
+    assert request(api, "rc-a", params) == first
+    api.portal.call(asyncio.sleep, 0.05)
+    assert fake_bexio.state.stats["requests"] == requests + 1
+    assert main.response_cache.get(key)[1] is True
+
+def test_last_known_value_when_bexio_is_down(api, fake_bexio, monkeypatch):
+    monkeypatch.setattr(main, "UPSTREAM_MAX_RETRIES", 0)
+    authorize(api, "rc-b")
+    params = {"limit": 4}
+    key = main.ResponseCache.make_key("rc-b", "contact", params)
+    first = request(api, "rc-b", params)
+    
+    # Au-delà de la fenêtre stale : relu chez Bexio, en panne
+    age_entry(key, main.ResponseCache.ttl_for("contact") + main.CACHE_STALE_TTL + 1)
+    fake_bexio.state.config.error_rate = 1.0
+    assert request(api, "rc-b", params) == first
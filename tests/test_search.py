@@ -0,0 +1,73 @@
+"""Recherche dans le miroir : pagination par curseur sur des colonnes de tri incomplètes"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import main
+
+CLIENT_ID = "c1"
+
+def make_invoice(index: int) -> dict:
+    invoice = {"id": index, "document_nr": f"RE-{index:05d}", "title": f"Facture {index}",
+               "total_gross": str(100 * index), "currency": "CHF", "updated_at": "2024-01-01 00:00:00"}
+    if index % 2:
+        invoice["is_valid_from"] = f"2024-01-{index:02d}"
+    return invoice
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        db = main.SessionLocal()
+        try:
+            rows = [main.invoice_to_row(CLIENT_ID, make_invoice(i), main.datetime.utcnow()) for i in range(1, 11)]
+            main.db_upsert_mirror(db, main.BexioInvoice, CLIENT_ID, rows)
+            main.db_bump_mirror_version(db, CLIENT_ID, "kb_invoice")
+        finally:
+            db.close()
+        yield client
+
+def collect_ids(client, order: str) -> list:
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 3, "order": order, "sort": "is_valid_from"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"/clients/{CLIENT_ID}/invoices/search", params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        ids.extend(record["id"] for record in body["data"])
+        cursor = body["pagination"]["next_cursor"]
+        if not cursor:
+            return ids
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_cursor_pages_over_missing_sort_values(client, order):
+    ids = collect_ids(client, order)
+    assert sorted(ids) == list(range(1, 11))
+    dated = [i for i in ids if i % 2]
+    assert dated == sorted(dated, reverse=order == "desc")
+
+def test_invalid_cursor_is_rejected(client):
+    cursor = main.encode_cursor("is_valid_from", "asc", None, 3)
+    response = client.get(f"/clients/{CLIENT_ID}/invoices/search", params={"sort": "is_valid_from", "cursor": cursor})
+    assert response.status_code == 400
+
+def test_sort_uses_index(client):
+    with main.engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM bexio_invoices WHERE client_id = 'c1' "
+            "ORDER BY is_valid_from DESC, id DESC LIMIT 4"
+        )).all()
+    details = " ".join(str(row[-1]) for row in plan)
+    assert "ix_bexio_invoices_client_valid_from_id" in details
+    assert "TEMP B-TREE" not in details
+
+def test_migration_fills_legacy_null_sort_values(client):
+    with main.engine.begin() as conn:
+        conn.execute(text("UPDATE bexio_invoices SET is_valid_from = NULL WHERE client_id = 'c1' AND id = 2"))
+    main.init_database()
+    db = main.SessionLocal()
+    try:
+        assert db.get(main.BexioInvoice, (CLIENT_ID, 2)).is_valid_from == ""
+    finally:
+        db.close()
@@ -0,0 +1,80 @@
+"""Mode multi-workers : verrous, seaux de débit, cache L2 (Redis simulé par fakeredis) et migration unique"""
+import asyncio
+
+import pytest
+
+import main
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(main.redis_asyncio, "from_url", lambda url: fakeredis.FakeAsyncRedis(server=server))
+    return server
+
+@pytest.fixture(params=["memory", "redis"])
+def backend_factory(request):
+    if request.param == "memory":
+        return main.MemoryBackend
+    request.getfixturevalue("redis_server")
+    return lambda: main.RedisBackend("redis://test", "test:")
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_lock_is_exclusive_and_owned(backend_factory):
+    async def scenario():
+        backend = backend_factory()
+        token = await backend.acquire_lock("sync:a", 5)
+        assert token
+        assert await backend.acquire_lock("sync:a", 5) is None
+        await backend.release_lock("sync:a", "not-the-owner")
+        assert await backend.acquire_lock("sync:a", 5) is None
+        await backend.release_lock("sync:a", token)
+        assert await backend.acquire_lock("sync:a", 5)
+        await backend.close()
+    run(scenario())
+
+def test_token_bucket_allows_burst_then_waits(backend_factory):
+    async def scenario():
+        backend = backend_factory()
+        waits = [await backend.reserve_token("client-a", 10, 3) for _ in range(5)]
+        await backend.close()
+        return waits
+    waits = run(scenario())
+    assert waits[:3] == [0, 0, 0]
+    assert 0.05 < waits[3] < waits[4] <= 0.25
+
+def test_redis_locks_are_shared_between_workers(redis_server):
+    async def scenario():
+        first, second = main.RedisBackend("redis://test", "test:"), main.RedisBackend("redis://test", "test:")
+        token = await first.acquire_lock("token-refresh:a", 5)
+        assert await second.acquire_lock("token-refresh:a", 5) is None
+        await first.release_lock("token-refresh:a", token)
+        assert await second.acquire_lock("token-refresh:a", 5)
+    run(scenario())
+
+def test_shared_cache_feeds_other_worker(redis_server, monkeypatch):
+    key = main.ResponseCache.make_key("sh-a", "contact", {"limit": 2})
+    
+    async def scenario():
+        monkeypatch.setattr(main, "shared_state", main.RedisBackend("redis://test", "test:"))
+        await main.store_shared_cache(key, [{"id": 1}, {"id": 2}])
+        # Autre worker : cache local vide, valeur lue dans Redis
+        main.response_cache.invalidate("sh-a")
+        assert await main.load_shared_cache(key, fresh_only=True) == ([{"id": 1}, {"id": 2}], True)
+        assert main.response_cache.get(key) == ([{"id": 1}, {"id": 2}], True)
+        
+        assert await main.invalidate_cache("sh-a") >= 1
+        assert await main.shared_state.get(main.shared_cache_key(key)) is None
+        assert await main.load_shared_cache(key) is None
+    run(scenario())
+
+def test_migration_runs_once(api, monkeypatch):
+    assert main.db_schema_version() == main.SCHEMA_VERSION
+    
+    def init_again():
+        raise AssertionError("migration relancée sur un schéma à jour")
+    monkeypatch.setattr(main, "init_database", init_again)
+    assert main.migrate_database() == main.SEARCH_BACKEND
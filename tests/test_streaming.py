@@ -0,0 +1,54 @@
+"""Récupération de toutes les pages en flux (NDJSON ou JSON)"""
+import json
+
+import pytest
+
+import main
+from conftest import authorize
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(main, "PAGE_SIZE", 7)
+
+def test_ndjson_stream_covers_all_pages(api, small_pages):
+    authorize(api, "st-a")
+    response = api.get("/clients/st-a/invoices", params={"stream": "ndjson", "fields": "id"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    ids = [json.loads(line)["id"] for line in response.text.splitlines()]
+    assert ids == list(range(1, 31))
+
+def test_json_stream_is_one_document(api, small_pages):
+    authorize(api, "st-b")
+    response = api.get("/clients/st-b/contacts", params={"stream": "json"})
+    contacts = response.json()["data"]
+    assert len(contacts) == 20
+    assert contacts == api.get("/clients/st-b/contacts").json()["data"]
+
+def test_mirror_stream(api, small_pages):
+    authorize(api, "st-c")
+    api.post("/clients/st-c/sync")
+    response = api.get("/clients/st-c/contacts", params={"stream": "ndjson", "source": "mirror"})
+    assert len(response.text.splitlines()) == 20
+
+def test_error_before_first_page_keeps_status(api):
+    assert api.get("/clients/st-unknown/invoices", params={"stream": "ndjson"}).status_code == 401
+
+def test_error_mid_stream_is_reported_in_body(api, small_pages, monkeypatch):
+    monkeypatch.setattr(main, "UPSTREAM_MAX_RETRIES", 0)
+    authorize(api, "st-d")
+    calls = {"count": 0}
+    original = main.fetch_bexio
+    
+    async def failing_after_first_page(*args, **kwargs):
+        calls["count"] += 1
+        if calls["count"] > 1:
+            raise main.HTTPException(status_code=502, detail="Erreur API Bexio: 503")
+        return await original(*args, **kwargs)
+    
+    monkeypatch.setattr(main, "fetch_bexio", failing_after_first_page)
+    response = api.get("/clients/st-d/invoices", params={"stream": "json"})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["data"]) == 7
+    assert "502" in body["error"]
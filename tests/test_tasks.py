@@ -0,0 +1,52 @@
+"""Tâches : pagination par curseur sur l'échéance (tâches sans échéance en dernier)"""
+import pytest
+from sqlalchemy import text
+
+import main
+
+CLIENT_ID = "tasks-client"
+DUE_DATES = ["2025-03-01", None, "2025-01-01", "2025-03-01", None, "2025-02-01", None]
+
+@pytest.fixture(scope="module")
+def task_ids():
+    db = main.SessionLocal()
+    try:
+        ids = []
+        for index, due in enumerate(DUE_DATES):
+            task = main.TaskCreate(client_id=CLIENT_ID, title=f"Tâche {index}",
+                                   due_date=main.datetime.fromisoformat(due) if due else None)
+            ids.append(main.db_create_task(db, task))
+        return dict(zip(ids, DUE_DATES))
+    finally:
+        db.close()
+
+def collect(api, order: str, **params) -> list:
+    ids, cursor = [], None
+    while True:
+        query = {"sort": "due_date", "order": order, "limit": 2, **params}
+        if cursor:
+            query["cursor"] = cursor
+        response = api.get(f"/tasks/{CLIENT_ID}", params=query)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        ids.extend(task["id"] for task in body["data"])
+        cursor = body["pagination"]["next_cursor"]
+        if not cursor:
+            return ids
+
+def test_due_date_ascending_puts_undated_last(api, task_ids):
+    expected = sorted((due is None, due or "", task_id) for task_id, due in task_ids.items())
+    assert collect(api, "asc") == [task_id for _, _, task_id in expected]
+
+def test_due_date_descending_is_reverse(api, task_ids):
+    assert collect(api, "desc") == list(reversed(collect(api, "asc")))
+
+def test_due_date_order_uses_index(task_ids):
+    with main.engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM tasks WHERE client_id = :client AND status = 'pending' "
+            "AND due_date IS NOT NULL ORDER BY due_date, id LIMIT 3"
+        ), {"client": CLIENT_ID}).all()
+    details = " ".join(str(row[-1]) for row in plan)
+    assert "ix_tasks_client_status_due" in details
+    assert "TEMP B-TREE" not in details
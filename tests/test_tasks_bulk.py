@@ -0,0 +1,46 @@
+"""Tâches en lot : une transaction, erreurs par élément, mode atomique"""
+import main
+
+def count_tasks(db, client_id: str) -> int:
+    return main.db_count_tasks(db, client_id, None)
+
+def test_bulk_create_reports_errors_per_item(api, db):
+    items = [
+        {"client_id": "bulk-a", "title": "Première"},
+        {"client_id": "bulk-a"},
+        {"client_id": "bulk-a", "title": "Troisième", "due_date": "2025-05-01T00:00:00"},
+    ]
+    response = api.post("/tasks/bulk", json=items)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [item["index"] for item in body["data"]] == [0, 2]
+    assert [error["index"] for error in body["errors"]] == [1]
+    assert count_tasks(db, "bulk-a") == 2
+
+def test_atomic_bulk_create_writes_nothing_on_error(api, db):
+    items = [{"client_id": "bulk-b", "title": "Valide"}, {"client_id": "bulk-b", "title": None}]
+    response = api.post("/tasks/bulk", params={"atomic": True}, json=items)
+    assert response.status_code == 422
+    assert response.json()["detail"]["errors"][0]["index"] == 1
+    assert count_tasks(db, "bulk-b") == 0
+
+def test_bulk_update_unknown_ids(api):
+    created = api.post("/tasks/bulk", json=[{"client_id": "bulk-c", "title": f"T{i}"} for i in range(3)])
+    ids = [item["id"] for item in created.json()["data"]]
+    updates = [{"id": ids[0], "status": "done"}, {"id": 10 ** 9, "status": "done"}, {"id": ids[2], "title": "Renommée"}]
+    
+    response = api.patch("/tasks/bulk", params={"atomic": True}, json=updates)
+    assert response.status_code == 422
+    
+    body = api.patch("/tasks/bulk", json=updates).json()
+    assert [item["id"] for item in body["data"]] == [ids[0], ids[2]]
+    assert body["errors"][0]["index"] == 1
+    tasks = {task["id"]: task for task in api.get("/tasks/bulk-c").json()["data"]}
+    assert tasks[ids[0]]["status"] == "done"
+    assert tasks[ids[2]]["title"] == "Renommée"
+
+def test_bulk_size_limits(api, monkeypatch):
+    monkeypatch.setattr(main, "TASKS_BULK_MAX", 2)
+    assert api.post("/tasks/bulk", json=[]).status_code == 422
+    items = [{"client_id": "bulk-d", "title": "T"}] * 3
+    assert api.post("/tasks/bulk", json=items).status_code == 413
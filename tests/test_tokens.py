@@ -0,0 +1,45 @@
+"""Cache des tokens OAuth : chargement unique et rafraîchissement single-flight"""
+import asyncio
+from datetime import datetime, timedelta
+
+import main
+from conftest import authorize
+
+def expire(client_id: str, seconds: float):
+    main.token_cache.tokens[client_id]["expires_at"] = datetime.utcnow() + timedelta(seconds=seconds)
+
+def get_tokens(api, db, client_id: str, count: int) -> list:
+    async def gather():
+        return await asyncio.gather(*[main.token_cache.get(client_id, db) for _ in range(count)])
+    return api.portal.call(gather)
+
+def test_token_loaded_once(api, db):
+    authorize(api, "tk-a")
+    main.token_cache.invalidate("tk-a")
+    loads = main.token_cache.stats["loads"]
+    assert get_tokens(api, db, "tk-a", 10) == ["bench-token-tk-a"] * 10
+    assert main.token_cache.stats["loads"] == loads + 1
+
+def test_expired_token_refreshed_once_for_concurrent_requests(api, db):
+    authorize(api, "tk-b")
+    get_tokens(api, db, "tk-b", 1)
+    expire("tk-b", -1)
+    refreshes = main.token_cache.stats["refreshes"]
+    
+    assert get_tokens(api, db, "tk-b", 10) == ["bench-token-tk-b"] * 10
+    assert main.token_cache.stats["refreshes"] == refreshes + 1
+    assert main.token_cache.tokens["tk-b"]["expires_at"] > datetime.utcnow() + timedelta(minutes=30)
+
+def test_expiring_token_served_while_refreshing(api, db):
+    authorize(api, "tk-c")
+    get_tokens(api, db, "tk-c", 1)
+    expire("tk-c", 60)
+    refreshes = main.token_cache.stats["refreshes"]
+    
+    assert get_tokens(api, db, "tk-c", 5) == ["bench-token-tk-c"] * 5
+    api.portal.call(asyncio.sleep, 0.1)
+    assert main.token_cache.stats["refreshes"] == refreshes + 1
+    assert main.token_cache.tokens["tk-c"]["expires_at"] > datetime.utcnow() + timedelta(minutes=30)
+
+def test_unknown_client_has_no_token(api, db):
+    assert get_tokens(api, db, "tk-unknown", 2) == [None, None]
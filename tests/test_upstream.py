@@ -0,0 +1,111 @@
+"""Appels Bexio : nouveaux essais, Retry-After, disjoncteur et ordonnancement par client"""
+import asyncio
+
+import pytest
+
+import main
+from conftest import authorize
+
+@pytest.fixture
+def upstream(monkeypatch, fake_bexio):
+    monkeypatch.setattr(main, "UPSTREAM_MAX_RETRIES", 2)
+    monkeypatch.setattr(main, "backoff_delay", lambda attempt, retry_after=None: 0)
+    monkeypatch.setattr(main, "circuit_breakers", main.TenantCircuitBreakers(2, 30))
+    return fake_bexio
+
+def get_invoices(api, client_id: str, offset: int):
+    # Décalage différent à chaque appel : pas de réponse servie depuis le cache
+    return api.get(f"/clients/{client_id}/invoices", params={"offset": offset})
+
+def upstream_error(api, client_id: str, offset: int) -> str:
+    """Erreur Bexio renvoyée dans le corps (l'endpoint répond 200 avec data vide)"""
+    response = get_invoices(api, client_id, offset)
+    assert response.status_code == 200
+    return response.json().get("error", "")
+
+def test_breaker_counts_one_failure_per_call(api, upstream):
+    authorize(api, "cb-a")
+    authorize(api, "cb-b")
+    upstream.state.config.error_rate = 1.0
+    
+    assert upstream_error(api, "cb-a", 1).startswith("502")
+    assert upstream.state.stats["requests"] == 3
+    assert main.circuit_breakers.breakers["cb-a"].failures == 1
+    assert main.circuit_breakers.breakers["cb-a"].state == "closed"
+    
+    assert upstream_error(api, "cb-a", 2).startswith("502")
+    assert main.circuit_breakers.breakers["cb-a"].state == "open"
+    
+    assert upstream_error(api, "cb-a", 3).startswith("503")
+    assert upstream.state.stats["requests"] == 6
+    
+    # Les autres clients ne sont pas coupés
+    upstream.state.config.error_rate = 0.0
+    assert upstream_error(api, "cb-b", 1) == ""
+    assert "cb-b" not in main.circuit_breakers.breakers
+
+def test_success_after_retry_resets_breaker(api, upstream):
+    authorize(api, "cb-c")
+    upstream.state.config.error_rate = 1.0
+    assert upstream_error(api, "cb-c", 1).startswith("502")
+    assert "cb-c" in main.circuit_breakers.breakers
+    
+    upstream.state.config.error_rate = 0.0
+    assert upstream_error(api, "cb-c", 2) == ""
+    assert "cb-c" not in main.circuit_breakers.breakers
+
+def test_long_retry_after_is_returned_without_retry(api, upstream):
+    authorize(api, "rl-a")
+    upstream.state.config.rate_429 = 1.0
+    upstream.state.config.retry_after = 60
+    
+    response = get_invoices(api, "rl-a", 1)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+    assert upstream.state.stats["requests"] == 1
+    # 429 : quota épuisé, pas une panne de Bexio
+    assert "rl-a" not in main.circuit_breakers.breakers
+
+def test_short_retry_after_is_retried(api, upstream):
+    authorize(api, "rl-b")
+    upstream.state.config.rate_429 = 1.0
+    upstream.state.config.retry_after = 1
+    
+    assert get_invoices(api, "rl-b", 1).status_code == 429
+    assert upstream.state.stats["requests"] == 3
+    assert main.http_stats["retries"] >= 2
+
+def test_parse_retry_after():
+    assert main.parse_retry_after("12") == 12
+    assert main.parse_retry_after("not a date") is None
+    assert main.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") < 0
+
+def test_scheduler_serves_clients_round_robin():
+    scheduler = main.UpstreamScheduler(1, 1000, 1000)
+    order = []
+    
+    async def call(client_id: str, index: int):
+        async with scheduler.slot(client_id):
+            order.append(f"{client_id}{index}")
+            await asyncio.sleep(0.01)
+    
+    async def scenario():
+        await asyncio.gather(*[call("rr-a", i) for i in range(3)], call("rr-b", 0))
+    
+    asyncio.run(scenario())
+    # rr-b n'attend pas la fin de toutes les requêtes de rr-a
+    assert order.index("rr-b0") < 3
+    assert scheduler.active == 0
+
+def test_scheduler_throttles_per_client():
+    scheduler = main.UpstreamScheduler(10, 20, 2)
+    
+    async def scenario():
+        for client_id in ("th-a", "th-b"):
+            for _ in range(3):
+                async with scheduler.slot(client_id):
+                    pass
+    
+    asyncio.run(scenario())
+    # Rafale de 2 par client : seul le troisième appel de chaque client attend
+    assert scheduler.stats["throttled"] == 2
@@ -0,0 +1,82 @@
+"""Webhooks Bexio : signature HMAC, événements ignorés et application au miroir"""
+import hashlib
+import hmac
+import json
+import time
+
+import main
+from conftest import authorize
+
+def sign(body: bytes) -> str:
+    return hmac.new(b"test-webhook-secret", body, hashlib.sha256).hexdigest()
+
+def post_events(api, client_id: str, events, signature=None):
+    body = json.dumps(events).encode()
+    headers = {"Content-Type": "application/json", "X-Bexio-Signature": signature or sign(body)}
+    return api.post(f"/webhooks/bexio/{client_id}", content=body, headers=headers)
+
+def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "événement webhook non appliqué"
+        time.sleep(0.02)
+
+def contact_version(api, client_id: str) -> int:
+    states = api.get(f"/clients/{client_id}/sync").json()["data"]
+    return next(state["version"] for state in states if state["resource"] == "contact")
+
+def synced_client(api, client_id: str):
+    authorize(api, client_id)
+    assert api.post(f"/clients/{client_id}/sync", params={"full": True}).status_code == 200
+
+def test_signature_is_required(api):
+    body = json.dumps({"event": "contact.updated", "data": {"id": 1}}).encode()
+    url = "/webhooks/bexio/wh-a"
+    assert api.post(url, content=body).status_code == 401
+    assert api.post(url, content=body, headers={"X-Bexio-Signature": "0" * 64}).status_code == 401
+    # Signature d'un autre corps
+    assert api.post(url, content=body + b" ", headers={"X-Bexio-Signature": sign(body)}).status_code == 401
+    response = api.post(url, content=body, headers={"X-Bexio-Signature": f"sha256={sign(body)}"})
+    assert response.status_code == 202
+    assert response.json()["data"]["queued"] == 1
+
+def test_unsupported_events_are_skipped(api):
+    response = post_events(api, "wh-b", [
+        {"event": "project.updated", "data": {"id": 1}},
+        {"event": "contact.updated", "data": {}},
+        {"event": "contact.deleted", "data": {"id": 3}},
+    ])
+    assert response.status_code == 202
+    assert response.json()["data"] == {"client_id": "wh-b", "queued": 1, "skipped": 2}
+
+def test_complete_payload_patches_mirror_without_refetch(api):
+    synced_client(api, "wh-c")
+    version = contact_version(api, "wh-c")
+    refetches = main.webhook_processor.stats["refetches"]
+    contact = {
+        "id": 2, "name_1": "Nouveau Nom SA", "name_2": None, "mail": "info@example.ch", "phone_fixed": None,
+        "phone_mobile": None, "address": None, "postcode": "1003", "city": "Lausanne", "country_id": 1,
+        "updated_at": "2030-01-01 00:00:00",
+    }
+    assert post_events(api, "wh-c", {"event": "contact.updated", "data": contact}).status_code == 202
+    
+    wait_until(lambda: contact_version(api, "wh-c") == version + 1)
+    names = [row["name_1"] for row in api.get("/clients/wh-c/contacts", params={"source": "mirror"}).json()["data"]]
+    assert "Nouveau Nom SA" in names
+    assert main.webhook_processor.stats["refetches"] == refetches
+
+def test_partial_payload_refetches_and_delete_removes(api):
+    synced_client(api, "wh-d")
+    version = contact_version(api, "wh-d")
+    
+    # Payload partiel : relu chez Bexio (le Bexio simulé répond 404, le contact est retiré)
+    refetches = main.webhook_processor.stats["refetches"]
+    post_events(api, "wh-d", {"event": "contact.updated", "data": {"id": 4}})
+    wait_until(lambda: contact_version(api, "wh-d") == version + 1)
+    assert main.webhook_processor.stats["refetches"] == refetches + 1
+    
+    post_events(api, "wh-d", {"event": "contact.deleted", "data": {"id": 5}})
+    wait_until(lambda: contact_version(api, "wh-d") == version + 2)
+    ids = [row["id"] for row in api.get("/clients/wh-d/contacts", params={"source": "mirror"}).json()["data"]]
+    assert 4 not in ids and 5 not in ids
+    assert len(ids) == 18